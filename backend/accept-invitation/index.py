@@ -1,7 +1,6 @@
 import json
 import os
 import psycopg2
-import bcrypt
 from typing import Dict, Any
 
 def get_db_connection():
@@ -12,6 +11,13 @@ def escape_sql_string(s: str) -> str:
         return 'NULL'
     return "'" + s.replace("'", "''") + "'"
 
+def bump_entity_version(cur, company_id: int, entity: str):
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        VALUES ({company_id}, {escape_sql_string(entity)}, 1)
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Принятие приглашения: создание нового пользователя и добавление в компанию
@@ -210,6 +216,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 }
             
             # Хешируем пароль
+            import bcrypt
             password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
             
             # Создаём пользователя
@@ -240,6 +247,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 WHERE id = {inv_id}
             """)
             
+            bump_entity_version(cur, company_id, 'employees')
             conn.commit()
             cur.close()
             conn.close()
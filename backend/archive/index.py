@@ -0,0 +1,404 @@
+import json
+import math
+import os
+import time
+import psycopg2
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_BATCH_SIZE = 1000
+MAX_BATCH_SIZE = 10000
+DEFAULT_TIME_BUDGET = 20
+# Функция платформы живёт не дольше 30 с: бюджет больше оставил бы её убитой посреди пачки
+MAX_TIME_BUDGET = 25
+
+# Колонки горячих таблиц; архивные таблицы повторяют их и добавляют archived_at
+ARCHIVE_COLUMNS = {
+    'payments': ['id', 'company_id', 'order_id', 'planned_amount', 'planned_amount_percent', 'actual_amount',
+                 'planned_date', 'actual_date', 'status', 'created_at', 'updated_at', 'version', 'archived_by_cascade'],
+    'orders': ['id', 'company_id', 'project_id', 'name', 'description', 'amount', 'order_status',
+               'payment_status', 'payment_type', 'planned_date', 'actual_date', 'created_at', 'updated_at', 'status',
+               'version', 'archived_by_cascade'],
+    'projects': ['id', 'company_id', 'client_id', 'name', 'description', 'status', 'created_at', 'updated_at', 'version',
+                 'archived_by_cascade'],
+    'clients': ['id', 'company_id', 'name', 'notes', 'created_at', 'updated_at', 'status', 'version']
+}
+
+CONTACT_COLUMNS = ['id', 'client_id', 'full_name', 'position', 'phone', 'email', 'created_at']
+
+DECIMAL_FIELDS = {'amount', 'planned_amount', 'planned_amount_percent', 'actual_amount'}
+
+# Строка переносится, только если на неё не ссылаются строки горячих таблиц (внешние ключи)
+HOT_CHILDREN = {
+    'orders': "NOT EXISTS (SELECT 1 FROM payments p WHERE p.company_id = t.company_id AND p.order_id = t.id)",
+    'projects': "NOT EXISTS (SELECT 1 FROM orders o WHERE o.company_id = t.company_id AND o.project_id = t.id)",
+    'clients': "NOT EXISTS (SELECT 1 FROM projects p WHERE p.client_id = t.id)"
+}
+
+# При восстановлении сначала возвращается архивный родитель
+PARENTS = {
+    'payments': ('orders', 'order_id'),
+    'orders': ('projects', 'project_id'),
+    'projects': ('clients', 'client_id')
+}
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def escape_sql_string(s: str) -> str:
+    if s is None:
+        return 'NULL'
+    return "'" + s.replace("'", "''") + "'"
+
+def bump_entity_version(cur, company_id: int, entity: str):
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        VALUES ({company_id}, {escape_sql_string(entity)}, 1)
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
+def serialize_value(field: str, value):
+    if value is None:
+        return None
+    if field in DECIMAL_FIELDS:
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def parse_run_params(body: Dict[str, Any]) -> Tuple[Optional[Tuple[int, float, Optional[int]]], Optional[str]]:
+    """batch_size, time_budget и archived_before_days для action=run. Возвращает (параметры, ошибка)"""
+    try:
+        batch_size = int(body.get('batch_size', DEFAULT_BATCH_SIZE))
+        time_budget = float(body.get('time_budget', DEFAULT_TIME_BUDGET))
+        archived_before_days = body.get('archived_before_days')
+        if archived_before_days is not None:
+            archived_before_days = int(archived_before_days)
+    except (TypeError, ValueError):
+        return None, 'Некорректные параметры архивации'
+    if not math.isfinite(time_budget) or not 0 < time_budget <= MAX_TIME_BUDGET:
+        return None, f'time_budget - число секунд от 0 до {MAX_TIME_BUDGET}'
+    if archived_before_days is not None and archived_before_days < 0:
+        return None, 'archived_before_days не может быть отрицательным'
+    return (max(1, min(batch_size, MAX_BATCH_SIZE)), time_budget, archived_before_days), None
+
+def archive_batch(cur, entity: str, company_id: int, batch_size: int, archived_before_days: Optional[int]) -> int:
+    """
+    Переносит одну пачку строк в {entity}_archive. Возвращает число перенесённых строк.
+    DELETE из горячей таблицы оставляет tombstone в sync_changes (триггер V0032),
+    поэтому клиенты sync убирают перенесённые строки из локального кэша.
+    """
+    columns = ', '.join(ARCHIVE_COLUMNS[entity])
+    status_sql = "t.status = 'removed'"
+    if archived_before_days is not None:
+        status_sql = (f"(t.status = 'removed' OR (t.status = 'archived' "
+                      f"AND t.updated_at < NOW() - INTERVAL '{archived_before_days} days'))")
+    children_sql = f"AND {HOT_CHILDREN[entity]}" if entity in HOT_CHILDREN else ''
+
+    cur.execute(f"""
+        SELECT t.id FROM {entity} t
+        WHERE t.company_id = {company_id} AND {status_sql} {children_sql}
+        ORDER BY t.id
+        LIMIT {batch_size}
+        FOR UPDATE SKIP LOCKED
+    """)
+    ids = [row[0] for row in cur.fetchall()]
+    if not ids:
+        return 0
+    ids_sql = ', '.join(str(i) for i in ids)
+
+    if entity == 'clients':
+        contact_columns = ', '.join(CONTACT_COLUMNS)
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM client_contacts WHERE client_id IN ({ids_sql})
+                RETURNING {contact_columns}
+            )
+            INSERT INTO client_contacts_archive ({contact_columns}, archived_at)
+            SELECT {contact_columns}, NOW() FROM moved
+        """)
+
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {entity} WHERE company_id = {company_id} AND id IN ({ids_sql})
+            RETURNING {columns}
+        )
+        INSERT INTO {entity}_archive ({columns}, archived_at)
+        SELECT {columns}, NOW() FROM moved
+    """)
+    return cur.rowcount
+
+def restore_row(cur, entity: str, company_id: int, row_id: int, status: str) -> List[str]:
+    """Возвращает строку (и архивных родителей) в горячую таблицу. Возвращает список восстановленных сущностей"""
+    restored = []
+    if entity in PARENTS:
+        parent_entity, parent_column = PARENTS[entity]
+        cur.execute(f"""
+            SELECT {parent_column} FROM {entity}_archive
+            WHERE company_id = {company_id} AND id = {row_id}
+        """)
+        row = cur.fetchone()
+        if row and row[0]:
+            cur.execute(f"SELECT 1 FROM {parent_entity}_archive WHERE company_id = {company_id} AND id = {row[0]}")
+            if cur.fetchone():
+                restored += restore_row(cur, parent_entity, company_id, row[0], status)
+
+    columns = ARCHIVE_COLUMNS[entity]
+    select_sql = ', '.join(
+        f"CASE WHEN status = 'removed' THEN {escape_sql_string(status)} ELSE status END" if c == 'status'
+        else 'NOW()' if c == 'updated_at'
+        else 'version + 1' if c == 'version'
+        else c
+        for c in columns
+    )
+    cur.execute(f"""
+        WITH moved AS (
+            DELETE FROM {entity}_archive WHERE company_id = {company_id} AND id = {row_id}
+            RETURNING {', '.join(columns)}
+        )
+        INSERT INTO {entity} ({', '.join(columns)})
+        SELECT {select_sql} FROM moved
+    """)
+    if cur.rowcount == 0:
+        return restored
+
+    if entity == 'clients':
+        contact_columns = ', '.join(CONTACT_COLUMNS)
+        cur.execute(f"""
+            WITH moved AS (
+                DELETE FROM client_contacts_archive WHERE client_id = {row_id}
+                RETURNING {contact_columns}
+            )
+            INSERT INTO client_contacts ({contact_columns})
+            SELECT {contact_columns} FROM moved
+        """)
+
+    return restored + [entity]
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Архивация удалённых строк в холодные таблицы *_archive и их восстановление
+    Args: event - HTTP запрос: GET - содержимое архива, POST action=run - перенос пачками,
+                  POST action=restore - возврат строки в рабочую таблицу
+          context - контекст выполнения функции
+    Returns: JSON с результатом операции
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        cur.execute(f"SELECT role FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+        user_data = cur.fetchone()
+
+        if not user_data:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                'isBase64Encoded': False
+            }
+
+        user_role = user_data[0]
+
+        if method == 'GET':
+            query_params = event.get('queryStringParameters') or {}
+            entity = query_params.get('entity', 'orders')
+
+            if entity not in ARCHIVE_COLUMNS:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Неизвестная сущность'}),
+                    'isBase64Encoded': False
+                }
+
+            limit = max(1, min(int(query_params.get('limit', 100)), 1000))
+            before_id = query_params.get('before_id')
+            before_sql = f"AND id < {int(before_id)}" if before_id else ''
+            columns = ARCHIVE_COLUMNS[entity] + ['archived_at']
+
+            cur.execute(f"""
+                SELECT {', '.join(columns)} FROM {entity}_archive
+                WHERE company_id = {company_id} {before_sql}
+                ORDER BY id DESC
+                LIMIT {limit}
+            """)
+
+            rows = [
+                {c: serialize_value(c, v) for c, v in zip(columns, row)}
+                for row in cur.fetchall()
+            ]
+
+            cur.close()
+            conn.close()
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'entity': entity, 'rows': rows}),
+                'isBase64Encoded': False
+            }
+
+        elif method == 'POST':
+            if user_role not in ['owner', 'admin']:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Недостаточно прав'}),
+                    'isBase64Encoded': False
+                }
+
+            body = json.loads(event.get('body', '{}'))
+            action = body.get('action')
+
+            if action == 'run':
+                params, error = parse_run_params(body)
+                if error:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': error}),
+                        'isBase64Encoded': False
+                    }
+                batch_size, time_budget, archived_before_days = params
+
+                started = time.monotonic()
+                moved = {entity: 0 for entity in ARCHIVE_COLUMNS}
+                done = True
+
+                # Дети раньше родителей: иначе родитель не пройдёт проверку внешних ключей
+                for entity in ARCHIVE_COLUMNS:
+                    while True:
+                        if time.monotonic() - started > time_budget:
+                            done = False
+                            break
+                        count = archive_batch(cur, entity, company_id, batch_size, archived_before_days)
+                        # Версия поднимается в транзакции пачки: если функцию убьют посреди прогона,
+                        # ETag списков всё равно сменится для уже перенесённых строк
+                        if count:
+                            bump_entity_version(cur, company_id, entity)
+                        conn.commit()
+                        moved[entity] += count
+                        if count < batch_size:
+                            break
+                    if not done:
+                        break
+
+                cur.close()
+                conn.close()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, 'moved': moved, 'done': done}),
+                    'isBase64Encoded': False
+                }
+
+            elif action == 'restore':
+                entity = body.get('entity')
+                row_id = body.get('id')
+                status = body.get('status', 'archived')
+
+                if entity not in ARCHIVE_COLUMNS or not row_id:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'entity и id обязательны'}),
+                        'isBase64Encoded': False
+                    }
+
+                if status not in ['active', 'archived', 'removed']:
+                    status = 'archived'
+
+                restored = restore_row(cur, entity, company_id, int(row_id), status)
+
+                if entity not in restored:
+                    conn.rollback()
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Запись в архиве не найдена'}),
+                        'isBase64Encoded': False
+                    }
+
+                for restored_entity in set(restored):
+                    bump_entity_version(cur, company_id, restored_entity)
+                conn.commit()
+                cur.close()
+                conn.close()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'success': True, 'restored': restored}),
+                    'isBase64Encoded': False
+                }
+
+            else:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Неизвестное действие'}),
+                    'isBase64Encoded': False
+                }
+
+        else:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 405,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Метод не поддерживается'}),
+                'isBase64Encoded': False
+            }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
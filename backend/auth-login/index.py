@@ -0,0 +1,137 @@
+import json
+import os
+import hashlib
+import hmac
+import base64
+import time
+import psycopg2
+from datetime import timedelta
+from typing import Dict, Any
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def escape_sql_string(s: str) -> str:
+    if s is None:
+        return 'NULL'
+    return "'" + s.replace("'", "''") + "'"
+
+def hash_password(password: str) -> str:
+    return hashlib.sha256(password.encode()).hexdigest()
+
+def base64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
+def generate_jwt(user_id: int, email: str) -> str:
+    """HS256-токен на hmac из стандартной библиотеки: вход не загружает PyJWT и его криптобэкенды"""
+    secret = os.environ['JWT_SECRET']
+    header = {'alg': 'HS256', 'typ': 'JWT'}
+    payload = {
+        'user_id': user_id,
+        'email': email,
+        'exp': int(time.time()) + int(timedelta(days=30).total_seconds())
+    }
+    signing_input = '.'.join(base64url(json.dumps(part, separators=(',', ':')).encode()) for part in [header, payload])
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64url(signature)}"
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Вход пользователя - выделенная из auth горячая функция без почтовых зависимостей
+    Args: event - HTTP запрос POST с email и password (action=login необязателен)
+          context - контекст выполнения функции
+    Returns: JSON с токеном, user_id и company_id, как action=login в auth
+    """
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Method not allowed'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        body = json.loads(event.get('body', '{}'))
+        email = body.get('email', '')
+        password = body.get('password', '')
+        
+        if not email or not password:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Email и пароль обязательны'}),
+                'isBase64Encoded': False
+            }
+        
+        password_hash = hash_password(password)
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        # Компания по умолчанию подбирается в том же запросе, без второго обращения к БД
+        cur.execute(f"""
+            SELECT u.id, u.is_email_verified,
+                   COALESCE(u.current_company_id,
+                            (SELECT cu.company_id FROM company_users cu WHERE cu.user_id = u.id LIMIT 1))
+            FROM users u
+            WHERE u.email = {escape_sql_string(email)} AND u.password_hash = {escape_sql_string(password_hash)}
+        """)
+        
+        user = cur.fetchone()
+        cur.close()
+        conn.close()
+        
+        if not user:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неверный email или пароль'}),
+                'isBase64Encoded': False
+            }
+        
+        user_id, is_verified, company_id = user
+        
+        if not is_verified:
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Email не подтверждён. Проверьте почту'}),
+                'isBase64Encoded': False
+            }
+        
+        token = generate_jwt(user_id, email)
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'success': True,
+                'token': token,
+                'user_id': user_id,
+                'company_id': company_id
+            }),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -1,12 +1,11 @@
 import json
 import os
 import psycopg2
-import smtplib
 import secrets
 import hashlib
-import jwt
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import hmac
+import base64
+import time
 from datetime import datetime, timedelta
 from typing import Dict, Any
 
@@ -22,6 +21,11 @@ def escape_sql_string(s: str) -> str:
     return "'" + s.replace("'", "''") + "'"
 
 def send_verification_email(email: str, code: str) -> bool:
+    # Почтовые модули нужны только при отправке - login их не загружает
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    
     try:
         smtp_host = os.environ['SMTP_HOST']
         smtp_port = int(os.environ['SMTP_PORT'])
@@ -60,6 +64,10 @@ def send_verification_email(email: str, code: str) -> bool:
         return False
 
 def send_password_reset_email(email: str, code: str) -> bool:
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    
     try:
         smtp_host = os.environ['SMTP_HOST']
         smtp_port = int(os.environ['SMTP_PORT'])
@@ -100,14 +108,21 @@ def send_password_reset_email(email: str, code: str) -> bool:
 def hash_password(password: str) -> str:
     return hashlib.sha256(password.encode()).hexdigest()
 
+def base64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b'=').decode()
+
 def generate_jwt(user_id: int, email: str) -> str:
+    """HS256-токен на hmac из стандартной библиотеки: вход не загружает PyJWT и его криптобэкенды"""
     secret = os.environ['JWT_SECRET']
+    header = {'alg': 'HS256', 'typ': 'JWT'}
     payload = {
         'user_id': user_id,
         'email': email,
-        'exp': datetime.utcnow() + timedelta(days=30)
+        'exp': int(time.time()) + int(timedelta(days=30).total_seconds())
     }
-    return jwt.encode(payload, secret, algorithm='HS256')
+    signing_input = '.'.join(base64url(json.dumps(part, separators=(',', ':')).encode()) for part in [header, payload])
+    signature = hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+    return f"{signing_input}.{base64url(signature)}"
 
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
@@ -0,0 +1,422 @@
+import json
+import os
+import psycopg2
+from typing import Dict, Any, List, Optional
+
+MAX_OPERATIONS = 200
+
+# entity -> таблица; тот же порядок, в котором сущности ссылаются друг на друга
+ENTITY_TABLES = {
+    'client': 'clients',
+    'project': 'projects',
+    'order': 'orders',
+    'payment': 'payments'
+}
+
+NOT_FOUND_MESSAGES = {
+    'client': 'Клиент не найден',
+    'project': 'Проект не найден',
+    'order': 'Заказ не найден',
+    'payment': 'Платёж не найден'
+}
+
+REMOVED_MESSAGES = {
+    'client': 'Клиент уже удалён',
+    'project': 'Проект уже удалён',
+    'order': 'Заказ уже удалён',
+    'payment': 'Платёж уже удалён'
+}
+
+CONFLICT_MESSAGE = 'Запись изменена другим пользователем, обновите данные'
+
+# Ошибки значений (float('abc'), строка вместо объекта) и ошибки БД отдаются клиенту без текста
+# исключения: в тексте psycopg2 есть SQL и имена ограничений
+INVALID_VALUES_MESSAGE = 'Некорректные значения полей операции'
+DATABASE_ERROR_MESSAGE = 'Операция отклонена базой данных'
+
+class BatchOperationError(Exception):
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def escape_sql_string(s: str) -> str:
+    if s is None:
+        return 'NULL'
+    return "'" + s.replace("'", "''") + "'"
+
+def get_user_company_id(user_id: int, company_id: int, cur) -> int:
+    cur.execute(f"SELECT company_id FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+    result = cur.fetchone()
+    if not result:
+        raise Exception('Доступ к компании запрещён')
+    return result[0]
+
+def bump_entity_version(cur, company_id: int, entity: str):
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        VALUES ({company_id}, {escape_sql_string(entity)}, 1)
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
+def resolve_ref(value, temp_ids: Dict[str, int]) -> Optional[int]:
+    """Ссылка - реальный id или temp_id, объявленный одной из предыдущих операций пакета"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, str) and value in temp_ids:
+        return temp_ids[value]
+    try:
+        return int(value)
+    except (ValueError, TypeError):
+        raise BatchOperationError(400, f'Неизвестная ссылка {value}')
+
+def check_parent(cur, company_id: int, entity: str, parent_id: Optional[int]):
+    """Родитель из другой компании не должен подхватываться по id"""
+    if parent_id is None:
+        return
+    cur.execute(f"SELECT 1 FROM {ENTITY_TABLES[entity]} WHERE id = {parent_id} AND company_id = {company_id}")
+    if not cur.fetchone():
+        raise BatchOperationError(404, NOT_FOUND_MESSAGES[entity])
+
+def lock_row(cur, company_id: int, entity: str, row_id: int, expected_version=None) -> str:
+    """Блокирует строку до конца пакета; expected_version - версия, которую видел клиент (409 при расхождении)"""
+    cur.execute(f"""
+        SELECT status, version FROM {ENTITY_TABLES[entity]}
+        WHERE id = {row_id} AND company_id = {company_id}
+        FOR UPDATE
+    """)
+    row = cur.fetchone()
+    if not row:
+        raise BatchOperationError(404, NOT_FOUND_MESSAGES[entity])
+    if expected_version is not None and str(row[1]) != str(expected_version):
+        raise BatchOperationError(409, CONFLICT_MESSAGE)
+    return row[0]
+
+def normalize_status(status: Optional[str]) -> str:
+    return status if status in ['active', 'archived', 'removed'] else 'active'
+
+def text_sql(data: Dict[str, Any], field: str) -> str:
+    value = (data.get(field) or '').strip()
+    return escape_sql_string(value) if value else 'NULL'
+
+def write_contacts(cur, client_id: int, contacts: List[Dict[str, Any]]):
+    for contact in contacts:
+        full_name = (contact.get('full_name') or '').strip()
+        if not full_name:
+            continue
+        if contact.get('id'):
+            cur.execute(f"""
+                UPDATE client_contacts
+                SET full_name = {escape_sql_string(full_name)},
+                    position = {text_sql(contact, 'position')},
+                    phone = {text_sql(contact, 'phone')},
+                    email = {text_sql(contact, 'email')}
+                WHERE id = {int(contact['id'])} AND client_id = {client_id}
+            """)
+            if cur.rowcount:
+                continue
+        cur.execute(f"""
+            INSERT INTO client_contacts (client_id, full_name, position, phone, email)
+            VALUES ({client_id}, {escape_sql_string(full_name)}, {text_sql(contact, 'position')},
+                    {text_sql(contact, 'phone')}, {text_sql(contact, 'email')})
+        """)
+
+def save_client(cur, company_id: int, row_id: Optional[int], data: Dict[str, Any], temp_ids: Dict[str, int]) -> int:
+    name = (data.get('name') or '').strip()
+    if not name:
+        raise BatchOperationError(400, 'Название клиента обязательно')
+
+    if row_id is None:
+        cur.execute(f"""
+            INSERT INTO clients (company_id, name, notes, status)
+            VALUES ({company_id}, {escape_sql_string(name)}, {text_sql(data, 'notes')}, 'active')
+            RETURNING id
+        """)
+        row_id = cur.fetchone()[0]
+    else:
+        lock_row(cur, company_id, 'client', row_id, data.get('version'))
+        cur.execute(f"""
+            UPDATE clients
+            SET name = {escape_sql_string(name)},
+                notes = {text_sql(data, 'notes')},
+                status = {escape_sql_string(normalize_status(data.get('status')))},
+                updated_at = CURRENT_TIMESTAMP,
+                version = version + 1
+            WHERE id = {row_id} AND company_id = {company_id}
+        """)
+
+    write_contacts(cur, row_id, data.get('contacts') or [])
+    return row_id
+
+def save_project(cur, company_id: int, row_id: Optional[int], data: Dict[str, Any], temp_ids: Dict[str, int]) -> int:
+    name = (data.get('name') or '').strip()
+    if not name:
+        raise BatchOperationError(400, 'Название проекта обязательно')
+
+    client_id = resolve_ref(data.get('client_id'), temp_ids)
+    check_parent(cur, company_id, 'client', client_id)
+    client_id_sql = str(client_id) if client_id else 'NULL'
+
+    if row_id is None:
+        cur.execute(f"""
+            INSERT INTO projects (company_id, name, description, client_id, status)
+            VALUES ({company_id}, {escape_sql_string(name)}, {text_sql(data, 'description')}, {client_id_sql}, 'active')
+            RETURNING id
+        """)
+        return cur.fetchone()[0]
+
+    lock_row(cur, company_id, 'project', row_id, data.get('version'))
+    cur.execute(f"""
+        UPDATE projects
+        SET name = {escape_sql_string(name)},
+            description = {text_sql(data, 'description')},
+            client_id = {client_id_sql},
+            status = {escape_sql_string(normalize_status(data.get('status')))},
+            updated_at = CURRENT_TIMESTAMP,
+            version = version + 1
+        WHERE id = {row_id} AND company_id = {company_id}
+    """)
+    return row_id
+
+def save_order(cur, company_id: int, row_id: Optional[int], data: Dict[str, Any], temp_ids: Dict[str, int]) -> int:
+    name = (data.get('name') or '').strip()
+    if not name:
+        raise BatchOperationError(400, 'Название заказа обязательно')
+
+    project_id = resolve_ref(data.get('project_id'), temp_ids)
+    check_parent(cur, company_id, 'project', project_id)
+    project_id_sql = str(project_id) if project_id else 'NULL'
+    amount = float(data.get('amount') or 0)
+    planned_date_sql = escape_sql_string(data['planned_date']) if data.get('planned_date') else 'NULL'
+    actual_date_sql = escape_sql_string(data['actual_date']) if data.get('actual_date') else 'NULL'
+    order_status_sql = escape_sql_string(data.get('order_status', 'new'))
+    payment_status_sql = escape_sql_string(data.get('payment_status', 'not_paid'))
+    payment_type_sql = escape_sql_string(data.get('payment_type', 'postpaid'))
+
+    if row_id is None:
+        cur.execute(f"""
+            INSERT INTO orders (company_id, name, description, amount, order_status, payment_status,
+                                payment_type, planned_date, actual_date, project_id, status)
+            VALUES ({company_id}, {escape_sql_string(name)}, {text_sql(data, 'description')}, {amount},
+                    {order_status_sql}, {payment_status_sql}, {payment_type_sql},
+                    {planned_date_sql}, {actual_date_sql}, {project_id_sql}, 'active')
+            RETURNING id
+        """)
+        return cur.fetchone()[0]
+
+    lock_row(cur, company_id, 'order', row_id, data.get('version'))
+    cur.execute(f"""
+        UPDATE orders
+        SET name = {escape_sql_string(name)},
+            description = {text_sql(data, 'description')},
+            amount = {amount},
+            order_status = {order_status_sql},
+            status = {escape_sql_string(normalize_status(data.get('status')))},
+            payment_status = {payment_status_sql},
+            payment_type = {payment_type_sql},
+            planned_date = {planned_date_sql},
+            actual_date = {actual_date_sql},
+            project_id = {project_id_sql},
+            updated_at = CURRENT_TIMESTAMP,
+            version = version + 1
+        WHERE id = {row_id} AND company_id = {company_id}
+    """)
+    return row_id
+
+def save_payment(cur, company_id: int, row_id: Optional[int], data: Dict[str, Any], temp_ids: Dict[str, int]) -> int:
+    order_id = resolve_ref(data.get('order_id'), temp_ids)
+    if row_id is None and not order_id:
+        raise BatchOperationError(400, 'Заказ обязателен')
+    check_parent(cur, company_id, 'order', order_id)
+
+    order_id_sql = str(order_id) if order_id else 'NULL'
+    planned_amount_sql = str(float(data['planned_amount'])) if data.get('planned_amount') else 'NULL'
+    planned_amount_percent_sql = str(float(data['planned_amount_percent'])) if data.get('planned_amount_percent') else 'NULL'
+    actual_amount_sql = str(float(data['actual_amount'])) if data.get('actual_amount') else '0'
+    planned_date_sql = escape_sql_string(data['planned_date']) if data.get('planned_date') else 'NULL'
+    actual_date_sql = escape_sql_string(data['actual_date']) if data.get('actual_date') else 'NULL'
+
+    if row_id is None:
+        cur.execute(f"""
+            INSERT INTO payments (company_id, order_id, planned_amount, planned_amount_percent,
+                                  actual_amount, planned_date, actual_date, status)
+            VALUES ({company_id}, {order_id_sql}, {planned_amount_sql}, {planned_amount_percent_sql},
+                    {actual_amount_sql}, {planned_date_sql}, {actual_date_sql}, 'active')
+            RETURNING id
+        """)
+        return cur.fetchone()[0]
+
+    lock_row(cur, company_id, 'payment', row_id, data.get('version'))
+    cur.execute(f"""
+        UPDATE payments
+        SET planned_amount = {planned_amount_sql},
+            planned_amount_percent = {planned_amount_percent_sql},
+            actual_amount = {actual_amount_sql},
+            planned_date = {planned_date_sql},
+            actual_date = {actual_date_sql},
+            order_id = {order_id_sql},
+            status = {escape_sql_string(normalize_status(data.get('status')))},
+            updated_at = CURRENT_TIMESTAMP,
+            version = version + 1
+        WHERE id = {row_id} AND company_id = {company_id}
+    """)
+    return row_id
+
+def remove_row(cur, company_id: int, entity: str, row_id: int, expected_version=None) -> int:
+    if lock_row(cur, company_id, entity, row_id, expected_version) == 'removed':
+        raise BatchOperationError(400, REMOVED_MESSAGES[entity])
+    cur.execute(f"""
+        UPDATE {ENTITY_TABLES[entity]}
+        SET status = 'removed', updated_at = CURRENT_TIMESTAMP, version = version + 1
+        WHERE id = {row_id} AND company_id = {company_id}
+    """)
+    return row_id
+
+SAVE_HANDLERS = {
+    'client': save_client,
+    'project': save_project,
+    'order': save_order,
+    'payment': save_payment
+}
+
+def apply_operation(cur, company_id: int, operation: Dict[str, Any], temp_ids: Dict[str, int]) -> int:
+    if not isinstance(operation, dict) or not isinstance(operation.get('data') or {}, dict):
+        raise BatchOperationError(400, 'Операция и её data должны быть объектами')
+
+    op = operation.get('op')
+    entity = operation.get('entity')
+    if op not in ['create', 'update', 'delete'] or entity not in ENTITY_TABLES:
+        raise BatchOperationError(400, 'op (create/update/delete) и entity (client/project/order/payment) обязательны')
+
+    temp_id = operation.get('temp_id')
+    if temp_id is not None and (op != 'create' or not isinstance(temp_id, str) or temp_id in temp_ids):
+        raise BatchOperationError(400, 'temp_id - уникальная строка и только для create')
+
+    if op == 'create':
+        row_id = SAVE_HANDLERS[entity](cur, company_id, None, operation.get('data') or {}, temp_ids)
+        if temp_id is not None:
+            temp_ids[temp_id] = row_id
+        return row_id
+
+    row_id = resolve_ref(operation.get('id'), temp_ids)
+    if row_id is None:
+        raise BatchOperationError(400, 'id обязателен для update и delete')
+    if op == 'update':
+        return SAVE_HANDLERS[entity](cur, company_id, row_id, operation.get('data') or {}, temp_ids)
+    return remove_row(cur, company_id, entity, row_id, (operation.get('data') or {}).get('version'))
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Пакет операций create/update/delete над клиентами, проектами, заказами и платежами в одной транзакции
+    Args: event - HTTP запрос POST с operations: [{op, entity, temp_id?, id?, data}];
+                  ссылки client_id/project_id/order_id и id могут указывать на temp_id предыдущих операций
+          context - контекст выполнения функции
+    Returns: JSON с id по каждой операции и соответствием temp_id -> id; при ошибке пакет откатывается целиком
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        body = json.loads(event.get('body', '{}'))
+        operations = body.get('operations')
+
+        if not isinstance(operations, list) or not operations or len(operations) > MAX_OPERATIONS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'operations - непустой список до {MAX_OPERATIONS} операций'}),
+                'isBase64Encoded': False
+            }
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        get_user_company_id(user_id, company_id, cur)
+
+        temp_ids = {}
+        results = []
+        touched = set()
+
+        for index, operation in enumerate(operations):
+            error = None
+            try:
+                row_id = apply_operation(cur, company_id, operation, temp_ids)
+            except BatchOperationError as e:
+                error = e
+            except (TypeError, ValueError, AttributeError):
+                error = BatchOperationError(400, INVALID_VALUES_MESSAGE)
+            except psycopg2.Error:
+                error = BatchOperationError(400, DATABASE_ERROR_MESSAGE)
+
+            if error:
+                conn.rollback()
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': error.status_code,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error.message, 'index': index}),
+                    'isBase64Encoded': False
+                }
+            results.append({'op': operation['op'], 'entity': operation['entity'], 'id': row_id})
+            touched.add(ENTITY_TABLES[operation['entity']])
+
+        for table in touched:
+            bump_entity_version(cur, company_id, table)
+
+        conn.commit()
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': True, 'results': results, 'ids': temp_ids}),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -0,0 +1,326 @@
+import json
+import os
+import psycopg2
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+def growth(part: float, total: float) -> int:
+    return round((part / total * 100) if total > 0 else 0)
+
+def load_stats(cur, company_id: int) -> Dict[str, Any]:
+    """Все показатели дашборда одним запросом вместо девяти"""
+    one_month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+
+    cur.execute(f"""
+        SELECT
+            (SELECT COUNT(*) FROM clients WHERE company_id = {company_id}),
+            (SELECT COUNT(*) FROM clients WHERE company_id = {company_id} AND created_at >= '{one_month_ago}'),
+            (SELECT COUNT(*) FROM projects WHERE company_id = {company_id}),
+            (SELECT COUNT(*) FROM projects WHERE company_id = {company_id} AND created_at >= '{one_month_ago}'),
+            (SELECT COALESCE(SUM(actual_amount), 0) FROM payments WHERE company_id = {company_id}),
+            (SELECT COALESCE(SUM(actual_amount), 0) FROM payments WHERE company_id = {company_id} AND actual_date >= '{one_month_ago}'),
+            (SELECT COUNT(*) FROM orders WHERE company_id = {company_id}),
+            (SELECT COUNT(*) FROM orders WHERE company_id = {company_id} AND created_at >= '{one_month_ago}')
+    """)
+    row = cur.fetchone()
+    clients_total, clients_new, projects_total, projects_new = row[0], row[1], row[2], row[3]
+    revenue_total, revenue_month = float(row[4]), float(row[5])
+    orders_total, orders_new = row[6], row[7]
+
+    return {
+        'clients': {'total': clients_total, 'growth': growth(clients_new, clients_total)},
+        'projects': {'total': projects_total, 'growth': growth(projects_new, projects_total)},
+        'revenue': {'total': revenue_total, 'growth': growth(revenue_month, revenue_total)},
+        'orders': {'total': orders_total, 'growth': growth(orders_new, orders_total)}
+    }
+
+def load_clients(cur, company_id: int, limit: int) -> List[Dict[str, Any]]:
+    cur.execute(f"""
+        SELECT c.id, c.name, c.notes, c.status, c.created_at,
+               (SELECT COUNT(*) FROM client_contacts cc WHERE cc.client_id = c.id) as contacts_count
+        FROM clients c
+        WHERE c.company_id = {company_id} AND c.status = 'active'
+        ORDER BY c.created_at DESC
+        LIMIT {limit}
+    """)
+    return [
+        {
+            'id': row[0],
+            'name': row[1],
+            'notes': row[2],
+            'status': row[3],
+            'created_at': iso(row[4]),
+            'contacts_count': row[5]
+        }
+        for row in cur.fetchall()
+    ]
+
+def load_projects(cur, company_id: int, limit: int) -> List[Dict[str, Any]]:
+    cur.execute(f"""
+        SELECT p.id, p.name, p.description, p.status, p.client_id, p.created_at,
+               c.name as client_name
+        FROM projects p
+        LEFT JOIN clients c ON p.client_id = c.id
+        WHERE p.company_id = {company_id} AND p.status = 'active'
+        ORDER BY p.created_at DESC
+        LIMIT {limit}
+    """)
+    return [
+        {
+            'id': row[0],
+            'name': row[1],
+            'description': row[2],
+            'status': row[3],
+            'client_id': row[4],
+            'created_at': iso(row[5]),
+            'client_name': row[6]
+        }
+        for row in cur.fetchall()
+    ]
+
+def load_orders(cur, company_id: int, limit: int) -> List[Dict[str, Any]]:
+    cur.execute(f"""
+        SELECT o.id, o.name, o.description, o.amount, o.order_status, o.payment_status,
+               o.payment_type, o.planned_date, o.project_id, o.created_at,
+               p.name as project_name, c.name as client_name
+        FROM orders o
+        LEFT JOIN projects p ON o.project_id = p.id
+        LEFT JOIN clients c ON p.client_id = c.id
+        WHERE o.company_id = {company_id} AND o.status = 'active'
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT {limit}
+    """)
+    return [
+        {
+            'id': row[0],
+            'name': row[1],
+            'description': row[2],
+            'amount': float(row[3]) if row[3] else 0,
+            'order_status': row[4],
+            'payment_status': row[5],
+            'payment_type': row[6],
+            'planned_date': iso(row[7]),
+            'project_id': row[8],
+            'created_at': iso(row[9]),
+            'project_name': row[10],
+            'client_name': row[11]
+        }
+        for row in cur.fetchall()
+    ]
+
+def load_payments(cur, company_id: int, limit: int) -> List[Dict[str, Any]]:
+    cur.execute(f"""
+        SELECT p.id, p.planned_amount, p.planned_amount_percent, p.actual_amount,
+               p.planned_date, p.actual_date, p.order_id, p.created_at,
+               o.name as order_name, o.amount as order_amount,
+               pr.name as project_name, c.name as client_name
+        FROM payments p
+        LEFT JOIN orders o ON p.order_id = o.id AND o.company_id = p.company_id
+        LEFT JOIN projects pr ON o.project_id = pr.id
+        LEFT JOIN clients c ON pr.client_id = c.id
+        WHERE p.company_id = {company_id} AND p.status = 'active'
+        ORDER BY p.planned_date DESC NULLS LAST, p.created_at DESC
+        LIMIT {limit}
+    """)
+    return [
+        {
+            'id': row[0],
+            'planned_amount': float(row[1]) if row[1] else None,
+            'planned_amount_percent': float(row[2]) if row[2] else None,
+            'actual_amount': float(row[3]) if row[3] else 0,
+            'planned_date': iso(row[4]),
+            'actual_date': iso(row[5]),
+            'order_id': row[6],
+            'created_at': iso(row[7]),
+            'order_name': row[8],
+            'order_amount': float(row[9]) if row[9] else 0,
+            'project_name': row[10],
+            'client_name': row[11]
+        }
+        for row in cur.fetchall()
+    ]
+
+def load_employees(cur, company_id: int) -> List[Dict[str, Any]]:
+    cur.execute(f"""
+        SELECT u.id, u.email, u.first_name, u.last_name, u.middle_name,
+               u.phone, u.avatar_url, cu.role, cu.created_at
+        FROM users u
+        JOIN company_users cu ON u.id = cu.user_id
+        WHERE cu.company_id = {company_id}
+        ORDER BY
+            CASE cu.role
+                WHEN 'owner' THEN 1
+                WHEN 'admin' THEN 2
+                WHEN 'user' THEN 3
+                WHEN 'viewer' THEN 4
+                ELSE 5
+            END,
+            u.last_name, u.first_name
+    """)
+    return [
+        {
+            'id': emp[0],
+            'email': emp[1],
+            'first_name': emp[2],
+            'last_name': emp[3],
+            'middle_name': emp[4],
+            'phone': emp[5],
+            'avatar_url': emp[6],
+            'role': emp[7],
+            'joined_at': iso(emp[8]),
+            'status': 'active'
+        }
+        for emp in cur.fetchall()
+    ]
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Стартовые данные дашборда одним вызовом: профиль, компании, статистика и первые страницы списков
+    Args: event - HTTP запрос GET с X-User-Id и необязательным X-Company-Id
+          context - контекст выполнения функции
+    Returns: JSON со всеми данными для первой отрисовки
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_sql = str(int(company_id_header)) if company_id_header else 'u.current_company_id'
+
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            limit = int(query_params.get('limit', DEFAULT_PAGE_SIZE))
+        except ValueError:
+            limit = DEFAULT_PAGE_SIZE
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        # Профиль и членство в выбранной компании проверяются одним запросом
+        cur.execute(f"""
+            SELECT u.id, u.email, u.first_name, u.last_name, u.middle_name, u.phone,
+                   u.avatar_url, u.is_email_verified, u.created_at, u.current_company_id,
+                   cu.company_id, cu.role
+            FROM users u
+            LEFT JOIN company_users cu ON cu.user_id = u.id AND cu.company_id = {company_sql}
+            WHERE u.id = {user_id}
+        """)
+        user = cur.fetchone()
+
+        if not user:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Пользователь не найден'}),
+                'isBase64Encoded': False
+            }
+
+        company_id = user[10]
+        user_role = user[11]
+
+        if company_id_header and not company_id:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                'isBase64Encoded': False
+            }
+
+        cur.execute(f"""
+            SELECT c.id, c.name, cu.role
+            FROM companies c
+            JOIN company_users cu ON c.id = cu.company_id
+            WHERE cu.user_id = {user_id}
+            ORDER BY c.name
+        """)
+        companies = [{'id': c[0], 'name': c[1], 'role': c[2]} for c in cur.fetchall()]
+
+        result = {
+            'profile': {
+                'id': user[0],
+                'email': user[1],
+                'first_name': user[2],
+                'last_name': user[3],
+                'middle_name': user[4],
+                'phone': user[5],
+                'avatar_url': user[6],
+                'is_email_verified': user[7],
+                'created_at': iso(user[8]),
+                'current_company_id': user[9],
+                'companies': companies
+            },
+            'company_id': company_id,
+            'current_user_role': user_role
+        }
+
+        if company_id:
+            result['stats'] = load_stats(cur, company_id)
+            result['clients'] = load_clients(cur, company_id, limit)
+            result['projects'] = load_projects(cur, company_id, limit)
+            result['orders'] = load_orders(cur, company_id, limit)
+            result['payments'] = load_payments(cur, company_id, limit)
+            result['employees'] = load_employees(cur, company_id)
+
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -0,0 +1,230 @@
+import json
+import os
+import psycopg2
+from typing import Dict, Any, Callable, Optional
+
+# Ограничение на весь каскад: даже для клиента с десятками тысяч заказов операция не висит дольше
+STATEMENT_TIMEOUT = '25s'
+
+# operation -> (статус, из которого переводим, статус, в который переводим)
+OPERATIONS = {
+    'archive': ('active', 'archived'),
+    'restore': ('archived', 'active')
+}
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def escape_sql_string(s: str) -> str:
+    if s is None:
+        return 'NULL'
+    return "'" + s.replace("'", "''") + "'"
+
+def get_user_company_id(user_id: int, company_id: int, cur) -> int:
+    cur.execute(f"SELECT company_id FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+    result = cur.fetchone()
+    if not result:
+        raise Exception('Доступ к компании запрещён')
+    return result[0]
+
+def bump_entity_version(cur, company_id: int, entity: str):
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        VALUES ({company_id}, {escape_sql_string(entity)}, 1)
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
+def enqueue_cascade_job(cur, company_id: int, user_id: int, entity: str, root_id: int, operation: str) -> int:
+    """Передаёт каскад в очередь jobs (функция jobs выполняет его с прогрессом)"""
+    payload = json.dumps({'entity': entity, 'id': root_id, 'operation': operation})
+    cur.execute(f"""
+        INSERT INTO jobs (company_id, user_id, kind, payload)
+        VALUES ({company_id}, {user_id}, 'cascade', {escape_sql_string(payload)})
+        RETURNING id
+    """)
+    return cur.fetchone()[0]
+
+def cascade_status(cur, company_id: int, entity: str, root_id: int, from_status: str, to_status: str,
+                   progress: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+    """
+    Переводит клиента или проект вместе с поддеревом из from_status в to_status несколькими
+    UPDATE по множествам и поднимает версии затронутых сущностей. Строка корня должна быть
+    заблокирована вызывающим (SELECT ... FOR UPDATE).
+    Архивация помечает переведённые строки поддерева меткой корня ('client:12'), восстановление
+    возвращает только строки с этой меткой (для проекта - ещё и с меткой каскада, заархивировавшего
+    сам проект) и снимает её: заархивированное вручную остаётся в архиве.
+    Функция jobs держит дословную копию для фонового каскада - правится здесь и копируется туда,
+    совпадение проверяет scripts/check_shared_code.py.
+    """
+    if entity == 'client':
+        projects_sql = f"SELECT id FROM projects WHERE company_id = {company_id} AND client_id = {root_id}"
+    else:
+        projects_sql = str(root_id)
+    orders_sql = f"SELECT id FROM orders WHERE company_id = {company_id} AND project_id IN ({projects_sql})"
+    root_table = 'clients' if entity == 'client' else 'projects'
+
+    # (таблица, условие поддерева, строки помечаются меткой каскада)
+    steps = [
+        ('payments', f"order_id IN ({orders_sql})", True),
+        ('orders', f"project_id IN ({projects_sql})", True)
+    ]
+    if entity == 'client':
+        steps.append(('projects', f"client_id = {root_id}", True))
+    steps.append((root_table, f"id = {root_id}", False))
+
+    marker = f"{entity}:{root_id}"
+    if to_status == 'archived':
+        marker_set_sql = escape_sql_string(marker)
+        marker_where_sql = ''
+    else:
+        markers = [marker]
+        if entity == 'project':
+            cur.execute(f"SELECT archived_by_cascade FROM projects WHERE id = {root_id} AND company_id = {company_id}")
+            row = cur.fetchone()
+            if row and row[0]:
+                markers.append(row[0])
+        marker_set_sql = 'NULL'
+        marker_where_sql = f" AND archived_by_cascade IN ({', '.join(escape_sql_string(m) for m in markers)})"
+
+    from_sql = escape_sql_string(from_status)
+    to_sql = escape_sql_string(to_status)
+    counts = {}
+
+    for index, (table, condition_sql, marked) in enumerate(steps):
+        if progress:
+            progress(index * 100 // len(steps), f'Обновление {table}')
+        set_sql = f", archived_by_cascade = {marker_set_sql}" if marked else ''
+        where_sql = marker_where_sql if marked else ''
+        cur.execute(f"""
+            UPDATE {table} SET status = {to_sql}, updated_at = CURRENT_TIMESTAMP, version = version + 1{set_sql}
+            WHERE company_id = {company_id} AND status = {from_sql} AND {condition_sql}{where_sql}
+        """)
+        counts[table] = counts.get(table, 0) + cur.rowcount
+
+    for table, count in counts.items():
+        if count:
+            bump_entity_version(cur, company_id, table)
+
+    return counts
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Каскадная архивация и восстановление клиента или проекта вместе с проектами, заказами и платежами
+    Args: event - HTTP запрос POST с entity (client/project), id и operation (archive/restore);
+                  с async=true каскад ставится в очередь jobs
+          context - контекст выполнения функции
+    Returns: JSON с количеством изменённых строк по сущностям или 202 с job_id
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        body = json.loads(event.get('body', '{}'))
+        entity = body.get('entity')
+        root_id = body.get('id')
+        operation = body.get('operation')
+
+        if entity not in ['client', 'project'] or not root_id or operation not in OPERATIONS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'entity (client/project), id и operation (archive/restore) обязательны'}),
+                'isBase64Encoded': False
+            }
+
+        root_id = int(root_id)
+        from_status, to_status = OPERATIONS[operation]
+        root_table = 'clients' if entity == 'client' else 'projects'
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        get_user_company_id(user_id, company_id, cur)
+
+        if body.get('async'):
+            job_id = enqueue_cascade_job(cur, company_id, user_id, entity, root_id, operation)
+            conn.commit()
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 202,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'job_id': job_id}),
+                'isBase64Encoded': False
+            }
+
+        cur.execute(f"SET LOCAL statement_timeout = '{STATEMENT_TIMEOUT}'")
+
+        cur.execute(f"""
+            SELECT status FROM {root_table}
+            WHERE id = {root_id} AND company_id = {company_id}
+            FOR UPDATE
+        """)
+        row = cur.fetchone()
+
+        if not row or row[0] == 'removed':
+            conn.rollback()
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 404,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Клиент не найден' if entity == 'client' else 'Проект не найден'}),
+                'isBase64Encoded': False
+            }
+
+        counts = cascade_status(cur, company_id, entity, root_id, from_status, to_status)
+
+        conn.commit()
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'success': True, 'status': to_status, 'counts': counts}),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -0,0 +1,291 @@
+import calendar
+import json
+import os
+import psycopg2
+from datetime import date
+from typing import Dict, Any, List, Tuple
+
+DEFAULT_MONTHS = 3
+MAX_MONTHS = 24
+
+# Опоздание оплаты в днях, которое учитывает распределение; выбросы прижимаются к краям
+MIN_DELAY_DAYS = -30
+MAX_DELAY_DAYS = 180
+
+# Клиенту с меньшим числом оплат в истории подмешивается распределение по компании
+MIN_CLIENT_HISTORY = 5
+
+# Платежей в одной матрице (платёж x сдвиг): ограничивает память при десятках тысяч открытых платежей
+CHUNK_SIZE = 5000
+
+# Прогноз зависит от платежей, сумм заказов (planned_amount_percent) и привязки проектов к клиентам
+FORECAST_ETAG_ENTITIES = ['payments', 'orders', 'projects']
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def escape_sql_string(s: str) -> str:
+    if s is None:
+        return 'NULL'
+    return "'" + s.replace("'", "''") + "'"
+
+def get_user_company_id(user_id: int, company_id: int, cur) -> int:
+    cur.execute(f"SELECT company_id FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+    result = cur.fetchone()
+    if not result:
+        raise Exception('Доступ к компании запрещён')
+    return result[0]
+
+def get_entities_etag(cur, company_id: int, entities: List[str]) -> str:
+    """ETag списка/карточки из счётчиков версий сущностей, от которых зависит ответ"""
+    entities_sql = ', '.join(escape_sql_string(e) for e in entities)
+    cur.execute(f"""
+        SELECT entity, version FROM entity_versions
+        WHERE company_id = {company_id} AND entity IN ({entities_sql})
+    """)
+    versions = dict(cur.fetchall())
+    return 'W/"' + '-'.join([f"c{company_id}"] + [f"{e}{versions.get(e, 0)}" for e in entities]) + '"'
+
+def add_months(day: date, months: int) -> date:
+    month_index = day.month - 1 + months
+    year = day.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(day.day, calendar.monthrange(year, month)[1]))
+
+def load_open_payments(cur, company_id: int) -> List[Tuple]:
+    """Открытые платежи: (client_id, planned_date, ожидаемый остаток)"""
+    cur.execute(f"""
+        SELECT COALESCE(pr.client_id, 0), p.planned_date,
+               COALESCE(p.planned_amount, o.amount * p.planned_amount_percent / 100) - COALESCE(p.actual_amount, 0)
+        FROM payments p
+        JOIN orders o ON o.id = p.order_id AND o.company_id = p.company_id
+        LEFT JOIN projects pr ON pr.id = o.project_id
+        WHERE p.company_id = {company_id}
+          AND p.status = 'active' AND o.status = 'active'
+          AND p.planned_date IS NOT NULL
+          AND COALESCE(p.planned_amount, o.amount * p.planned_amount_percent / 100) > COALESCE(p.actual_amount, 0)
+    """)
+    return cur.fetchall()
+
+def load_delays(cur, company_id: int) -> List[Tuple]:
+    """История оплат: (client_id, опоздание в днях)"""
+    cur.execute(f"""
+        SELECT COALESCE(pr.client_id, 0), p.actual_date - p.planned_date
+        FROM payments p
+        JOIN orders o ON o.id = p.order_id AND o.company_id = p.company_id
+        LEFT JOIN projects pr ON pr.id = o.project_id
+        WHERE p.company_id = {company_id}
+          AND p.status <> 'removed'
+          AND p.planned_date IS NOT NULL AND p.actual_date IS NOT NULL
+          AND p.actual_amount > 0
+    """)
+    return cur.fetchall()
+
+def compute_forecast(open_payments: List[Tuple], delays: List[Tuple], today: date, months: int) -> Dict[str, Any]:
+    """
+    Ожидаемые поступления по дням: каждый открытый платёж размазывается по распределению
+    опозданий его клиента. Для просроченных платежей распределение обрезается по сегодняшний
+    день и нормируется заново: раз оплаты ещё нет, опоздание не меньше уже прошедшего.
+    """
+    import numpy as np
+
+    horizon_end = add_months(today, months)
+    horizon_days = (horizon_end - today).days
+    offsets = np.arange(MIN_DELAY_DAYS, MAX_DELAY_DAYS + 1)
+    width = len(offsets)
+
+    delay_clients = np.array([row[0] for row in delays], dtype=np.int64)
+    delay_values = np.clip(np.array([row[1] for row in delays], dtype=np.int64), MIN_DELAY_DAYS, MAX_DELAY_DAYS)
+
+    # Распределение по компании; без истории - оплата точно в срок
+    company_dist = np.bincount(delay_values - MIN_DELAY_DAYS, minlength=width).astype(np.float64)
+    if company_dist.sum() == 0:
+        company_dist[-MIN_DELAY_DAYS] = 1.0
+    company_dist /= company_dist.sum()
+
+    pay_clients = np.array([row[0] for row in open_payments], dtype=np.int64)
+    client_ids, pay_client_index = np.unique(pay_clients, return_inverse=True)
+
+    # Для каждого клиента: гистограмма его опозданий, смешанная с компанией пропорционально объёму истории
+    client_position = np.searchsorted(client_ids, delay_clients)
+    known = (client_position < len(client_ids))
+    known[known] = client_ids[client_position[known]] == delay_clients[known]
+    counts = np.zeros((len(client_ids), width))
+    np.add.at(counts, (client_position[known], delay_values[known] - MIN_DELAY_DAYS), 1)
+    history = counts.sum(axis=1)
+    weight = np.minimum(history / MIN_CLIENT_HISTORY, 1.0)[:, None]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        own = np.where(history[:, None] > 0, counts / history[:, None], 0.0)
+    client_dist = weight * own + (1 - weight) * company_dist[None, :]
+
+    planned_offsets = np.array([(row[1] - today).days for row in open_payments], dtype=np.int64)
+    amounts = np.array([float(row[2]) for row in open_payments], dtype=np.float64)
+
+    daily_expected = np.zeros(horizon_days)
+    daily_planned = np.zeros(horizon_days)
+    beyond_horizon = 0.0
+
+    in_horizon = (planned_offsets >= 0) & (planned_offsets < horizon_days)
+    np.add.at(daily_planned, planned_offsets[in_horizon], amounts[in_horizon])
+    overdue_planned = float(amounts[planned_offsets < 0].sum())
+
+    for start in range(0, len(open_payments), CHUNK_SIZE):
+        chunk = slice(start, start + CHUNK_SIZE)
+        probabilities = client_dist[pay_client_index[chunk]]
+        days = planned_offsets[chunk, None] + offsets[None, :]
+
+        probabilities = np.where(days >= 0, probabilities, 0.0)
+        mass = probabilities.sum(axis=1)
+        # Просрочено сильнее любого опоздания из истории - ждём оплату сегодня
+        exhausted = mass == 0
+        probabilities[exhausted, :] = 0.0
+        days[exhausted, :] = 0
+        probabilities[exhausted, 0] = 1.0
+        mass[exhausted] = 1.0
+
+        weights = probabilities / mass[:, None] * amounts[chunk, None]
+        inside = (days >= 0) & (days < horizon_days)
+        daily_expected += np.bincount(days[inside], weights=weights[inside], minlength=horizon_days)
+        beyond_horizon += float(weights[days >= horizon_days].sum())
+
+    dates = np.arange(np.datetime64(today.isoformat()), np.datetime64(horizon_end.isoformat()))
+    # 1970-01-01 - четверг; неделя начинается с понедельника
+    weekdays = (dates.view('int64') + 3) % 7
+    week_starts = dates - weekdays.astype('timedelta64[D]')
+    month_starts = dates.astype('datetime64[M]').astype('datetime64[D]')
+
+    def buckets(keys):
+        unique_keys, index = np.unique(keys, return_inverse=True)
+        expected = np.bincount(index, weights=daily_expected, minlength=len(unique_keys))
+        planned = np.bincount(index, weights=daily_planned, minlength=len(unique_keys))
+        return [
+            {'start': str(key), 'expected': round(float(e), 2), 'planned': round(float(p), 2)}
+            for key, e, p in zip(unique_keys, expected, planned)
+        ]
+
+    return {
+        'forecast_date': today.isoformat(),
+        'months': months,
+        'horizon_end': horizon_end.isoformat(),
+        'weekly': buckets(week_starts),
+        'monthly': buckets(month_starts),
+        'totals': {
+            'open_payments': len(open_payments),
+            'open_amount': round(float(amounts.sum()), 2),
+            'overdue_amount': round(overdue_planned, 2),
+            'expected_in_horizon': round(float(daily_expected.sum()), 2),
+            'expected_beyond_horizon': round(beyond_horizon, 2)
+        },
+        'lateness': {
+            'history_payments': len(delays),
+            'clients_with_history': int((history >= MIN_CLIENT_HISTORY).sum()),
+            'company_mean_delay_days': round(float((company_dist * offsets).sum()), 1),
+            'company_on_time_share': round(float(company_dist[:-MIN_DELAY_DAYS + 1].sum()), 3)
+        }
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Прогноз поступлений по неделям и месяцам из плановых платежей с учётом опозданий клиентов
+    Args: event - HTTP запрос GET с необязательным months (по умолчанию 3, до 24)
+          context - контекст выполнения функции
+    Returns: JSON с недельными и месячными корзинами ожидаемых и плановых поступлений
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            months = int(query_params.get('months', DEFAULT_MONTHS))
+        except (ValueError, TypeError):
+            months = 0
+
+        if months < 1 or months > MAX_MONTHS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': f'months должен быть от 1 до {MAX_MONTHS}'}),
+                'isBase64Encoded': False
+            }
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        get_user_company_id(user_id, company_id, cur)
+
+        today = date.today()
+        cache_key = f"{get_entities_etag(cur, company_id, FORECAST_ETAG_ENTITIES)}-{today.isoformat()}"
+
+        cur.execute(f"""
+            SELECT result FROM forecast_cache
+            WHERE company_id = {company_id} AND months = {months} AND cache_key = {escape_sql_string(cache_key)}
+        """)
+        cached = cur.fetchone()
+
+        if cached:
+            forecast = cached[0]
+            forecast['cached'] = True
+        else:
+            forecast = compute_forecast(load_open_payments(cur, company_id), load_delays(cur, company_id), today, months)
+            cur.execute(f"""
+                INSERT INTO forecast_cache (company_id, months, cache_key, result)
+                VALUES ({company_id}, {months}, {escape_sql_string(cache_key)}, {escape_sql_string(json.dumps(forecast))})
+                ON CONFLICT (company_id, months) DO UPDATE SET
+                    cache_key = EXCLUDED.cache_key, result = EXCLUDED.result, created_at = CURRENT_TIMESTAMP
+            """)
+            conn.commit()
+            forecast['cached'] = False
+
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(forecast),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
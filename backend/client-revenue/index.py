@@ -0,0 +1,235 @@
+import json
+import math
+import os
+import psycopg2
+from typing import Dict, Any, Optional
+
+DEFAULT_TOP = 50
+MAX_TOP = 1000
+
+# sort -> колонка client_revenue; у каждой свой индекс (company_id, колонка DESC)
+RANKING_COLUMNS = {
+    'actual_revenue': 'cr.actual_revenue DESC',
+    'receivables': 'cr.receivables DESC',
+    'last_payment_date': 'cr.last_payment_date DESC NULLS LAST'
+}
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def get_user_company_id(user_id: int, company_id: int, cur) -> int:
+    cur.execute(f"SELECT company_id FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+    result = cur.fetchone()
+    if not result:
+        raise Exception('Доступ к компании запрещён')
+    return result[0]
+
+def refresh_client_revenue(cur, company_id: int, batch_size: Optional[int] = None) -> int:
+    """
+    Пересчитывает агрегаты только для клиентов, помеченных триггерами в client_revenue_dirty.
+    Метки снимаются и агрегаты пишутся одним оператором, поэтому запись, закоммиченная
+    во время пересчёта, оставит свою метку до следующего вызова. С batch_size берёт не больше
+    batch_size меток и пропускает заблокированные параллельным пересчётом.
+    Функция jobs держит дословную копию для фонового пересчёта - правится здесь и копируется туда,
+    совпадение проверяет scripts/check_shared_code.py.
+    """
+    batch_sql = ''
+    if batch_size:
+        batch_sql = f"""AND client_id IN (
+                SELECT client_id FROM client_revenue_dirty
+                WHERE company_id = {company_id}
+                ORDER BY client_id
+                LIMIT {batch_size}
+                FOR UPDATE SKIP LOCKED
+            )"""
+    cur.execute(f"""
+        WITH dirty AS (
+            DELETE FROM client_revenue_dirty
+            WHERE company_id = {company_id} {batch_sql}
+            RETURNING client_id
+        ),
+        dirty_orders AS (
+            SELECT pr.client_id, o.amount, pm.actual, pm.last_date
+            FROM (SELECT DISTINCT client_id FROM dirty) d
+            JOIN projects pr ON pr.client_id = d.client_id AND pr.company_id = {company_id} AND pr.status <> 'removed'
+            JOIN orders o ON o.project_id = pr.id AND o.company_id = {company_id} AND o.status <> 'removed'
+            LEFT JOIN LATERAL (
+                SELECT COALESCE(SUM(p.actual_amount), 0) AS actual,
+                       MAX(p.actual_date) FILTER (WHERE p.actual_amount > 0) AS last_date
+                FROM payments p
+                WHERE p.order_id = o.id AND p.company_id = {company_id} AND p.status <> 'removed'
+            ) pm ON true
+        )
+        INSERT INTO client_revenue (company_id, client_id, orders_count, contracted_amount,
+                                    actual_revenue, receivables, last_payment_date, refreshed_at)
+        SELECT {company_id}, d.client_id,
+               COUNT(dor.amount),
+               COALESCE(SUM(dor.amount), 0),
+               COALESCE(SUM(dor.actual), 0),
+               COALESCE(SUM(GREATEST(dor.amount - dor.actual, 0)), 0),
+               MAX(dor.last_date),
+               CURRENT_TIMESTAMP
+        FROM (SELECT DISTINCT client_id FROM dirty) d
+        LEFT JOIN dirty_orders dor ON dor.client_id = d.client_id
+        GROUP BY d.client_id
+        ON CONFLICT (company_id, client_id) DO UPDATE SET
+            orders_count = EXCLUDED.orders_count,
+            contracted_amount = EXCLUDED.contracted_amount,
+            actual_revenue = EXCLUDED.actual_revenue,
+            receivables = EXCLUDED.receivables,
+            last_payment_date = EXCLUDED.last_payment_date,
+            refreshed_at = EXCLUDED.refreshed_at
+    """)
+    return cur.rowcount
+
+def parse_percentile(value: Optional[str]) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    percentile = float(value)
+    if not math.isfinite(percentile):
+        raise ValueError(value)
+    if percentile > 1:
+        percentile = percentile / 100
+    if percentile < 0 or percentile > 1:
+        raise ValueError(value)
+    return percentile
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Рейтинг клиентов компании по выручке, дебиторской задолженности и дате последней оплаты
+    Args: event - HTTP запрос GET с необязательными sort, top и percentile (0-1 или 0-100)
+          context - контекст выполнения функции
+    Returns: JSON со списком клиентов, итогами по компании и порогом перцентиля
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        query_params = event.get('queryStringParameters') or {}
+        sort = query_params.get('sort', 'actual_revenue')
+        try:
+            top = max(1, min(int(query_params.get('top', DEFAULT_TOP)), MAX_TOP))
+            percentile = parse_percentile(query_params.get('percentile'))
+        except (ValueError, TypeError):
+            sort = None
+
+        if sort not in RANKING_COLUMNS:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректные параметры отчёта'}),
+                'isBase64Encoded': False
+            }
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        get_user_company_id(user_id, company_id, cur)
+
+        refreshed = refresh_client_revenue(cur, company_id)
+        conn.commit()
+
+        cur.execute(f"""
+            SELECT COUNT(*),
+                   COALESCE(SUM(cr.actual_revenue), 0),
+                   COALESCE(SUM(cr.receivables), 0),
+                   {f"percentile_cont({percentile}) WITHIN GROUP (ORDER BY cr.actual_revenue)" if percentile is not None else 'NULL'}
+            FROM client_revenue cr
+            JOIN clients c ON c.id = cr.client_id AND c.company_id = cr.company_id
+            WHERE cr.company_id = {company_id} AND c.status <> 'removed'
+        """)
+        clients_count, total_revenue, total_receivables, cutoff = cur.fetchone()
+
+        cutoff_sql = f"AND cr.actual_revenue >= {float(cutoff)}" if cutoff is not None else ''
+
+        cur.execute(f"""
+            SELECT c.id, c.name, c.status, cr.orders_count, cr.contracted_amount,
+                   cr.actual_revenue, cr.receivables, cr.last_payment_date, cr.refreshed_at
+            FROM client_revenue cr
+            JOIN clients c ON c.id = cr.client_id AND c.company_id = cr.company_id
+            WHERE cr.company_id = {company_id} AND c.status <> 'removed' {cutoff_sql}
+            ORDER BY {RANKING_COLUMNS[sort]}, c.id
+            LIMIT {top}
+        """)
+        rows = cur.fetchall()
+
+        clients = []
+        for rank, row in enumerate(rows, start=1):
+            clients.append({
+                'rank': rank,
+                'client_id': row[0],
+                'name': row[1],
+                'status': row[2],
+                'orders_count': row[3],
+                'contracted_amount': float(row[4]),
+                'actual_revenue': float(row[5]),
+                'receivables': float(row[6]),
+                'revenue_share': float(row[5]) / float(total_revenue) if total_revenue else 0,
+                'last_payment_date': row[7].isoformat() if row[7] else None,
+                'refreshed_at': row[8].isoformat() if row[8] else None
+            })
+
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'clients': clients,
+                'sort': sort,
+                'top': top,
+                'percentile': percentile,
+                'revenue_cutoff': float(cutoff) if cutoff is not None else None,
+                'totals': {
+                    'clients_count': clients_count,
+                    'actual_revenue': float(total_revenue),
+                    'receivables': float(total_receivables)
+                },
+                'refreshed_clients': refreshed
+            }),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -1,8 +1,10 @@
+import hashlib
 import json
+import math
 import os
 import psycopg2
-from datetime import datetime
-from typing import Dict, Any, List
+from datetime import datetime, date
+from typing import Dict, Any, List, Tuple, Optional
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
@@ -20,6 +22,436 @@ def get_user_company_id(user_id: int, company_id: int, cur) -> int:
         raise Exception('Доступ к компании запрещён')
     return result[0]
 
+CLIENTS_ETAG_ENTITIES = ['clients']
+
+def get_entities_etag(cur, company_id: int, entities: List[str], dated: bool = False) -> str:
+    """
+    ETag списка/карточки из счётчиков версий сущностей, от которых зависит ответ.
+    dated - ответ считается от CURRENT_DATE (просрочка платежей), дата БД входит в ETag,
+    как дата в ключе кэша прогноза: в полночь ответ меняется без единой записи
+    """
+    entities_sql = ', '.join(escape_sql_string(e) for e in entities)
+    cur.execute(f"""
+        SELECT CURRENT_DATE, COALESCE((
+            SELECT json_object_agg(entity, version) FROM entity_versions
+            WHERE company_id = {company_id} AND entity IN ({entities_sql})
+        ), '{{}}'::json)
+    """)
+    today, versions = cur.fetchone()
+    parts = [f"c{company_id}"] + [f"{e}{versions.get(e, 0)}" for e in entities]
+    if dated:
+        parts.append(f"d{today.isoformat()}")
+    return 'W/"' + '-'.join(parts) + '"'
+
+def member_sql(user_id: int, company_id: int) -> str:
+    return f"EXISTS (SELECT 1 FROM company_users WHERE user_id = {user_id} AND company_id = {company_id})"
+
+def version_bump_sql(company_id: int, entity: str, source: str) -> str:
+    """CTE bump: увеличивает версию сущности, если source вернул строку"""
+    return f"""bump AS (
+            INSERT INTO entity_versions (company_id, entity, version)
+            SELECT {company_id}, {escape_sql_string(entity)}, 1 FROM {source}
+            ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+        )"""
+
+def owned_insert(cur, table: str, user_id: int, company_id: int, columns_sql: str, values_sql: str,
+                 extra_ctes: str = '') -> Optional[int]:
+    """
+    INSERT с проверкой членства в компании и увеличением версии - один запрос к БД.
+    extra_ctes дописываются в тот же WITH и могут ссылаться на created(id)
+    Returns: id новой строки или None, если пользователь не состоит в компании
+    """
+    cur.execute(f"""
+        WITH created AS (
+            INSERT INTO {table} (company_id, {columns_sql})
+            SELECT {company_id}, {values_sql}
+            WHERE {member_sql(user_id, company_id)}
+            RETURNING id
+        ),
+        {version_bump_sql(company_id, table, 'created')}{extra_ctes}
+        SELECT id FROM created
+    """)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def owned_update(cur, table: str, user_id: int, company_id: int, row_id: int, set_sql: str,
+                 guard_sql: str = 'TRUE', extra_ctes: str = '',
+                 expected_version: Optional[int] = None) -> Tuple[bool, Optional[str], Optional[int], Optional[int]]:
+    """
+    UPDATE строки компании одним запросом: членство и владение - в WHERE, версия сущности - в том же WITH.
+    Каждая запись увеличивает version строки; с expected_version UPDATE условный (WHERE version = n),
+    так что параллельные правки не затирают друг друга без блокировок.
+    Статус и version строки читаются из того же снимка, поэтому без отдельных SELECT различаются
+    «нет доступа», «не найдено», «конфликт версий» и «guard_sql не выполнен» (например, уже удалена).
+    extra_ctes могут ссылаться на changed(id)
+    Returns: (есть доступ, статус строки или None, version до записи, новая version или None без записи)
+    """
+    version_sql = f" AND version = {int(expected_version)}" if expected_version is not None else ''
+    cur.execute(f"""
+        WITH member AS (
+            SELECT {member_sql(user_id, company_id)} AS allowed
+        ),
+        target AS (
+            SELECT status, version FROM {table} WHERE id = {row_id} AND company_id = {company_id}
+        ),
+        changed AS (
+            UPDATE {table}
+            SET {set_sql}, updated_at = CURRENT_TIMESTAMP, version = version + 1
+            WHERE id = {row_id} AND company_id = {company_id}
+              AND (SELECT allowed FROM member) AND {guard_sql}{version_sql}
+            RETURNING id, version
+        ),
+        {version_bump_sql(company_id, table, 'changed')}{extra_ctes}
+        SELECT (SELECT allowed FROM member), (SELECT status FROM target), (SELECT version FROM target),
+               (SELECT version FROM changed)
+    """)
+    return cur.fetchone()
+
+CONFLICT_MESSAGE = 'Запись изменена другим пользователем, обновите данные'
+
+def parse_version(value) -> Tuple[Optional[int], Optional[str]]:
+    """version строки, которую видел клиент; None - запись без проверки версии. Возвращает (версия, ошибка)"""
+    if value is None or value == '':
+        return None, None
+    try:
+        return int(value), None
+    except (TypeError, ValueError):
+        return None, 'Некорректная версия записи'
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+def get_idempotency_key(headers: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    key = (headers.get('Idempotency-Key') or headers.get('idempotency-key') or '').strip()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, f'Idempotency-Key длиннее {IDEMPOTENCY_KEY_MAX_LENGTH} символов'
+    return key or None, None
+
+def request_fingerprint(body: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def claim_idempotency_key(cur, user_id: int, company_id: int, entity: str, key: str,
+                          request_hash: str) -> Tuple[bool, Optional[Tuple[str, Any]]]:
+    """
+    Занимает ключ идемпотентности через INSERT ... ON CONFLICT: новый или просроченный ключ
+    достаётся этому запросу. Конкурентный дубль ждёт на ON CONFLICT коммита первого запроса
+    и затем читает сохранённый им ответ. Попутно удаляются просроченные ключи компании.
+    Returns: (True, None) - ключ занят этим запросом; иначе (False, (request_hash, response))
+             или (False, None), если пользователь не состоит в компании
+    """
+    key_where_sql = f"company_id = {company_id} AND entity = '{entity}' AND idempotency_key = {escape_sql_string(key)}"
+    cur.execute(f"""
+        WITH expired AS (
+            DELETE FROM idempotency_keys
+            WHERE company_id = {company_id} AND expires_at < CURRENT_TIMESTAMP AND NOT ({key_where_sql})
+        ),
+        claim AS (
+            INSERT INTO idempotency_keys (company_id, entity, idempotency_key, request_hash, expires_at)
+            VALUES ({company_id}, '{entity}', {escape_sql_string(key)}, decode('{request_hash}', 'hex'),
+                    CURRENT_TIMESTAMP + INTERVAL '{IDEMPOTENCY_TTL_HOURS} hours')
+            ON CONFLICT (company_id, entity, idempotency_key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, response = NULL, expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+            RETURNING 1
+        )
+        SELECT EXISTS (SELECT 1 FROM claim)
+    """)
+    if cur.fetchone()[0]:
+        return True, None
+    # Новый снимок: ответ конкурентного запроса, дождавшегося коммита, уже виден
+    cur.execute(f"""
+        SELECT encode(request_hash, 'hex'), response FROM idempotency_keys
+        WHERE {key_where_sql} AND {member_sql(user_id, company_id)}
+    """)
+    return False, cur.fetchone()
+
+def idempotency_response_sql(company_id: int, entity: str, key: str, response_sql: str) -> str:
+    """CTE для owned_insert: ответ сохраняется под ключом тем же запросом, что и вставка"""
+    return f""",
+        idempotency AS (
+            UPDATE idempotency_keys SET response = {response_sql}
+            FROM created
+            WHERE idempotency_keys.company_id = {company_id} AND idempotency_keys.entity = '{entity}'
+              AND idempotency_keys.idempotency_key = {escape_sql_string(key)}
+        )"""
+
+def idempotent_replay(saved: Optional[Tuple[str, Any]], request_hash: str) -> Dict[str, Any]:
+    """Ответ на повтор запроса с уже использованным Idempotency-Key"""
+    if saved is None:
+        status_code, body = 403, {'error': 'Доступ к компании запрещён'}
+    elif saved[0] != request_hash:
+        status_code, body = 422, {'error': 'Idempotency-Key уже использован с другим телом запроса'}
+    elif saved[1] is None:
+        status_code, body = 409, {'error': 'Запрос с этим Idempotency-Key ещё выполняется'}
+    else:
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Expose-Headers': 'Idempotent-Replayed',
+                'Idempotent-Replayed': 'true'
+            },
+            'body': json.dumps(saved[1]),
+            'isBase64Encoded': False
+        }
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body),
+        'isBase64Encoded': False
+    }
+
+def etag_matches(headers: Dict[str, Any], etag: str) -> bool:
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag,
+        'Vary': 'X-User-Id, X-Company-Id'
+    }
+
+# Поля ответа для render=db: (ключ, SQL-выражение) - те же ключи, что собирает Python-ветка
+CLIENT_LIST_JSON_FIELDS = [
+    ('id', 'c.id'),
+    ('name', 'c.name'),
+    ('notes', 'c.notes'),
+    ('status', 'c.status'),
+    ('created_at', 'c.created_at'),
+    ('contacts_count', '(SELECT COUNT(*) FROM client_contacts cc WHERE cc.client_id = c.id)'),
+    ('version', 'c.version')
+]
+
+CLIENT_DETAIL_JSON_FIELDS = [
+    ('id', 'c.id'),
+    ('name', 'c.name'),
+    ('notes', 'c.notes'),
+    ('status', 'c.status'),
+    ('created_at', 'c.created_at'),
+    ('updated_at', 'c.updated_at'),
+    ('version', 'c.version'),
+    ('contacts', """COALESCE((
+        SELECT json_agg(json_build_object('id', cc.id, 'full_name', cc.full_name, 'position', cc.position,
+                                          'phone', cc.phone, 'email', cc.email) ORDER BY cc.id)
+        FROM client_contacts cc WHERE cc.client_id = c.id
+    ), '[]'::json)""")
+]
+
+# Расширения карточки клиента (include=projects,orders,totals)
+CLIENT_INCLUDES = ['projects', 'orders', 'totals']
+DEFAULT_RECENT_ORDERS = 20
+MAX_RECENT_ORDERS = 100
+
+def load_client_projects(cur, company_id: int, client_id: int) -> List[Dict[str, Any]]:
+    """Проекты клиента с финансами одним запросом: платежи агрегируются по заказу через LATERAL"""
+    cur.execute(f"""
+        SELECT pr.id, pr.name, pr.status, pr.created_at,
+               COUNT(o.id) as orders_count,
+               COALESCE(SUM(o.amount), 0) as contracted_amount,
+               COALESCE(SUM(pm.planned), 0) as planned_payments,
+               COALESCE(SUM(pm.paid), 0) as actual_payments,
+               COALESCE(SUM(GREATEST(o.amount - pm.paid, 0)), 0) as receivables,
+               COALESCE(SUM(pm.overdue), 0) as overdue_amount,
+               MAX(pm.last_payment_date) as last_payment_date
+        FROM projects pr
+        LEFT JOIN orders o ON o.project_id = pr.id AND o.company_id = {company_id} AND o.status <> 'removed'
+        LEFT JOIN LATERAL (
+            SELECT COALESCE(SUM(COALESCE(p.planned_amount, o.amount * p.planned_amount_percent / 100)), 0) as planned,
+                   COALESCE(SUM(p.actual_amount), 0) as paid,
+                   COALESCE(SUM(GREATEST(COALESCE(p.planned_amount, o.amount * p.planned_amount_percent / 100)
+                                         - COALESCE(p.actual_amount, 0), 0))
+                            FILTER (WHERE p.planned_date < CURRENT_DATE), 0) as overdue,
+                   MAX(p.actual_date) FILTER (WHERE p.actual_amount > 0) as last_payment_date
+            FROM payments p
+            WHERE p.company_id = {company_id} AND p.order_id = o.id AND p.status <> 'removed'
+        ) pm ON true
+        WHERE pr.company_id = {company_id} AND pr.client_id = {client_id} AND pr.status <> 'removed'
+        GROUP BY pr.id, pr.name, pr.status, pr.created_at
+        ORDER BY pr.created_at DESC
+    """)
+    return [
+        {
+            'id': row[0],
+            'name': row[1],
+            'status': row[2],
+            'created_at': row[3].isoformat() if row[3] else None,
+            'orders_count': row[4],
+            'contracted_amount': float(row[5]),
+            'planned_payments': float(row[6]),
+            'actual_payments': float(row[7]),
+            'receivables': float(row[8]),
+            'overdue_amount': float(row[9]),
+            'last_payment_date': row[10].isoformat() if row[10] else None
+        }
+        for row in cur.fetchall()
+    ]
+
+def load_client_recent_orders(cur, company_id: int, client_id: int, limit: int) -> List[Dict[str, Any]]:
+    """
+    Последние заказы клиента: по каждому проекту не больше limit строк через LATERAL по индексу
+    idx_orders_company_project_recent, затем общий top-N - сортируется проекты x limit строк,
+    а не все заказы клиента. Проекты фильтруются так же, как в load_client_projects.
+    """
+    cur.execute(f"""
+        SELECT o.id, o.name, o.amount, o.order_status, o.payment_status, o.planned_date,
+               pr.id as project_id, pr.name as project_name, o.created_at
+        FROM projects pr
+        CROSS JOIN LATERAL (
+            SELECT o.id, o.name, o.amount, o.order_status, o.payment_status, o.planned_date, o.created_at
+            FROM orders o
+            WHERE o.company_id = {company_id} AND o.project_id = pr.id AND o.status <> 'removed'
+            ORDER BY o.created_at DESC, o.id DESC
+            LIMIT {limit}
+        ) o
+        WHERE pr.company_id = {company_id} AND pr.client_id = {client_id} AND pr.status <> 'removed'
+        ORDER BY o.created_at DESC, o.id DESC
+        LIMIT {limit}
+    """)
+    return [
+        {
+            'id': row[0],
+            'name': row[1],
+            'amount': float(row[2]) if row[2] else 0,
+            'order_status': row[3],
+            'payment_status': row[4],
+            'planned_date': row[5].isoformat() if row[5] else None,
+            'project_id': row[6],
+            'project_name': row[7],
+            'created_at': row[8].isoformat() if row[8] else None
+        }
+        for row in cur.fetchall()
+    ]
+
+def client_totals(projects: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Итоги клиента складываются из строк проектов - отдельного запроса не нужно"""
+    payment_dates = [p['last_payment_date'] for p in projects if p['last_payment_date']]
+    return {
+        'projects_count': len(projects),
+        'orders_count': sum(p['orders_count'] for p in projects),
+        'contracted_amount': sum(p['contracted_amount'] for p in projects),
+        'planned_payments': sum(p['planned_payments'] for p in projects),
+        'actual_payments': sum(p['actual_payments'] for p in projects),
+        'receivables': sum(p['receivables'] for p in projects),
+        'overdue_amount': sum(p['overdue_amount'] for p in projects),
+        'last_payment_date': max(payment_dates) if payment_dates else None
+    }
+
+def contacts_values_sql(contacts: List[Dict[str, Any]]) -> str:
+    """Строки VALUES (id, full_name, position, phone, email) контактов с непустым ФИО; '' если таких нет"""
+    rows = []
+    for contact in contacts:
+        full_name = (contact.get('full_name') or '').strip()
+        if not full_name:
+            continue
+        contact_id = contact.get('id')
+        values = [f"{int(contact_id)}::bigint" if contact_id else 'NULL::bigint', escape_sql_string(full_name)]
+        for field in ['position', 'phone', 'email']:
+            value = (contact.get(field) or '').strip()
+            values.append(escape_sql_string(value) if value else 'NULL')
+        rows.append('(' + ', '.join(values) + ')')
+    return ', '.join(rows)
+
+def new_contacts_ctes(values_sql: str) -> str:
+    """CTE для owned_insert: контакты нового клиента в том же запросе"""
+    if not values_sql:
+        return ''
+    return f""",
+        contacts AS (
+            INSERT INTO client_contacts (client_id, full_name, position, phone, email)
+            SELECT created.id, v.full_name, v.position, v.phone, v.email
+            FROM created, (VALUES {values_sql}) AS v(id, full_name, position, phone, email)
+        )"""
+
+def updated_contacts_ctes(values_sql: str) -> str:
+    """
+    CTE для owned_update: контакты с id этого клиента обновляются, остальные добавляются.
+    Выполняются, только если сама строка клиента обновлена (changed не пуст)
+    """
+    if not values_sql:
+        return ''
+    return f""",
+        contacts_input (id, full_name, position, phone, email) AS (
+            VALUES {values_sql}
+        ),
+        contacts_updated AS (
+            UPDATE client_contacts cc
+            SET full_name = v.full_name, position = v.position, phone = v.phone, email = v.email
+            FROM contacts_input v, changed
+            WHERE cc.id = v.id AND cc.client_id = changed.id
+        ),
+        contacts_created AS (
+            INSERT INTO client_contacts (client_id, full_name, position, phone, email)
+            SELECT changed.id, v.full_name, v.position, v.phone, v.email
+            FROM contacts_input v, changed
+            WHERE v.id IS NULL OR v.id NOT IN (SELECT id FROM client_contacts WHERE client_id = changed.id)
+        )"""
+
+def json_object_sql(fields: List[Tuple[str, str]]) -> str:
+    """json_build_object из пар (ключ, выражение); ::text у результата - чтобы psycopg2 не разбирал JSON обратно в dict"""
+    return 'json_build_object(' + ', '.join(f"'{key}', {expr}" for key, expr in fields) + ')'
+
+ENTITY_STATUSES = ['active', 'archived', 'removed']
+
+def patch_value_sql(kind, value) -> str:
+    """SQL-значение поля PATCH по его виду; ValueError при некорректном значении"""
+    if isinstance(kind, list):
+        if value not in kind:
+            raise ValueError(value)
+        return escape_sql_string(value)
+    if kind == 'name':
+        value = (value or '').strip()
+        if not value:
+            raise ValueError(value)
+        return escape_sql_string(value)
+    if kind == 'text':
+        value = (value or '').strip()
+        return escape_sql_string(value) if value else 'NULL'
+    if value is None or value == '':
+        return '0' if kind == 'amount' else 'NULL'
+    if kind in ('number', 'amount'):
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(value)
+        return str(number)
+    if kind == 'date':
+        return f"'{date.fromisoformat(value).isoformat()}'"
+    return str(int(value))
+
+def build_patch_assignments(body: Dict[str, Any], fields: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    """Пары (колонка, SQL-значение) только для переданных в теле полей. Возвращает (пары, ошибка)"""
+    assignments = []
+    for column, kind in fields.items():
+        if column not in body:
+            continue
+        try:
+            assignments.append((column, patch_value_sql(kind, body[column])))
+        except (TypeError, ValueError):
+            return [], f'Некорректное значение поля {column}'
+    return assignments, None
+
+def patch_sql(assignments: List[Tuple[str, str]]) -> Tuple[str, str]:
+    """
+    SET только переданных колонок и условие, что хотя бы одно значение меняется:
+    строка, где всё уже совпадает, не переписывается (нет новой версии строки и WAL)
+    """
+    set_sql = ', '.join(f"{column} = {value}" for column, value in assignments)
+    columns_sql = ', '.join(column for column, _ in assignments)
+    values_sql = ', '.join(value for _, value in assignments)
+    return set_sql, f"ROW({columns_sql}) IS DISTINCT FROM ROW({values_sql})"
+
+# Поля PATCH -> вид значения (см. patch_value_sql); контакты меняются только через PUT
+CLIENT_PATCH_FIELDS = {
+    'name': 'name',
+    'notes': 'text',
+    'status': ENTITY_STATUSES
+}
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Управление клиентами: создание, чтение, обновление, удаление
@@ -34,8 +466,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id, If-None-Match, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -61,19 +493,43 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        get_user_company_id(user_id, company_id, cur)
-        
         if method == 'GET':
+            get_user_company_id(user_id, company_id, cur)
+            
             query_params = event.get('queryStringParameters') or {}
+            includes = [i for i in (query_params.get('include') or '').split(',') if i in CLIENT_INCLUDES]
+            
+            etag_entities = CLIENTS_ETAG_ENTITIES + (['projects', 'orders', 'payments'] if includes else [])
+            etag = get_entities_etag(cur, company_id, etag_entities, dated='projects' in includes or 'totals' in includes)
+            if etag_matches(headers, etag):
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 304,
+                    'headers': etag_headers(etag),
+                    'body': '',
+                    'isBase64Encoded': False
+                }
+            
             client_id = query_params.get('id')
             status_filter = query_params.get('status', 'active')
             
+            # Расширения карточки собираются в Python-ветке
+            render_db = query_params.get('render') == 'db' and not (client_id and includes)
+            
             if client_id:
-                cur.execute(f"""
-                    SELECT id, name, notes, status, created_at, updated_at
-                    FROM clients 
-                    WHERE id = {int(client_id)} AND company_id = {company_id}
-                """)
+                if render_db:
+                    cur.execute(f"""
+                        SELECT {json_object_sql(CLIENT_DETAIL_JSON_FIELDS)}::text
+                        FROM clients c
+                        WHERE c.id = {int(client_id)} AND c.company_id = {company_id}
+                    """)
+                else:
+                    cur.execute(f"""
+                        SELECT id, name, notes, status, created_at, updated_at, version
+                        FROM clients 
+                        WHERE id = {int(client_id)} AND company_id = {company_id}
+                    """)
                 
                 client = cur.fetchone()
                 if not client:
@@ -86,77 +542,108 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute(f"""
-                    SELECT id, full_name, position, phone, email
-                    FROM client_contacts
-                    WHERE client_id = {int(client_id)}
-                    ORDER BY id
-                """)
-                contacts = cur.fetchall()
-                
-                result = {
-                    'id': client[0],
-                    'name': client[1],
-                    'notes': client[2],
-                    'status': client[3],
-                    'created_at': client[4].isoformat() if client[4] else None,
-                    'updated_at': client[5].isoformat() if client[5] else None,
-                    'contacts': [
-                        {
-                            'id': c[0],
-                            'full_name': c[1],
-                            'position': c[2],
-                            'phone': c[3],
-                            'email': c[4]
-                        }
-                        for c in contacts
-                    ]
-                }
+                if render_db:
+                    body = client[0]
+                else:
+                    cur.execute(f"""
+                        SELECT id, full_name, position, phone, email
+                        FROM client_contacts
+                        WHERE client_id = {int(client_id)}
+                        ORDER BY id
+                    """)
+                    contacts = cur.fetchall()
+                    
+                    result = {
+                        'id': client[0],
+                        'name': client[1],
+                        'notes': client[2],
+                        'status': client[3],
+                        'created_at': client[4].isoformat() if client[4] else None,
+                        'updated_at': client[5].isoformat() if client[5] else None,
+                        'version': client[6],
+                        'contacts': [
+                            {
+                                'id': c[0],
+                                'full_name': c[1],
+                                'position': c[2],
+                                'phone': c[3],
+                                'email': c[4]
+                            }
+                            for c in contacts
+                        ]
+                    }
+                    
+                    if 'projects' in includes or 'totals' in includes:
+                        projects = load_client_projects(cur, company_id, int(client_id))
+                        if 'projects' in includes:
+                            result['projects'] = projects
+                        if 'totals' in includes:
+                            result['totals'] = client_totals(projects)
+                    if 'orders' in includes:
+                        try:
+                            recent_limit = int(query_params.get('recent_orders', DEFAULT_RECENT_ORDERS))
+                        except ValueError:
+                            recent_limit = DEFAULT_RECENT_ORDERS
+                        recent_limit = max(1, min(recent_limit, MAX_RECENT_ORDERS))
+                        result['recent_orders'] = load_client_recent_orders(cur, company_id, int(client_id), recent_limit)
+                    body = json.dumps(result)
                 
                 cur.close()
                 conn.close()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(result),
+                    'headers': etag_headers(etag),
+                    'body': body,
                     'isBase64Encoded': False
                 }
             else:
                 if status_filter not in ['active', 'archived']:
                     status_filter = 'active'
                 
-                cur.execute(f"""
-                    SELECT c.id, c.name, c.notes, c.status, c.created_at,
-                           COUNT(cc.id) as contacts_count
-                    FROM clients c
-                    LEFT JOIN client_contacts cc ON c.id = cc.client_id
-                    WHERE c.company_id = {company_id} AND c.status = {escape_sql_string(status_filter)}
-                    GROUP BY c.id, c.name, c.notes, c.status, c.created_at
-                    ORDER BY c.created_at DESC
-                """)
-                
-                clients = cur.fetchall()
-                
-                result = [
-                    {
-                        'id': row[0],
-                        'name': row[1],
-                        'notes': row[2],
-                        'status': row[3],
-                        'created_at': row[4].isoformat() if row[4] else None,
-                        'contacts_count': row[5]
-                    }
-                    for row in clients
-                ]
+                if render_db:
+                    cur.execute(f"""
+                        SELECT json_build_object('clients', COALESCE(
+                            json_agg({json_object_sql(CLIENT_LIST_JSON_FIELDS)} ORDER BY c.created_at DESC), '[]'::json
+                        ))::text
+                        FROM clients c
+                        WHERE c.company_id = {company_id} AND c.status = {escape_sql_string(status_filter)}
+                    """)
+                    body = cur.fetchone()[0]
+                else:
+                    cur.execute(f"""
+                        SELECT c.id, c.name, c.notes, c.status, c.created_at,
+                               COUNT(cc.id) as contacts_count, c.version
+                        FROM clients c
+                        LEFT JOIN client_contacts cc ON c.id = cc.client_id
+                        WHERE c.company_id = {company_id} AND c.status = {escape_sql_string(status_filter)}
+                        GROUP BY c.id, c.name, c.notes, c.status, c.created_at, c.version
+                        ORDER BY c.created_at DESC
+                    """)
+                    
+                    clients = cur.fetchall()
+                    
+                    result = [
+                        {
+                            'id': row[0],
+                            'name': row[1],
+                            'notes': row[2],
+                            'status': row[3],
+                            'created_at': row[4].isoformat() if row[4] else None,
+                            'contacts_count': row[5],
+                            'version': row[6]
+                        }
+                        for row in clients
+                    ]
+                    body = json.dumps({'clients': result})
                 
                 cur.close()
                 conn.close()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'clients': result}),
+                    'headers': etag_headers(etag),
+                    'body': body,
                     'isBase64Encoded': False
                 }
         
@@ -178,31 +665,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             
             notes_sql = escape_sql_string(notes) if notes else 'NULL'
             
-            cur.execute(f"""
-                INSERT INTO clients (company_id, name, notes, status)
-                VALUES ({company_id}, {escape_sql_string(name)}, {notes_sql}, 'active')
-                RETURNING id
-            """)
+            extra_ctes = new_contacts_ctes(contacts_values_sql(contacts))
+            
+            idempotency_key, error = get_idempotency_key(headers)
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            if idempotency_key:
+                request_hash = request_fingerprint(body)
+                claimed, saved = claim_idempotency_key(cur, user_id, company_id, 'clients', idempotency_key, request_hash)
+                if not claimed:
+                    cur.close()
+                    conn.close()
+                    return idempotent_replay(saved, request_hash)
+                extra_ctes += idempotency_response_sql(
+                    company_id, 'clients', idempotency_key, "jsonb_build_object('success', true, 'client_id', created.id)"
+                )
             
-            client_id = cur.fetchone()[0]
+            client_id = owned_insert(
+                cur, 'clients', user_id, company_id,
+                'name, notes, status',
+                f"{escape_sql_string(name)}, {notes_sql}, 'active'", extra_ctes=extra_ctes
+            )
             
-            for contact in contacts:
-                full_name = contact.get('full_name', '').strip()
-                if not full_name:
-                    continue
-                
-                position = contact.get('position', '').strip()
-                phone = contact.get('phone', '').strip()
-                email = contact.get('email', '').strip()
-                
-                position_sql = escape_sql_string(position) if position else 'NULL'
-                phone_sql = escape_sql_string(phone) if phone else 'NULL'
-                email_sql = escape_sql_string(email) if email else 'NULL'
-                
-                cur.execute(f"""
-                    INSERT INTO client_contacts (client_id, full_name, position, phone, email)
-                    VALUES ({client_id}, {escape_sql_string(full_name)}, {position_sql}, {phone_sql}, {email_sql})
-                """)
+            if client_id is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
             
             conn.commit()
             cur.close()
@@ -233,12 +733,41 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                SELECT id FROM clients 
-                WHERE id = {int(client_id)} AND company_id = {company_id}
-            """)
+            notes_sql = escape_sql_string(notes) if notes else 'NULL'
+            
+            if status not in ['active', 'archived', 'removed']:
+                status = 'active'
+            
+            extra_ctes = updated_contacts_ctes(contacts_values_sql(contacts))
+            
+            expected_version, error = parse_version(body.get('version'))
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            allowed, current_status, current_version, new_version = owned_update(cur, 'clients', user_id, company_id, int(client_id), f"""
+                name = {escape_sql_string(name)},
+                notes = {notes_sql},
+                status = {escape_sql_string(status)}
+            """, extra_ctes=extra_ctes, expected_version=expected_version)
             
-            if not cur.fetchone():
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
                 cur.close()
                 conn.close()
                 return {
@@ -248,54 +777,94 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            notes_sql = escape_sql_string(notes) if notes else 'NULL'
+            if new_version is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
             
-            if status not in ['active', 'archived', 'removed']:
-                status = 'active'
+            conn.commit()
+            cur.close()
+            conn.close()
             
-            cur.execute(f"""
-                UPDATE clients 
-                SET name = {escape_sql_string(name)}, 
-                    notes = {notes_sql},
-                    status = {escape_sql_string(status)},
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = {int(client_id)}
-            """)
-            
-            cur.execute(f"SELECT id FROM client_contacts WHERE client_id = {int(client_id)}")
-            existing_contact_ids = {row[0] for row in cur.fetchall()}
-            updated_contact_ids = set()
-            
-            for contact in contacts:
-                contact_id = contact.get('id')
-                full_name = contact.get('full_name', '').strip()
-                
-                if not full_name:
-                    continue
-                
-                position = contact.get('position', '').strip()
-                phone = contact.get('phone', '').strip()
-                email = contact.get('email', '').strip()
-                
-                position_sql = escape_sql_string(position) if position else 'NULL'
-                phone_sql = escape_sql_string(phone) if phone else 'NULL'
-                email_sql = escape_sql_string(email) if email else 'NULL'
-                
-                if contact_id and contact_id in existing_contact_ids:
-                    cur.execute(f"""
-                        UPDATE client_contacts
-                        SET full_name = {escape_sql_string(full_name)},
-                            position = {position_sql},
-                            phone = {phone_sql},
-                            email = {email_sql}
-                        WHERE id = {int(contact_id)}
-                    """)
-                    updated_contact_ids.add(contact_id)
-                else:
-                    cur.execute(f"""
-                        INSERT INTO client_contacts (client_id, full_name, position, phone, email)
-                        VALUES ({int(client_id)}, {escape_sql_string(full_name)}, {position_sql}, {phone_sql}, {email_sql})
-                    """)
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'version': new_version}),
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'PATCH':
+            body = json.loads(event.get('body', '{}'))
+            client_id = body.get('id')
+            
+            if not client_id:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'ID клиента обязателен'}),
+                    'isBase64Encoded': False
+                }
+            
+            assignments, error = build_patch_assignments(body, CLIENT_PATCH_FIELDS)
+            expected_version, version_error = parse_version(body.get('version'))
+            error = error or version_error
+            if not error and not assignments:
+                error = 'Нет полей для обновления'
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            set_sql, guard_sql = patch_sql(assignments)
+            if expected_version is not None:
+                # С версией правка пишется всегда: иначе «нечего менять» не отличить от конфликта
+                # с параллельной записью, которую этот снимок ещё не видит
+                guard_sql = 'TRUE'
+            allowed, current_status, current_version, new_version = owned_update(
+                cur, 'clients', user_id, company_id, int(client_id), set_sql, guard_sql, expected_version=expected_version
+            )
+            
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Клиент не найден'}),
+                    'isBase64Encoded': False
+                }
+            
+            if expected_version is not None and new_version is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
             
             conn.commit()
             cur.close()
@@ -304,7 +873,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
+                'body': json.dumps({
+                    'success': True,
+                    'updated': [column for column, _ in assignments] if new_version else [],
+                    'version': new_version or current_version
+                }),
                 'isBase64Encoded': False
             }
         
@@ -322,13 +895,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                SELECT id, status FROM clients 
-                WHERE id = {int(client_id)} AND company_id = {company_id}
-            """)
+            expected_version, error = parse_version(query_params.get('version'))
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            allowed, current_status, current_version, new_version = owned_update(
+                cur, 'clients', user_id, company_id, int(client_id), "status = 'removed'", "status <> 'removed'",
+                expected_version=expected_version
+            )
+            
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
             
-            row = cur.fetchone()
-            if not row:
+            if current_status is None:
                 cur.close()
                 conn.close()
                 return {
@@ -338,7 +931,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            if row[1] == 'removed':
+            if new_version is None and expected_version is not None and current_status != 'removed':
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
+            
+            if new_version is None:
                 cur.close()
                 conn.close()
                 return {
@@ -348,12 +951,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                UPDATE clients 
-                SET status = 'removed', updated_at = CURRENT_TIMESTAMP 
-                WHERE id = {int(client_id)}
-            """)
-            
             conn.commit()
             cur.close()
             conn.close()
@@ -361,7 +958,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
+                'body': json.dumps({'success': True, 'version': new_version}),
                 'isBase64Encoded': False
             }
         
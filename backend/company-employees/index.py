@@ -1,7 +1,8 @@
+import asyncio
 import json
 import os
 import psycopg2
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
@@ -11,6 +12,117 @@ def escape_sql_string(s: str) -> str:
         return 'NULL'
     return "'" + s.replace("'", "''") + "'"
 
+def employees_etag_sql(company_id: int) -> str:
+    return f"""
+        SELECT
+            (SELECT version FROM entity_versions WHERE company_id = {company_id} AND entity = 'employees'),
+            (SELECT COUNT(*) FROM t_p27692930_revenue_tracking_ser.employee_invitations
+             WHERE company_id = {company_id} AND status = 'pending' AND expires_at > NOW())
+    """
+
+def format_employees_etag(company_id: int, user_id: int, row) -> str:
+    """ETag списка сотрудников: версия сущности плюс число действующих приглашений (они истекают без записи в БД)"""
+    version, pending = row[0], row[1]
+    return f'W/"c{company_id}-u{user_id}-employees{version or 0}-i{pending}"'
+
+def get_employees_etag(cur, company_id: int, user_id: int) -> str:
+    cur.execute(employees_etag_sql(company_id))
+    return format_employees_etag(company_id, user_id, cur.fetchone())
+
+def access_sql(user_id: int, company_id: int) -> str:
+    return f"""
+        SELECT company_id, role
+        FROM company_users
+        WHERE user_id = {user_id} AND company_id = {company_id}
+    """
+
+def employees_sql(company_id: int) -> str:
+    return f"""
+        SELECT u.id, u.email, u.first_name, u.last_name, u.middle_name, 
+               u.phone, u.avatar_url, cu.role, cu.created_at
+        FROM t_p27692930_revenue_tracking_ser.users u
+        JOIN t_p27692930_revenue_tracking_ser.company_users cu ON u.id = cu.user_id
+        WHERE cu.company_id = {company_id}
+        ORDER BY 
+            CASE cu.role
+                WHEN 'owner' THEN 1
+                WHEN 'admin' THEN 2
+                WHEN 'user' THEN 3
+                WHEN 'viewer' THEN 4
+                ELSE 5
+            END,
+            u.last_name, u.first_name
+    """
+
+def invitations_sql(company_id: int) -> str:
+    return f"""
+        SELECT ei.id, ei.email, ei.role, ei.created_at, ei.expires_at, ei.status
+        FROM t_p27692930_revenue_tracking_ser.employee_invitations ei
+        WHERE ei.company_id = {company_id}
+        AND ei.status = 'pending'
+        AND ei.expires_at > NOW()
+        ORDER BY ei.created_at DESC
+    """
+
+def employee_from_row(emp) -> Dict[str, Any]:
+    return {
+        'id': emp[0],
+        'email': emp[1],
+        'first_name': emp[2],
+        'last_name': emp[3],
+        'middle_name': emp[4],
+        'phone': emp[5],
+        'avatar_url': emp[6],
+        'role': emp[7],
+        'joined_at': emp[8].isoformat() if emp[8] else None,
+        'status': 'active'
+    }
+
+def invitation_from_row(inv) -> Dict[str, Any]:
+    return {
+        'id': -inv[0],
+        'email': inv[1],
+        'first_name': '',
+        'last_name': '',
+        'middle_name': None,
+        'phone': None,
+        'avatar_url': None,
+        'role': inv[2],
+        'joined_at': None,
+        'status': 'invited',
+        'invited_at': inv[3].isoformat() if inv[3] else None,
+        'expires_at': inv[4].isoformat() if inv[4] else None
+    }
+
+async def fetch_concurrently(pool, queries: List[str]) -> List[Any]:
+    """Независимые запросы одновременно, каждый на своём соединении пула asyncpg"""
+    async def fetch(sql: str):
+        async with pool.acquire() as conn:
+            return await conn.fetch(sql)
+    return await asyncio.gather(*(fetch(sql) for sql in queries))
+
+def bump_entity_version(cur, company_id: int, entity: str):
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        VALUES ({company_id}, {escape_sql_string(entity)}, 1)
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
+def etag_matches(headers: Dict[str, Any], etag: str) -> bool:
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag,
+        'Vary': 'X-User-Id, X-Company-Id'
+    }
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Управление сотрудниками компании: просмотр, добавление, редактирование, удаление
@@ -26,7 +138,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {
                 'Access-Control-Allow-Origin': '*',
                 'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id, If-None-Match',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -53,11 +165,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         cur = conn.cursor()
         
         # Проверяем доступ пользователя к компании и получаем роль
-        cur.execute(f"""
-            SELECT company_id, role
-            FROM company_users
-            WHERE user_id = {user_id} AND company_id = {company_id}
-        """)
+        cur.execute(access_sql(user_id, company_id))
         user_data = cur.fetchone()
         
         if not user_data:
@@ -73,71 +181,31 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         user_role = user_data[1]
         
         if method == 'GET':
-            # Получение списка сотрудников компании
-            cur.execute(f"""
-                SELECT u.id, u.email, u.first_name, u.last_name, u.middle_name, 
-                       u.phone, u.avatar_url, cu.role, cu.created_at
-                FROM t_p27692930_revenue_tracking_ser.users u
-                JOIN t_p27692930_revenue_tracking_ser.company_users cu ON u.id = cu.user_id
-                WHERE cu.company_id = {company_id}
-                ORDER BY 
-                    CASE cu.role
-                        WHEN 'owner' THEN 1
-                        WHEN 'admin' THEN 2
-                        WHEN 'user' THEN 3
-                        WHEN 'viewer' THEN 4
-                        ELSE 5
-                    END,
-                    u.last_name, u.first_name
-            """)
+            etag = get_employees_etag(cur, company_id, user_id)
+            if etag_matches(headers, etag):
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 304,
+                    'headers': etag_headers(etag),
+                    'body': '',
+                    'isBase64Encoded': False
+                }
             
-            employees = []
-            for emp in cur.fetchall():
-                employees.append({
-                    'id': emp[0],
-                    'email': emp[1],
-                    'first_name': emp[2],
-                    'last_name': emp[3],
-                    'middle_name': emp[4],
-                    'phone': emp[5],
-                    'avatar_url': emp[6],
-                    'role': emp[7],
-                    'joined_at': emp[8].isoformat() if emp[8] else None,
-                    'status': 'active'
-                })
+            # Получение списка сотрудников компании
+            cur.execute(employees_sql(company_id))
+            employees = [employee_from_row(emp) for emp in cur.fetchall()]
             
             # Получение списка приглашённых сотрудников
-            cur.execute(f"""
-                SELECT ei.id, ei.email, ei.role, ei.created_at, ei.expires_at, ei.status
-                FROM t_p27692930_revenue_tracking_ser.employee_invitations ei
-                WHERE ei.company_id = {company_id}
-                AND ei.status = 'pending'
-                AND ei.expires_at > NOW()
-                ORDER BY ei.created_at DESC
-            """)
-            
-            for inv in cur.fetchall():
-                employees.append({
-                    'id': -inv[0],
-                    'email': inv[1],
-                    'first_name': '',
-                    'last_name': '',
-                    'middle_name': None,
-                    'phone': None,
-                    'avatar_url': None,
-                    'role': inv[2],
-                    'joined_at': None,
-                    'status': 'invited',
-                    'invited_at': inv[3].isoformat() if inv[3] else None,
-                    'expires_at': inv[4].isoformat() if inv[4] else None
-                })
+            cur.execute(invitations_sql(company_id))
+            employees += [invitation_from_row(inv) for inv in cur.fetchall()]
             
             cur.close()
             conn.close()
             
             return {
                 'statusCode': 200,
-                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'headers': etag_headers(etag),
                 'body': json.dumps({
                     'employees': employees,
                     'current_user_role': user_role
@@ -226,6 +294,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 VALUES ({company_id}, {employee_id}, {escape_sql_string(role)}, NOW())
             """)
             
+            bump_entity_version(cur, company_id, 'employees')
             conn.commit()
             cur.close()
             conn.close()
@@ -322,6 +391,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 WHERE company_id = {company_id} AND user_id = {employee_id}
             """)
             
+            bump_entity_version(cur, company_id, 'employees')
             conn.commit()
             cur.close()
             conn.close()
@@ -376,6 +446,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     WHERE id = {invitation_id}
                 """)
                 
+                bump_entity_version(cur, company_id, 'employees')
                 conn.commit()
                 cur.close()
                 conn.close()
@@ -447,6 +518,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                 WHERE company_id = {company_id} AND user_id = {employee_id}
             """)
             
+            bump_entity_version(cur, company_id, 'employees')
             conn.commit()
             cur.close()
             conn.close()
@@ -474,4 +546,54 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': str(e)}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+
+async def handler_async(event: Dict[str, Any], context: Any, pool) -> Optional[Dict[str, Any]]:
+    """
+    GET списка сотрудников для асинхронного режима сервера: доступ и ETag, затем сотрудники
+    и приглашения - каждая пара запросов выполняется одновременно
+    Args: event - HTTP запрос GET
+          pool - пул соединений asyncpg
+    Returns: Ответ как у handler; None - запрос обслуживает синхронный handler
+    """
+    headers = event.get('headers', {})
+    user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+    company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+    
+    if event.get('httpMethod', 'GET') != 'GET' or not user_id or not company_id_header:
+        return None
+    
+    user_id = int(user_id)
+    company_id = int(company_id_header)
+    
+    access_rows, etag_rows = await fetch_concurrently(pool, [access_sql(user_id, company_id), employees_etag_sql(company_id)])
+    
+    if not access_rows:
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+            'isBase64Encoded': False
+        }
+    
+    etag = format_employees_etag(company_id, user_id, etag_rows[0])
+    if etag_matches(headers, etag):
+        return {
+            'statusCode': 304,
+            'headers': etag_headers(etag),
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    employee_rows, invitation_rows = await fetch_concurrently(pool, [employees_sql(company_id), invitations_sql(company_id)])
+    employees = [employee_from_row(emp) for emp in employee_rows] + [invitation_from_row(inv) for inv in invitation_rows]
+    
+    return {
+        'statusCode': 200,
+        'headers': etag_headers(etag),
+        'body': json.dumps({
+            'employees': employees,
+            'current_user_role': access_rows[0][1]
+        }),
+        'isBase64Encoded': False
+    }
@@ -0,0 +1,314 @@
+import base64
+import json
+import os
+import uuid
+import psycopg2
+from datetime import datetime
+from decimal import Decimal
+from typing import Dict, Any, List, Optional, Tuple
+
+# Размер части multipart-загрузки в S3 (минимум S3 - 5 МБ для всех частей, кроме последней)
+PART_SIZE = 8 * 1024 * 1024
+
+# Выгрузка до этого размера отдаётся прямо в ответе; XLSX в base64 вырастает на треть,
+# поэтому всё крупнее уходит в S3 и возвращается ссылкой
+INLINE_LIMIT = 1024 * 1024
+
+# Строк за один FETCH из серверного курсора при записи XLSX
+FETCH_SIZE = 2000
+
+# Предел строк листа Excel (1 048 576) с запасом на заголовок
+XLSX_SHEET_ROWS = 1000000
+
+# Excel в русской локали ожидает ';' и BOM, иначе кириллица и колонки разъезжаются
+CSV_DELIMITER = ';'
+CSV_BOM = '\ufeff'.encode('utf-8')
+
+# entity -> (колонки (выражение, заголовок), FROM ... с условием по компании, ORDER BY)
+EXPORTS = {
+    'orders': (
+        [('o.id', 'ID'), ('o.name', 'Заказ'), ('pr.name', 'Проект'), ('c.name', 'Клиент'),
+         ('o.amount', 'Сумма'), ('o.order_status', 'Статус заказа'), ('o.payment_status', 'Статус оплаты'),
+         ('o.payment_type', 'Тип оплаты'), ('o.planned_date', 'Плановая дата'), ('o.actual_date', 'Фактическая дата'),
+         ('o.status', 'Статус'), ('o.created_at', 'Создан')],
+        """FROM orders o
+           LEFT JOIN projects pr ON pr.id = o.project_id
+           LEFT JOIN clients c ON c.id = pr.client_id
+           WHERE o.company_id = {company_id} AND o.status <> 'removed'""",
+        'o.id'
+    ),
+    'payments': (
+        [('p.id', 'ID'), ('o.name', 'Заказ'), ('pr.name', 'Проект'), ('c.name', 'Клиент'),
+         ('p.planned_amount', 'Плановая сумма'), ('p.planned_amount_percent', 'Плановый процент'),
+         ('p.actual_amount', 'Фактическая сумма'), ('p.planned_date', 'Плановая дата'),
+         ('p.actual_date', 'Фактическая дата'), ('p.status', 'Статус'), ('p.created_at', 'Создан')],
+        """FROM payments p
+           LEFT JOIN orders o ON o.id = p.order_id AND o.company_id = p.company_id
+           LEFT JOIN projects pr ON pr.id = o.project_id
+           LEFT JOIN clients c ON c.id = pr.client_id
+           WHERE p.company_id = {company_id} AND p.status <> 'removed'""",
+        'p.id'
+    ),
+    'clients': (
+        [('c.id', 'ID'), ('c.name', 'Клиент'), ('c.notes', 'Заметки'), ('c.status', 'Статус'),
+         ('cc.full_name', 'Контактное лицо'), ('cc.position', 'Должность'), ('cc.phone', 'Телефон'),
+         ('cc.email', 'Email')],
+        """FROM clients c
+           LEFT JOIN client_contacts cc ON cc.client_id = c.id
+           WHERE c.company_id = {company_id} AND c.status <> 'removed'""",
+        'c.id, cc.id'
+    )
+}
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def get_user_company_id(user_id: int, company_id: int, cur) -> int:
+    cur.execute(f"SELECT company_id FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+    result = cur.fetchone()
+    if not result:
+        raise Exception('Доступ к компании запрещён')
+    return result[0]
+
+def build_export_sql(entity: str, company_id: int) -> Tuple[str, List[str]]:
+    columns, from_sql, order_sql = EXPORTS[entity]
+    select_sql = ', '.join(f'{expr} AS "{header}"' for expr, header in columns)
+    return f"SELECT {select_sql} {from_sql.format(company_id=company_id)} ORDER BY {order_sql}", [h for _, h in columns]
+
+class MultipartWriter:
+    """
+    Файлоподобный приёмник: копит байты до PART_SIZE и отправляет их частью multipart-загрузки.
+    Пока не набралась первая часть, в S3 ничего не уходит; выгрузка до INLINE_LIMIT остаётся в памяти
+    и отдаётся в ответе, более крупная загружается при complete() одной частью.
+    """
+
+    def __init__(self, key: str, content_type: str):
+        self.key = key
+        self.content_type = content_type
+        self.buffer = bytearray()
+        self.parts = []
+        self.upload_id = None
+        self.s3 = None
+        self.size = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self.buffer += data
+        self.size += len(data)
+        if len(self.buffer) >= PART_SIZE:
+            self.flush_part()
+
+    def flush_part(self):
+        if self.upload_id is None:
+            import boto3
+            self.s3 = boto3.client('s3',
+                endpoint_url='https://bucket.poehali.dev',
+                aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+            )
+            upload = self.s3.create_multipart_upload(Bucket='files', Key=self.key, ContentType=self.content_type)
+            self.upload_id = upload['UploadId']
+        part_number = len(self.parts) + 1
+        part = self.s3.upload_part(
+            Bucket='files', Key=self.key, UploadId=self.upload_id,
+            PartNumber=part_number, Body=bytes(self.buffer)
+        )
+        self.parts.append({'ETag': part['ETag'], 'PartNumber': part_number})
+        self.buffer = bytearray()
+
+    @property
+    def uploaded(self) -> bool:
+        return self.upload_id is not None
+
+    def complete(self) -> Optional[str]:
+        """Дописывает хвост и возвращает ссылку; None - выгрузка не больше INLINE_LIMIT и отдаётся в ответе"""
+        if not self.uploaded and self.size <= INLINE_LIMIT:
+            return None
+        if self.buffer:
+            self.flush_part()
+        self.s3.complete_multipart_upload(
+            Bucket='files', Key=self.key, UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts}
+        )
+        return f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{self.key}"
+
+    def abort(self):
+        if self.uploaded:
+            self.s3.abort_multipart_upload(Bucket='files', Key=self.key, UploadId=self.upload_id)
+
+def export_csv(conn, sql: str, writer: MultipartWriter):
+    """COPY TO STDOUT пишет CSV прямо в writer, строки не собираются в Python"""
+    writer.write(CSV_BOM)
+    cur = conn.cursor()
+    cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER, DELIMITER '{CSV_DELIMITER}')", writer)
+    cur.close()
+
+def xlsx_value(value):
+    if value is None:
+        return None
+    if hasattr(value, 'isoformat'):
+        return value.isoformat(sep=' ') if isinstance(value, datetime) else value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def export_xlsx(conn, sql: str, headers: List[str], writer: MultipartWriter):
+    """
+    XlsxWriter в режиме constant_memory сбрасывает каждую строку во временный файл,
+    серверный курсор отдаёт строки пачками - в памяти не больше FETCH_SIZE строк.
+    """
+    import tempfile
+    import xlsxwriter
+
+    with tempfile.NamedTemporaryFile(suffix='.xlsx') as tmp:
+        workbook = xlsxwriter.Workbook(tmp.name, {'constant_memory': True, 'tmpdir': tempfile.gettempdir()})
+        header_format = workbook.add_format({'bold': True})
+        worksheet = None
+        row_index = XLSX_SHEET_ROWS
+
+        cur = conn.cursor(name='export')
+        cur.itersize = FETCH_SIZE
+        cur.execute(sql)
+        for row in cur:
+            if row_index >= XLSX_SHEET_ROWS:
+                worksheet = workbook.add_worksheet()
+                worksheet.write_row(0, 0, headers, header_format)
+                row_index = 0
+            row_index += 1
+            worksheet.write_row(row_index, 0, [xlsx_value(v) for v in row])
+        cur.close()
+
+        if worksheet is None:
+            workbook.add_worksheet().write_row(0, 0, headers, header_format)
+        workbook.close()
+
+        with open(tmp.name, 'rb') as f:
+            while True:
+                chunk = f.read(PART_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Выгрузка заказов, платежей или клиентов с контактами в CSV или XLSX
+    Args: event - HTTP запрос GET с entity (orders/payments/clients) и format (csv/xlsx)
+          context - контекст выполнения функции
+    Returns: Файл в теле ответа или JSON со ссылкой, если выгрузка больше одной части загрузки
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        query_params = event.get('queryStringParameters') or {}
+        entity = query_params.get('entity')
+        export_format = query_params.get('format', 'csv')
+
+        if entity not in EXPORTS or export_format not in CONTENT_TYPES:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'entity (orders/payments/clients) и format (csv/xlsx) обязательны'}),
+                'isBase64Encoded': False
+            }
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+        get_user_company_id(user_id, company_id, cur)
+        cur.close()
+
+        sql, column_headers = build_export_sql(entity, company_id)
+        filename = f"{entity}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}"
+        # Случайная часть ключа: ссылка на CDN публичная, угадать её нельзя
+        key = f"exports/company_{company_id}/{uuid.uuid4().hex}/{filename}"
+        writer = MultipartWriter(key, CONTENT_TYPES[export_format])
+
+        try:
+            if export_format == 'csv':
+                export_csv(conn, sql, writer)
+            else:
+                export_xlsx(conn, sql, column_headers, writer)
+            url = writer.complete()
+        except Exception:
+            writer.abort()
+            raise
+        finally:
+            conn.rollback()
+            conn.close()
+
+        if url:
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'url': url, 'filename': filename, 'size': writer.size}),
+                'isBase64Encoded': False
+            }
+
+        file_headers = {
+            'Content-Type': CONTENT_TYPES[export_format],
+            'Content-Disposition': f'attachment; filename="{filename}"',
+            'Access-Control-Allow-Origin': '*',
+            'Access-Control-Expose-Headers': 'Content-Disposition'
+        }
+        if export_format == 'csv':
+            return {
+                'statusCode': 200,
+                'headers': file_headers,
+                'body': bytes(writer.buffer).decode('utf-8'),
+                'isBase64Encoded': False
+            }
+        return {
+            'statusCode': 200,
+            'headers': file_headers,
+            'body': base64.b64encode(bytes(writer.buffer)).decode(),
+            'isBase64Encoded': True
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
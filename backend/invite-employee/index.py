@@ -2,9 +2,6 @@ import json
 import os
 import psycopg2
 import secrets
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
 from typing import Dict, Any
 
@@ -18,6 +15,10 @@ def escape_sql_string(s: str) -> str:
 
 def send_invitation_email(email: str, token: str, company_name: str, inviter_name: str):
     """Отправка email с приглашением"""
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    
     smtp_host = os.environ.get('SMTP_HOST')
     smtp_port = int(os.environ.get('SMTP_PORT', 587))
     smtp_user = os.environ.get('SMTP_USER')
@@ -84,6 +85,13 @@ def send_invitation_email(email: str, token: str, company_name: str, inviter_nam
         server.login(smtp_user, smtp_password)
         server.send_message(msg)
 
+def bump_entity_version(cur, company_id: int, entity: str):
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        VALUES ({company_id}, {escape_sql_string(entity)}, 1)
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Отправка приглашения сотруднику по email с токеном для регистрации
@@ -244,6 +252,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     '{expires_at.isoformat()}', 'pending')
         """)
         
+        bump_entity_version(cur, company_id, 'employees')
         conn.commit()
         
         # Отправляем email
@@ -0,0 +1,532 @@
+import json
+import os
+import socket
+import time
+import psycopg2
+from typing import Dict, Any, List, Optional, Callable
+
+DEFAULT_MAX_ATTEMPTS = 3
+MAX_ATTEMPTS_LIMIT = 10
+
+# Повтор после ошибки: 30 с, 60 с, 120 с ...
+RETRY_BASE_SECONDS = 30
+
+# Задача в статусе running без обновлений дольше этого считается брошенной упавшим воркером
+LOCK_TIMEOUT_MINUTES = 15
+
+DEFAULT_TIME_BUDGET = 20
+LIST_LIMIT = 50
+
+REFRESH_BATCH_SIZE = 500
+
+JOB_COLUMNS = ['id', 'kind', 'payload', 'status', 'progress', 'progress_message', 'result', 'error',
+               'attempts', 'max_attempts', 'run_after', 'created_at', 'updated_at', 'finished_at']
+
+CASCADE_OPERATIONS = {
+    'archive': ('active', 'archived'),
+    'restore': ('archived', 'active')
+}
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def escape_sql_string(s: str) -> str:
+    if s is None:
+        return 'NULL'
+    return "'" + s.replace("'", "''") + "'"
+
+def bump_entity_version(cur, company_id: int, entity: str):
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        VALUES ({company_id}, {escape_sql_string(entity)}, 1)
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
+def serialize_job(row) -> Dict[str, Any]:
+    job = {}
+    for column, value in zip(JOB_COLUMNS, row):
+        job[column] = value.isoformat() if hasattr(value, 'isoformat') else value
+    return job
+
+def validate_job(kind: str, payload: Dict[str, Any]) -> Optional[str]:
+    """Текст ошибки для 400 или None, если задачу можно ставить в очередь"""
+    if kind == 'cascade':
+        if payload.get('entity') not in ['client', 'project'] or not payload.get('id') \
+                or payload.get('operation') not in CASCADE_OPERATIONS:
+            return 'entity (client/project), id и operation (archive/restore) обязательны'
+        return None
+    if kind == 'client_revenue_refresh':
+        return None
+    return 'Неизвестный тип задачи'
+
+def enqueue_job(cur, company_id: int, user_id: Optional[int], kind: str, payload: Dict[str, Any],
+                max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Dict[str, Any]:
+    user_sql = str(user_id) if user_id else 'NULL'
+    cur.execute(f"""
+        INSERT INTO jobs (company_id, user_id, kind, payload, max_attempts)
+        VALUES ({company_id}, {user_sql}, {escape_sql_string(kind)}, {escape_sql_string(json.dumps(payload))}, {max_attempts})
+        RETURNING {', '.join(JOB_COLUMNS)}
+    """)
+    return serialize_job(cur.fetchone())
+
+def claim_job(cur, worker_id: str, company_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Забирает одну готовую задачу. SKIP LOCKED позволяет нескольким воркерам разбирать
+    очередь параллельно без ожидания друг друга. Брошенные running-задачи забираются повторно.
+    """
+    company_sql = f"AND company_id = {company_id}" if company_id else ''
+    cur.execute(f"""
+        UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                        locked_at = CURRENT_TIMESTAMP, locked_by = {escape_sql_string(worker_id)},
+                        updated_at = CURRENT_TIMESTAMP
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE ((status = 'queued' AND run_after <= CURRENT_TIMESTAMP)
+                   OR (status = 'running' AND locked_at < CURRENT_TIMESTAMP - INTERVAL '{LOCK_TIMEOUT_MINUTES} minutes'))
+              {company_sql}
+            ORDER BY run_after, id
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id, company_id, user_id, kind, payload, attempts, max_attempts
+    """)
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {
+        'id': row[0], 'company_id': row[1], 'user_id': row[2], 'kind': row[3],
+        'payload': row[4] or {}, 'attempts': row[5], 'max_attempts': row[6]
+    }
+
+def report_progress(cur, job_id: int, progress: int, message: str):
+    """Пишется через отдельное соединение с autocommit: прогресс виден, пока задача не закоммичена"""
+    cur.execute(f"""
+        UPDATE jobs SET progress = {max(0, min(int(progress), 99))}, progress_message = {escape_sql_string(message)},
+                        locked_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+        WHERE id = {job_id}
+    """)
+
+def fail_job(cur, job: Dict[str, Any], error: str, retry: bool = True):
+    if retry and job['attempts'] < job['max_attempts']:
+        delay = RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1)
+        cur.execute(f"""
+            UPDATE jobs SET status = 'queued', error = {escape_sql_string(error)},
+                            run_after = CURRENT_TIMESTAMP + INTERVAL '{delay} seconds',
+                            locked_at = NULL, locked_by = NULL, updated_at = CURRENT_TIMESTAMP
+            WHERE id = {job['id']}
+        """)
+    else:
+        cur.execute(f"""
+            UPDATE jobs SET status = 'failed', error = {escape_sql_string(error)},
+                            locked_at = NULL, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+            WHERE id = {job['id']}
+        """)
+
+def cascade_status(cur, company_id: int, entity: str, root_id: int, from_status: str, to_status: str,
+                   progress: Optional[Callable[[int, str], None]] = None) -> Dict[str, int]:
+    """
+    Переводит клиента или проект вместе с поддеревом из from_status в to_status несколькими
+    UPDATE по множествам и поднимает версии затронутых сущностей. Строка корня должна быть
+    заблокирована вызывающим (SELECT ... FOR UPDATE).
+    Архивация помечает переведённые строки поддерева меткой корня ('client:12'), восстановление
+    возвращает только строки с этой меткой (для проекта - ещё и с меткой каскада, заархивировавшего
+    сам проект) и снимает её: заархивированное вручную остаётся в архиве.
+    Функция jobs держит дословную копию для фонового каскада - правится здесь и копируется туда,
+    совпадение проверяет scripts/check_shared_code.py.
+    """
+    if entity == 'client':
+        projects_sql = f"SELECT id FROM projects WHERE company_id = {company_id} AND client_id = {root_id}"
+    else:
+        projects_sql = str(root_id)
+    orders_sql = f"SELECT id FROM orders WHERE company_id = {company_id} AND project_id IN ({projects_sql})"
+    root_table = 'clients' if entity == 'client' else 'projects'
+
+    # (таблица, условие поддерева, строки помечаются меткой каскада)
+    steps = [
+        ('payments', f"order_id IN ({orders_sql})", True),
+        ('orders', f"project_id IN ({projects_sql})", True)
+    ]
+    if entity == 'client':
+        steps.append(('projects', f"client_id = {root_id}", True))
+    steps.append((root_table, f"id = {root_id}", False))
+
+    marker = f"{entity}:{root_id}"
+    if to_status == 'archived':
+        marker_set_sql = escape_sql_string(marker)
+        marker_where_sql = ''
+    else:
+        markers = [marker]
+        if entity == 'project':
+            cur.execute(f"SELECT archived_by_cascade FROM projects WHERE id = {root_id} AND company_id = {company_id}")
+            row = cur.fetchone()
+            if row and row[0]:
+                markers.append(row[0])
+        marker_set_sql = 'NULL'
+        marker_where_sql = f" AND archived_by_cascade IN ({', '.join(escape_sql_string(m) for m in markers)})"
+
+    from_sql = escape_sql_string(from_status)
+    to_sql = escape_sql_string(to_status)
+    counts = {}
+
+    for index, (table, condition_sql, marked) in enumerate(steps):
+        if progress:
+            progress(index * 100 // len(steps), f'Обновление {table}')
+        set_sql = f", archived_by_cascade = {marker_set_sql}" if marked else ''
+        where_sql = marker_where_sql if marked else ''
+        cur.execute(f"""
+            UPDATE {table} SET status = {to_sql}, updated_at = CURRENT_TIMESTAMP, version = version + 1{set_sql}
+            WHERE company_id = {company_id} AND status = {from_sql} AND {condition_sql}{where_sql}
+        """)
+        counts[table] = counts.get(table, 0) + cur.rowcount
+
+    for table, count in counts.items():
+        if count:
+            bump_entity_version(cur, company_id, table)
+
+    return counts
+
+def refresh_client_revenue(cur, company_id: int, batch_size: Optional[int] = None) -> int:
+    """
+    Пересчитывает агрегаты только для клиентов, помеченных триггерами в client_revenue_dirty.
+    Метки снимаются и агрегаты пишутся одним оператором, поэтому запись, закоммиченная
+    во время пересчёта, оставит свою метку до следующего вызова. С batch_size берёт не больше
+    batch_size меток и пропускает заблокированные параллельным пересчётом.
+    Функция jobs держит дословную копию для фонового пересчёта - правится здесь и копируется туда,
+    совпадение проверяет scripts/check_shared_code.py.
+    """
+    batch_sql = ''
+    if batch_size:
+        batch_sql = f"""AND client_id IN (
+                SELECT client_id FROM client_revenue_dirty
+                WHERE company_id = {company_id}
+                ORDER BY client_id
+                LIMIT {batch_size}
+                FOR UPDATE SKIP LOCKED
+            )"""
+    cur.execute(f"""
+        WITH dirty AS (
+            DELETE FROM client_revenue_dirty
+            WHERE company_id = {company_id} {batch_sql}
+            RETURNING client_id
+        ),
+        dirty_orders AS (
+            SELECT pr.client_id, o.amount, pm.actual, pm.last_date
+            FROM (SELECT DISTINCT client_id FROM dirty) d
+            JOIN projects pr ON pr.client_id = d.client_id AND pr.company_id = {company_id} AND pr.status <> 'removed'
+            JOIN orders o ON o.project_id = pr.id AND o.company_id = {company_id} AND o.status <> 'removed'
+            LEFT JOIN LATERAL (
+                SELECT COALESCE(SUM(p.actual_amount), 0) AS actual,
+                       MAX(p.actual_date) FILTER (WHERE p.actual_amount > 0) AS last_date
+                FROM payments p
+                WHERE p.order_id = o.id AND p.company_id = {company_id} AND p.status <> 'removed'
+            ) pm ON true
+        )
+        INSERT INTO client_revenue (company_id, client_id, orders_count, contracted_amount,
+                                    actual_revenue, receivables, last_payment_date, refreshed_at)
+        SELECT {company_id}, d.client_id,
+               COUNT(dor.amount),
+               COALESCE(SUM(dor.amount), 0),
+               COALESCE(SUM(dor.actual), 0),
+               COALESCE(SUM(GREATEST(dor.amount - dor.actual, 0)), 0),
+               MAX(dor.last_date),
+               CURRENT_TIMESTAMP
+        FROM (SELECT DISTINCT client_id FROM dirty) d
+        LEFT JOIN dirty_orders dor ON dor.client_id = d.client_id
+        GROUP BY d.client_id
+        ON CONFLICT (company_id, client_id) DO UPDATE SET
+            orders_count = EXCLUDED.orders_count,
+            contracted_amount = EXCLUDED.contracted_amount,
+            actual_revenue = EXCLUDED.actual_revenue,
+            receivables = EXCLUDED.receivables,
+            last_payment_date = EXCLUDED.last_payment_date,
+            refreshed_at = EXCLUDED.refreshed_at
+    """)
+    return cur.rowcount
+
+def run_cascade(conn, job: Dict[str, Any], progress: Callable[[int, str], None]) -> Dict[str, Any]:
+    """То же, что функция cascade, но с прогрессом по таблицам; выполняется одной транзакцией"""
+    payload = job['payload']
+    company_id = job['company_id']
+    entity = payload['entity']
+    root_id = int(payload['id'])
+    from_status, to_status = CASCADE_OPERATIONS[payload['operation']]
+    root_table = 'clients' if entity == 'client' else 'projects'
+
+    cur = conn.cursor()
+    cur.execute(f"SELECT status FROM {root_table} WHERE id = {root_id} AND company_id = {company_id} FOR UPDATE")
+    row = cur.fetchone()
+    if not row or row[0] == 'removed':
+        raise ValueError('Клиент не найден' if entity == 'client' else 'Проект не найден')
+
+    counts = cascade_status(cur, company_id, entity, root_id, from_status, to_status, progress)
+    cur.close()
+    return {'status': to_status, 'counts': counts}
+
+def run_client_revenue_refresh(conn, job: Dict[str, Any], progress: Callable[[int, str], None]) -> Dict[str, Any]:
+    """
+    Пересчёт client_revenue пачками с коммитом после каждой. С payload.full помечает
+    всех клиентов компании, иначе досчитывает только помеченных триггерами.
+    """
+    company_id = job['company_id']
+    cur = conn.cursor()
+
+    if job['payload'].get('full'):
+        cur.execute(f"""
+            INSERT INTO client_revenue_dirty (company_id, client_id)
+            SELECT company_id, id FROM clients WHERE company_id = {company_id}
+            ON CONFLICT DO NOTHING
+        """)
+        conn.commit()
+
+    cur.execute(f"SELECT COUNT(*) FROM client_revenue_dirty WHERE company_id = {company_id}")
+    total = cur.fetchone()[0]
+    refreshed = 0
+
+    while True:
+        count = refresh_client_revenue(cur, company_id, REFRESH_BATCH_SIZE)
+        conn.commit()
+        refreshed += count
+        progress(refreshed * 100 // total if total else 99, f'Пересчитано клиентов: {refreshed}')
+        if count < REFRESH_BATCH_SIZE:
+            break
+
+    cur.close()
+    return {'refreshed_clients': refreshed}
+
+JOB_KINDS = {
+    'cascade': run_cascade,
+    'client_revenue_refresh': run_client_revenue_refresh
+}
+
+def run_jobs(conn, queue_conn, worker_id: str, time_budget: float, company_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Разбирает очередь, пока не кончится время или задачи. conn - рабочее соединение задачи,
+    queue_conn (autocommit) - захват, прогресс и ошибки, чтобы откат задачи их не стирал.
+    """
+    started = time.monotonic()
+    queue_cur = queue_conn.cursor()
+    processed = []
+
+    while time.monotonic() - started < time_budget:
+        job = claim_job(queue_cur, worker_id, company_id)
+        if not job:
+            break
+
+        def progress(value: int, message: str, job_id: int = job['id']):
+            report_progress(queue_cur, job_id, value, message)
+
+        if job['kind'] not in JOB_KINDS:
+            fail_job(queue_cur, job, 'Неизвестный тип задачи', retry=False)
+            processed.append({'id': job['id'], 'status': 'failed'})
+            continue
+
+        try:
+            result = JOB_KINDS[job['kind']](conn, job, progress)
+            cur = conn.cursor()
+            # Итог пишется в транзакции задачи: результат и статус фиксируются вместе
+            cur.execute(f"""
+                UPDATE jobs SET status = 'succeeded', progress = 100, progress_message = NULL,
+                                result = {escape_sql_string(json.dumps(result))}, error = NULL,
+                                locked_at = NULL, finished_at = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE id = {job['id']}
+            """)
+            conn.commit()
+            cur.close()
+            processed.append({'id': job['id'], 'status': 'succeeded'})
+        except Exception as e:
+            conn.rollback()
+            fail_job(queue_cur, job, str(e))
+            processed.append({'id': job['id'], 'status': 'failed', 'error': str(e)})
+
+    queue_cur.close()
+    return processed
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Фоновые задачи компании: постановка в очередь, статус и запуск обработки
+    Args: event - HTTP запрос GET (id - одна задача, без id - последние задачи)
+                  или POST с kind и payload (action=run - обработать очередь компании)
+          context - контекст выполнения функции
+    Returns: JSON с задачей, списком задач или итогом обработки
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        cur.execute(f"SELECT role FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+        user_data = cur.fetchone()
+
+        if not user_data:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                'isBase64Encoded': False
+            }
+
+        user_role = user_data[0]
+
+        if method == 'GET':
+            query_params = event.get('queryStringParameters') or {}
+            job_id = query_params.get('id')
+
+            if job_id:
+                cur.execute(f"""
+                    SELECT {', '.join(JOB_COLUMNS)} FROM jobs
+                    WHERE id = {int(job_id)} AND company_id = {company_id}
+                """)
+                row = cur.fetchone()
+                cur.close()
+                conn.close()
+
+                if not row:
+                    return {
+                        'statusCode': 404,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Задача не найдена'}),
+                        'isBase64Encoded': False
+                    }
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'job': serialize_job(row)}),
+                    'isBase64Encoded': False
+                }
+
+            cur.execute(f"""
+                SELECT {', '.join(JOB_COLUMNS)} FROM jobs
+                WHERE company_id = {company_id}
+                ORDER BY id DESC
+                LIMIT {LIST_LIMIT}
+            """)
+            jobs = [serialize_job(row) for row in cur.fetchall()]
+            cur.close()
+            conn.close()
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'jobs': jobs}),
+                'isBase64Encoded': False
+            }
+
+        elif method == 'POST':
+            body = json.loads(event.get('body', '{}'))
+            action = body.get('action', 'enqueue')
+
+            if action == 'enqueue':
+                kind = body.get('kind')
+                payload = body.get('payload') or {}
+                error = validate_job(kind, payload)
+
+                if error:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': error}),
+                        'isBase64Encoded': False
+                    }
+
+                max_attempts = max(1, min(int(body.get('max_attempts', DEFAULT_MAX_ATTEMPTS)), MAX_ATTEMPTS_LIMIT))
+                job = enqueue_job(cur, company_id, user_id, kind, payload, max_attempts)
+                conn.commit()
+                cur.close()
+                conn.close()
+
+                return {
+                    'statusCode': 202,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'job': job}),
+                    'isBase64Encoded': False
+                }
+
+            elif action == 'run':
+                if user_role not in ['owner', 'admin']:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 403,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': 'Недостаточно прав'}),
+                        'isBase64Encoded': False
+                    }
+
+                time_budget = float(body.get('time_budget', DEFAULT_TIME_BUDGET))
+                cur.close()
+
+                queue_conn = get_db_connection()
+                queue_conn.autocommit = True
+                worker_id = f"http-{socket.gethostname()}-{os.getpid()}"
+                processed = run_jobs(conn, queue_conn, worker_id, time_budget, company_id)
+                queue_conn.close()
+                conn.close()
+
+                return {
+                    'statusCode': 200,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'processed': processed}),
+                    'isBase64Encoded': False
+                }
+
+            else:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Неизвестное действие'}),
+                    'isBase64Encoded': False
+                }
+
+        else:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 405,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Метод не поддерживается'}),
+                'isBase64Encoded': False
+            }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
@@ -0,0 +1,164 @@
+import json
+import os
+import psycopg2
+from typing import Dict, Any, Tuple
+
+# entity -> таблица; выбираются только id и name, что покрывается индексами idx_*_lookup
+LOOKUP_TABLES = {
+    'clients': 'clients',
+    'projects': 'projects'
+}
+
+# Готовые тела ответов тёплого экземпляра функции: (company_id, entity, version) -> JSON.
+# Версия из entity_versions меняется при каждой записи, поэтому устаревший ключ просто не найдётся
+LOOKUP_CACHE: Dict[Tuple[int, str, int], str] = {}
+LOOKUP_CACHE_SIZE = 256
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def etag_matches(headers: Dict[str, Any], etag: str) -> bool:
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag,
+        'Vary': 'X-User-Id, X-Company-Id'
+    }
+
+def load_lookup(cur, company_id: int, entity: str) -> str:
+    cur.execute(f"""
+        SELECT COALESCE(json_agg(json_build_object('id', t.id, 'name', t.name) ORDER BY t.name, t.id), '[]'::json)::text
+        FROM (
+            SELECT id, name FROM {LOOKUP_TABLES[entity]}
+            WHERE company_id = {company_id} AND status = 'active'
+            ORDER BY name, id
+        ) t
+    """)
+    return '{"' + entity + '": ' + cur.fetchone()[0] + '}'
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Короткие списки id и name активных клиентов или проектов для выпадающих списков
+    Args: event - HTTP запрос GET с entity (clients/projects)
+          context - контекст выполнения функции
+    Returns: JSON со списком {id, name}, отсортированным по name; 304 при совпадении ETag
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id, If-None-Match',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        query_params = event.get('queryStringParameters') or {}
+        entity = query_params.get('entity')
+
+        if entity not in LOOKUP_TABLES:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'entity (clients/projects) обязателен'}),
+                'isBase64Encoded': False
+            }
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        # Проверка доступа и версия списка одним запросом
+        cur.execute(f"""
+            SELECT cu.company_id, COALESCE(ev.version, 0)
+            FROM company_users cu
+            LEFT JOIN entity_versions ev ON ev.company_id = cu.company_id AND ev.entity = '{entity}'
+            WHERE cu.user_id = {user_id} AND cu.company_id = {company_id}
+        """)
+        access = cur.fetchone()
+
+        if not access:
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 403,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                'isBase64Encoded': False
+            }
+
+        version = access[1]
+        etag = f'W/"c{company_id}-lookup-{entity}{version}"'
+
+        if etag_matches(headers, etag):
+            cur.close()
+            conn.close()
+            return {
+                'statusCode': 304,
+                'headers': etag_headers(etag),
+                'body': '',
+                'isBase64Encoded': False
+            }
+
+        cache_key = (company_id, entity, version)
+        body = LOOKUP_CACHE.get(cache_key)
+        if body is None:
+            body = load_lookup(cur, company_id, entity)
+            for stale_key in [k for k in LOOKUP_CACHE if k[:2] == cache_key[:2]]:
+                del LOOKUP_CACHE[stale_key]
+            if len(LOOKUP_CACHE) >= LOOKUP_CACHE_SIZE:
+                LOOKUP_CACHE.pop(next(iter(LOOKUP_CACHE)))
+            LOOKUP_CACHE[cache_key] = body
+
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': etag_headers(etag),
+            'body': body,
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
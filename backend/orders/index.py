@@ -1,8 +1,10 @@
+import hashlib
 import json
+import math
 import os
 import psycopg2
-from datetime import datetime
-from typing import Dict, Any
+from datetime import datetime, date
+from typing import Dict, Any, List, Optional, Tuple
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
@@ -12,6 +14,82 @@ def escape_sql_string(s: str) -> str:
         return 'NULL'
     return "'" + s.replace("'", "''") + "'"
 
+ORDER_STATUSES = ['new', 'in_progress', 'completed', 'done']
+PAYMENT_STATUSES = ['not_paid', 'awaiting_payment', 'partially_paid', 'paid']
+PAYMENT_TYPES = ['prepaid', 'postpaid', 'installments']
+
+# Разрешённые ключи сортировки -> выражение ORDER BY (id добавляется для стабильности)
+ORDER_SORT_COLUMNS = {
+    'created_at': 'o.created_at',
+    'planned_date': 'o.planned_date',
+    'amount': 'o.amount',
+    'name': 'o.name'
+}
+
+def build_order_filters(query_params: Dict[str, Any]) -> Tuple[List[str], Optional[str]]:
+    """Собирает условия WHERE для списка заказов из query-параметров. Возвращает (условия, ошибка)"""
+    conditions = []
+    
+    enum_filters = [
+        ('order_status', ORDER_STATUSES),
+        ('payment_status', PAYMENT_STATUSES),
+        ('payment_type', PAYMENT_TYPES)
+    ]
+    for field, allowed in enum_filters:
+        value = query_params.get(field)
+        if not value:
+            continue
+        values = [v for v in value.split(',') if v]
+        if any(v not in allowed for v in values):
+            return [], f'Недопустимое значение {field}'
+        if len(values) == 1:
+            conditions.append(f"o.{field} = {escape_sql_string(values[0])}")
+        else:
+            conditions.append(f"o.{field} IN ({', '.join(escape_sql_string(v) for v in values)})")
+    
+    try:
+        project_id = query_params.get('project_id')
+        if project_id:
+            conditions.append(f"o.project_id = {int(project_id)}")
+        
+        client_id = query_params.get('client_id')
+        if client_id:
+            conditions.append(f"o.project_id IN (SELECT id FROM projects WHERE client_id = {int(client_id)})")
+        
+        amount_min = query_params.get('amount_min')
+        if amount_min:
+            amount_min = float(amount_min)
+            if not math.isfinite(amount_min):
+                raise ValueError(amount_min)
+            conditions.append(f"o.amount >= {amount_min}")
+        
+        amount_max = query_params.get('amount_max')
+        if amount_max:
+            amount_max = float(amount_max)
+            if not math.isfinite(amount_max):
+                raise ValueError(amount_max)
+            conditions.append(f"o.amount <= {amount_max}")
+        
+        planned_from = query_params.get('planned_from')
+        if planned_from:
+            conditions.append(f"o.planned_date >= '{date.fromisoformat(planned_from).isoformat()}'")
+        
+        planned_to = query_params.get('planned_to')
+        if planned_to:
+            conditions.append(f"o.planned_date <= '{date.fromisoformat(planned_to).isoformat()}'")
+    except ValueError:
+        return [], 'Некорректные параметры фильтра'
+    
+    return conditions, None
+
+def build_order_sort(query_params: Dict[str, Any]) -> str:
+    sort_key = query_params.get('sort', 'created_at')
+    if sort_key not in ORDER_SORT_COLUMNS:
+        sort_key = 'created_at'
+    direction = 'ASC' if query_params.get('order') == 'asc' else 'DESC'
+    nulls = ' NULLS LAST' if sort_key == 'planned_date' else ''
+    return f"{ORDER_SORT_COLUMNS[sort_key]} {direction}{nulls}, o.id {direction}"
+
 def get_user_company_id(user_id: int, company_id: int, cur) -> int:
     cur.execute(f"SELECT company_id FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
     result = cur.fetchone()
@@ -19,10 +97,366 @@ def get_user_company_id(user_id: int, company_id: int, cur) -> int:
         raise Exception('Доступ к компании запрещён')
     return result[0]
 
+ORDERS_ETAG_ENTITIES = ['orders', 'projects', 'clients']
+
+def get_entities_etag(cur, company_id: int, entities: List[str]) -> str:
+    """ETag списка/карточки из счётчиков версий сущностей, от которых зависит ответ"""
+    entities_sql = ', '.join(escape_sql_string(e) for e in entities)
+    cur.execute(f"""
+        SELECT entity, version FROM entity_versions
+        WHERE company_id = {company_id} AND entity IN ({entities_sql})
+    """)
+    versions = dict(cur.fetchall())
+    return 'W/"' + '-'.join([f"c{company_id}"] + [f"{e}{versions.get(e, 0)}" for e in entities]) + '"'
+
+def member_sql(user_id: int, company_id: int) -> str:
+    return f"EXISTS (SELECT 1 FROM company_users WHERE user_id = {user_id} AND company_id = {company_id})"
+
+def version_bump_sql(company_id: int, entity: str, source: str) -> str:
+    """CTE bump: увеличивает версию сущности, если source вернул строку"""
+    return f"""bump AS (
+            INSERT INTO entity_versions (company_id, entity, version)
+            SELECT {company_id}, {escape_sql_string(entity)}, 1 FROM {source}
+            ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+        )"""
+
+def owned_insert(cur, table: str, user_id: int, company_id: int, columns_sql: str, values_sql: str,
+                 extra_ctes: str = '') -> Optional[int]:
+    """
+    INSERT с проверкой членства в компании и увеличением версии - один запрос к БД.
+    extra_ctes дописываются в тот же WITH и могут ссылаться на created(id)
+    Returns: id новой строки или None, если пользователь не состоит в компании
+    """
+    cur.execute(f"""
+        WITH created AS (
+            INSERT INTO {table} (company_id, {columns_sql})
+            SELECT {company_id}, {values_sql}
+            WHERE {member_sql(user_id, company_id)}
+            RETURNING id
+        ),
+        {version_bump_sql(company_id, table, 'created')}{extra_ctes}
+        SELECT id FROM created
+    """)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def owned_update(cur, table: str, user_id: int, company_id: int, row_id: int, set_sql: str,
+                 guard_sql: str = 'TRUE', extra_ctes: str = '',
+                 expected_version: Optional[int] = None) -> Tuple[bool, Optional[str], Optional[int], Optional[int]]:
+    """
+    UPDATE строки компании одним запросом: членство и владение - в WHERE, версия сущности - в том же WITH.
+    Каждая запись увеличивает version строки; с expected_version UPDATE условный (WHERE version = n),
+    так что параллельные правки не затирают друг друга без блокировок.
+    Статус и version строки читаются из того же снимка, поэтому без отдельных SELECT различаются
+    «нет доступа», «не найдено», «конфликт версий» и «guard_sql не выполнен» (например, уже удалена).
+    extra_ctes могут ссылаться на changed(id)
+    Returns: (есть доступ, статус строки или None, version до записи, новая version или None без записи)
+    """
+    version_sql = f" AND version = {int(expected_version)}" if expected_version is not None else ''
+    cur.execute(f"""
+        WITH member AS (
+            SELECT {member_sql(user_id, company_id)} AS allowed
+        ),
+        target AS (
+            SELECT status, version FROM {table} WHERE id = {row_id} AND company_id = {company_id}
+        ),
+        changed AS (
+            UPDATE {table}
+            SET {set_sql}, updated_at = CURRENT_TIMESTAMP, version = version + 1
+            WHERE id = {row_id} AND company_id = {company_id}
+              AND (SELECT allowed FROM member) AND {guard_sql}{version_sql}
+            RETURNING id, version
+        ),
+        {version_bump_sql(company_id, table, 'changed')}{extra_ctes}
+        SELECT (SELECT allowed FROM member), (SELECT status FROM target), (SELECT version FROM target),
+               (SELECT version FROM changed)
+    """)
+    return cur.fetchone()
+
+CONFLICT_MESSAGE = 'Запись изменена другим пользователем, обновите данные'
+
+def parse_version(value) -> Tuple[Optional[int], Optional[str]]:
+    """version строки, которую видел клиент; None - запись без проверки версии. Возвращает (версия, ошибка)"""
+    if value is None or value == '':
+        return None, None
+    try:
+        return int(value), None
+    except (TypeError, ValueError):
+        return None, 'Некорректная версия записи'
+
+def parse_amount(value) -> Tuple[Optional[float], Optional[str]]:
+    """Сумма заказа для POST/PUT: пустое значение - 0. Возвращает (сумма, ошибка)"""
+    try:
+        amount = float(value or 0)
+    except (TypeError, ValueError):
+        return None, 'Некорректное значение поля amount'
+    if not math.isfinite(amount):
+        return None, 'Некорректное значение поля amount'
+    return amount, None
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+def get_idempotency_key(headers: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    key = (headers.get('Idempotency-Key') or headers.get('idempotency-key') or '').strip()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, f'Idempotency-Key длиннее {IDEMPOTENCY_KEY_MAX_LENGTH} символов'
+    return key or None, None
+
+def request_fingerprint(body: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def claim_idempotency_key(cur, user_id: int, company_id: int, entity: str, key: str,
+                          request_hash: str) -> Tuple[bool, Optional[Tuple[str, Any]]]:
+    """
+    Занимает ключ идемпотентности через INSERT ... ON CONFLICT: новый или просроченный ключ
+    достаётся этому запросу. Конкурентный дубль ждёт на ON CONFLICT коммита первого запроса
+    и затем читает сохранённый им ответ. Попутно удаляются просроченные ключи компании.
+    Returns: (True, None) - ключ занят этим запросом; иначе (False, (request_hash, response))
+             или (False, None), если пользователь не состоит в компании
+    """
+    key_where_sql = f"company_id = {company_id} AND entity = '{entity}' AND idempotency_key = {escape_sql_string(key)}"
+    cur.execute(f"""
+        WITH expired AS (
+            DELETE FROM idempotency_keys
+            WHERE company_id = {company_id} AND expires_at < CURRENT_TIMESTAMP AND NOT ({key_where_sql})
+        ),
+        claim AS (
+            INSERT INTO idempotency_keys (company_id, entity, idempotency_key, request_hash, expires_at)
+            VALUES ({company_id}, '{entity}', {escape_sql_string(key)}, decode('{request_hash}', 'hex'),
+                    CURRENT_TIMESTAMP + INTERVAL '{IDEMPOTENCY_TTL_HOURS} hours')
+            ON CONFLICT (company_id, entity, idempotency_key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, response = NULL, expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+            RETURNING 1
+        )
+        SELECT EXISTS (SELECT 1 FROM claim)
+    """)
+    if cur.fetchone()[0]:
+        return True, None
+    # Новый снимок: ответ конкурентного запроса, дождавшегося коммита, уже виден
+    cur.execute(f"""
+        SELECT encode(request_hash, 'hex'), response FROM idempotency_keys
+        WHERE {key_where_sql} AND {member_sql(user_id, company_id)}
+    """)
+    return False, cur.fetchone()
+
+def idempotency_response_sql(company_id: int, entity: str, key: str, response_sql: str) -> str:
+    """CTE для owned_insert: ответ сохраняется под ключом тем же запросом, что и вставка"""
+    return f""",
+        idempotency AS (
+            UPDATE idempotency_keys SET response = {response_sql}
+            FROM created
+            WHERE idempotency_keys.company_id = {company_id} AND idempotency_keys.entity = '{entity}'
+              AND idempotency_keys.idempotency_key = {escape_sql_string(key)}
+        )"""
+
+def idempotent_replay(saved: Optional[Tuple[str, Any]], request_hash: str) -> Dict[str, Any]:
+    """Ответ на повтор запроса с уже использованным Idempotency-Key"""
+    if saved is None:
+        status_code, body = 403, {'error': 'Доступ к компании запрещён'}
+    elif saved[0] != request_hash:
+        status_code, body = 422, {'error': 'Idempotency-Key уже использован с другим телом запроса'}
+    elif saved[1] is None:
+        status_code, body = 409, {'error': 'Запрос с этим Idempotency-Key ещё выполняется'}
+    else:
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Expose-Headers': 'Idempotent-Replayed',
+                'Idempotent-Replayed': 'true'
+            },
+            'body': json.dumps(saved[1]),
+            'isBase64Encoded': False
+        }
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body),
+        'isBase64Encoded': False
+    }
+
+def etag_matches(headers: Dict[str, Any], etag: str) -> bool:
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag,
+        'Vary': 'X-User-Id, X-Company-Id'
+    }
+
+# Поля ответа для render=db: (ключ, SQL-выражение) - те же ключи, что собирает Python-ветка
+ORDER_LIST_JSON_FIELDS = [
+    ('id', 'o.id'),
+    ('name', 'o.name'),
+    ('description', 'o.description'),
+    ('amount', 'COALESCE(o.amount, 0)'),
+    ('order_status', 'o.order_status'),
+    ('payment_status', 'o.payment_status'),
+    ('payment_type', 'o.payment_type'),
+    ('planned_date', 'o.planned_date'),
+    ('project_id', 'o.project_id'),
+    ('created_at', 'o.created_at'),
+    ('project_name', 'p.name'),
+    ('client_name', 'c.name'),
+    ('version', 'o.version')
+]
+
+ORDER_DETAIL_JSON_FIELDS = ORDER_LIST_JSON_FIELDS[:8] + [
+    ('actual_date', 'o.actual_date'),
+    ('project_id', 'o.project_id'),
+    ('created_at', 'o.created_at'),
+    ('updated_at', 'o.updated_at'),
+    ('status', 'o.status'),
+    ('project_name', 'p.name'),
+    ('client_name', 'c.name'),
+    ('version', 'o.version')
+]
+
+# include=payments в render=db: график платежей и итоги одним LATERAL на заказ
+ORDER_PAYMENTS_JSON_FIELDS = [
+    ('payments', 'op.payments'),
+    ('planned_payments_amount', 'op.planned_total'),
+    ('paid_amount', 'op.paid'),
+    ('remaining_amount', 'GREATEST(COALESCE(o.amount, 0) - op.paid, 0)')
+]
+
+def order_payments_lateral_sql(company_id: int) -> str:
+    return f"""
+        LEFT JOIN LATERAL (
+            SELECT COALESCE(json_agg(json_build_object(
+                       'id', pm.id,
+                       'planned_amount', NULLIF(pm.planned_amount, 0),
+                       'planned_amount_percent', NULLIF(pm.planned_amount_percent, 0),
+                       'actual_amount', COALESCE(pm.actual_amount, 0),
+                       'planned_date', pm.planned_date,
+                       'actual_date', pm.actual_date,
+                       'status', pm.status
+                   ) ORDER BY pm.planned_date NULLS LAST, pm.id), '[]'::json) as payments,
+                   COALESCE(SUM(COALESCE(pm.planned_amount, COALESCE(o.amount, 0) * pm.planned_amount_percent / 100)), 0) as planned_total,
+                   COALESCE(SUM(pm.actual_amount), 0) as paid
+            FROM payments pm
+            WHERE pm.company_id = {company_id} AND pm.order_id = o.id AND pm.status <> 'removed'
+        ) op ON true
+    """
+
+def load_order_payments(cur, company_id: int, order_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """Платежи всех заказов страницы одним запросом по order_id = ANY(...)"""
+    payments = {order_id: [] for order_id in order_ids}
+    if not order_ids:
+        return payments
+    cur.execute(f"""
+        SELECT order_id, id, planned_amount, planned_amount_percent, actual_amount,
+               planned_date, actual_date, status
+        FROM payments
+        WHERE company_id = {company_id} AND order_id = ANY(ARRAY[{', '.join(str(i) for i in order_ids)}])
+          AND status <> 'removed'
+        ORDER BY order_id, planned_date NULLS LAST, id
+    """)
+    for row in cur.fetchall():
+        payments[row[0]].append({
+            'id': row[1],
+            'planned_amount': float(row[2]) if row[2] else None,
+            'planned_amount_percent': float(row[3]) if row[3] else None,
+            'actual_amount': float(row[4]) if row[4] else 0,
+            'planned_date': row[5].isoformat() if row[5] else None,
+            'actual_date': row[6].isoformat() if row[6] else None,
+            'status': row[7]
+        })
+    return payments
+
+def payment_totals(amount: float, payments: List[Dict[str, Any]]) -> Dict[str, Any]:
+    planned = sum(
+        p['planned_amount'] if p['planned_amount'] is not None else amount * (p['planned_amount_percent'] or 0) / 100
+        for p in payments
+    )
+    paid = sum(p['actual_amount'] for p in payments)
+    return {
+        'payments': payments,
+        'planned_payments_amount': planned,
+        'paid_amount': paid,
+        'remaining_amount': max(amount - paid, 0)
+    }
+
+def json_object_sql(fields: List[Tuple[str, str]]) -> str:
+    """json_build_object из пар (ключ, выражение); ::text у результата - чтобы psycopg2 не разбирал JSON обратно в dict"""
+    return 'json_build_object(' + ', '.join(f"'{key}', {expr}" for key, expr in fields) + ')'
+
+ENTITY_STATUSES = ['active', 'archived', 'removed']
+
+def patch_value_sql(kind, value) -> str:
+    """SQL-значение поля PATCH по его виду; ValueError при некорректном значении"""
+    if isinstance(kind, list):
+        if value not in kind:
+            raise ValueError(value)
+        return escape_sql_string(value)
+    if kind == 'name':
+        value = (value or '').strip()
+        if not value:
+            raise ValueError(value)
+        return escape_sql_string(value)
+    if kind == 'text':
+        value = (value or '').strip()
+        return escape_sql_string(value) if value else 'NULL'
+    if value is None or value == '':
+        return '0' if kind == 'amount' else 'NULL'
+    if kind in ('number', 'amount'):
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(value)
+        return str(number)
+    if kind == 'date':
+        return f"'{date.fromisoformat(value).isoformat()}'"
+    return str(int(value))
+
+def build_patch_assignments(body: Dict[str, Any], fields: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    """Пары (колонка, SQL-значение) только для переданных в теле полей. Возвращает (пары, ошибка)"""
+    assignments = []
+    for column, kind in fields.items():
+        if column not in body:
+            continue
+        try:
+            assignments.append((column, patch_value_sql(kind, body[column])))
+        except (TypeError, ValueError):
+            return [], f'Некорректное значение поля {column}'
+    return assignments, None
+
+def patch_sql(assignments: List[Tuple[str, str]]) -> Tuple[str, str]:
+    """
+    SET только переданных колонок и условие, что хотя бы одно значение меняется:
+    строка, где всё уже совпадает, не переписывается (нет новой версии строки и WAL)
+    """
+    set_sql = ', '.join(f"{column} = {value}" for column, value in assignments)
+    columns_sql = ', '.join(column for column, _ in assignments)
+    values_sql = ', '.join(value for _, value in assignments)
+    return set_sql, f"ROW({columns_sql}) IS DISTINCT FROM ROW({values_sql})"
+
+# Поля PATCH -> вид значения (см. patch_value_sql); список - допустимые значения
+ORDER_PATCH_FIELDS = {
+    'name': 'name',
+    'description': 'text',
+    'amount': 'amount',
+    'order_status': ORDER_STATUSES,
+    'payment_status': PAYMENT_STATUSES,
+    'payment_type': PAYMENT_TYPES,
+    'status': ENTITY_STATUSES,
+    'planned_date': 'date',
+    'actual_date': 'date',
+    'project_id': 'id'
+}
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Управление заказами: создание, чтение, обновление, удаление
-    Args: event - HTTP запрос с методами GET/POST/PUT/DELETE
+    Args: event - HTTP запрос с методами GET/POST/PUT/PATCH/DELETE
           context - контекст выполнения функции
     Returns: JSON с результатом операции
     """
@@ -33,8 +467,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id, If-None-Match, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -60,24 +494,52 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        get_user_company_id(user_id, company_id, cur)
-        
         if method == 'GET':
+            get_user_company_id(user_id, company_id, cur)
+            
             query_params = event.get('queryStringParameters') or {}
+            with_payments = 'payments' in (query_params.get('include') or '').split(',')
+            
+            etag_entities = ORDERS_ETAG_ENTITIES + (['payments'] if with_payments else [])
+            etag = get_entities_etag(cur, company_id, etag_entities)
+            if etag_matches(headers, etag):
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 304,
+                    'headers': etag_headers(etag),
+                    'body': '',
+                    'isBase64Encoded': False
+                }
+            
             order_id = query_params.get('id')
             status_filter = query_params.get('status')
             
+            render_db = query_params.get('render') == 'db'
+            payments_fields = ORDER_PAYMENTS_JSON_FIELDS if with_payments else []
+            payments_join = order_payments_lateral_sql(company_id) if with_payments else ''
+            
             if order_id:
-                cur.execute(f"""
-                    SELECT o.id, o.name, o.description, o.amount, o.order_status, o.payment_status, 
-                           o.payment_type, o.planned_date, o.actual_date, o.project_id, 
-                           o.created_at, o.updated_at, o.status,
-                           p.name as project_name, c.name as client_name
-                    FROM orders o
-                    LEFT JOIN projects p ON o.project_id = p.id
-                    LEFT JOIN clients c ON p.client_id = c.id
-                    WHERE o.id = {int(order_id)} AND o.company_id = {company_id}
-                """)
+                if render_db:
+                    cur.execute(f"""
+                        SELECT {json_object_sql(ORDER_DETAIL_JSON_FIELDS + payments_fields)}::text
+                        FROM orders o
+                        LEFT JOIN projects p ON o.project_id = p.id
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        {payments_join}
+                        WHERE o.id = {int(order_id)} AND o.company_id = {company_id}
+                    """)
+                else:
+                    cur.execute(f"""
+                        SELECT o.id, o.name, o.description, o.amount, o.order_status, o.payment_status, 
+                               o.payment_type, o.planned_date, o.actual_date, o.project_id, 
+                               o.created_at, o.updated_at, o.status,
+                               p.name as project_name, c.name as client_name, o.version
+                        FROM orders o
+                        LEFT JOIN projects p ON o.project_id = p.id
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        WHERE o.id = {int(order_id)} AND o.company_id = {company_id}
+                    """)
                 
                 order = cur.fetchone()
                 if not order:
@@ -90,75 +552,117 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                result = {
-                    'id': order[0],
-                    'name': order[1],
-                    'description': order[2],
-                    'amount': float(order[3]) if order[3] else 0,
-                    'order_status': order[4],
-                    'payment_status': order[5],
-                    'payment_type': order[6],
-                    'planned_date': order[7].isoformat() if order[7] else None,
-                    'actual_date': order[8].isoformat() if order[8] else None,
-                    'project_id': order[9],
-                    'created_at': order[10].isoformat() if order[10] else None,
-                    'updated_at': order[11].isoformat() if order[11] else None,
-                    'status': order[12],
-                    'project_name': order[13],
-                    'client_name': order[14]
-                }
+                if render_db:
+                    body = order[0]
+                else:
+                    result = {
+                        'id': order[0],
+                        'name': order[1],
+                        'description': order[2],
+                        'amount': float(order[3]) if order[3] else 0,
+                        'order_status': order[4],
+                        'payment_status': order[5],
+                        'payment_type': order[6],
+                        'planned_date': order[7].isoformat() if order[7] else None,
+                        'actual_date': order[8].isoformat() if order[8] else None,
+                        'project_id': order[9],
+                        'created_at': order[10].isoformat() if order[10] else None,
+                        'updated_at': order[11].isoformat() if order[11] else None,
+                        'status': order[12],
+                        'project_name': order[13],
+                        'client_name': order[14],
+                        'version': order[15]
+                    }
+                    if with_payments:
+                        order_payments = load_order_payments(cur, company_id, [result['id']])[result['id']]
+                        result.update(payment_totals(result['amount'], order_payments))
+                    body = json.dumps(result)
                 
                 cur.close()
                 conn.close()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(result),
+                    'headers': etag_headers(etag),
+                    'body': body,
                     'isBase64Encoded': False
                 }
             else:
                 if status_filter not in ['active', 'archived']:
                     status_filter = 'active'
                 
-                cur.execute(f"""
-                    SELECT o.id, o.name, o.description, o.amount, o.order_status, o.payment_status, 
-                           o.payment_type, o.planned_date, o.project_id, o.created_at,
-                           p.name as project_name, c.name as client_name
-                    FROM orders o
-                    LEFT JOIN projects p ON o.project_id = p.id
-                    LEFT JOIN clients c ON p.client_id = c.id
-                    WHERE o.company_id = {company_id} AND o.status = {escape_sql_string(status_filter)}
-                    ORDER BY o.created_at DESC
-                """)
+                filters, filter_error = build_order_filters(query_params)
+                if filter_error:
+                    cur.close()
+                    conn.close()
+                    return {
+                        'statusCode': 400,
+                        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                        'body': json.dumps({'error': filter_error}),
+                        'isBase64Encoded': False
+                    }
                 
-                orders = cur.fetchall()
+                where_sql = ' AND '.join(
+                    [f"o.company_id = {company_id}", f"o.status = {escape_sql_string(status_filter)}"] + filters
+                )
                 
-                result = [
-                    {
-                        'id': row[0],
-                        'name': row[1],
-                        'description': row[2],
-                        'amount': float(row[3]) if row[3] else 0,
-                        'order_status': row[4],
-                        'payment_status': row[5],
-                        'payment_type': row[6],
-                        'planned_date': row[7].isoformat() if row[7] else None,
-                        'project_id': row[8],
-                        'created_at': row[9].isoformat() if row[9] else None,
-                        'project_name': row[10],
-                        'client_name': row[11]
-                    }
-                    for row in orders
-                ]
+                if render_db:
+                    cur.execute(f"""
+                        SELECT json_build_object('orders', COALESCE(
+                            json_agg({json_object_sql(ORDER_LIST_JSON_FIELDS + payments_fields)} ORDER BY {build_order_sort(query_params)}), '[]'::json
+                        ))::text
+                        FROM orders o
+                        LEFT JOIN projects p ON o.project_id = p.id
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        {payments_join}
+                        WHERE {where_sql}
+                    """)
+                    body = cur.fetchone()[0]
+                else:
+                    cur.execute(f"""
+                        SELECT o.id, o.name, o.description, o.amount, o.order_status, o.payment_status, 
+                               o.payment_type, o.planned_date, o.project_id, o.created_at,
+                               p.name as project_name, c.name as client_name, o.version
+                        FROM orders o
+                        LEFT JOIN projects p ON o.project_id = p.id
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        WHERE {where_sql}
+                        ORDER BY {build_order_sort(query_params)}
+                    """)
+                    
+                    orders = cur.fetchall()
+                    
+                    result = [
+                        {
+                            'id': row[0],
+                            'name': row[1],
+                            'description': row[2],
+                            'amount': float(row[3]) if row[3] else 0,
+                            'order_status': row[4],
+                            'payment_status': row[5],
+                            'payment_type': row[6],
+                            'planned_date': row[7].isoformat() if row[7] else None,
+                            'project_id': row[8],
+                            'created_at': row[9].isoformat() if row[9] else None,
+                            'project_name': row[10],
+                            'client_name': row[11],
+                            'version': row[12]
+                        }
+                        for row in orders
+                    ]
+                    if with_payments:
+                        order_payments = load_order_payments(cur, company_id, [item['id'] for item in result])
+                        for item in result:
+                            item.update(payment_totals(item['amount'], order_payments[item['id']]))
+                    body = json.dumps({'orders': result})
                 
                 cur.close()
                 conn.close()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'orders': result}),
+                    'headers': etag_headers(etag),
+                    'body': body,
                     'isBase64Encoded': False
                 }
         
@@ -166,7 +670,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             body = json.loads(event.get('body', '{}'))
             name = body.get('name', '').strip()
             description = body.get('description', '').strip()
-            amount = body.get('amount', 0)
             order_status = body.get('order_status', 'new')
             payment_status = body.get('payment_status', 'not_paid')
             payment_type = body.get('payment_type', 'postpaid')
@@ -184,21 +687,63 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
+            amount, error = parse_amount(body.get('amount'))
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
             description_sql = escape_sql_string(description) if description else 'NULL'
             project_id_sql = str(int(project_id)) if project_id else 'NULL'
             planned_date_sql = escape_sql_string(planned_date) if planned_date else 'NULL'
             actual_date_sql = escape_sql_string(actual_date) if actual_date else 'NULL'
             
-            cur.execute(f"""
-                INSERT INTO orders (company_id, name, description, amount, order_status, payment_status, 
-                                   payment_type, planned_date, actual_date, project_id, status)
-                VALUES ({company_id}, {escape_sql_string(name)}, {description_sql}, {amount}, 
-                        {escape_sql_string(order_status)}, {escape_sql_string(payment_status)}, 
-                        {escape_sql_string(payment_type)}, {planned_date_sql}, {actual_date_sql}, {project_id_sql}, 'active')
-                RETURNING id
-            """)
+            extra_ctes = ''
+            idempotency_key, error = get_idempotency_key(headers)
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            if idempotency_key:
+                request_hash = request_fingerprint(body)
+                claimed, saved = claim_idempotency_key(cur, user_id, company_id, 'orders', idempotency_key, request_hash)
+                if not claimed:
+                    cur.close()
+                    conn.close()
+                    return idempotent_replay(saved, request_hash)
+                extra_ctes += idempotency_response_sql(
+                    company_id, 'orders', idempotency_key, "jsonb_build_object('success', true, 'order_id', created.id)"
+                )
             
-            order_id = cur.fetchone()[0]
+            order_id = owned_insert(
+                cur, 'orders', user_id, company_id,
+                """name, description, amount, order_status, payment_status,
+                   payment_type, planned_date, actual_date, project_id, status""",
+                f"""{escape_sql_string(name)}, {description_sql}, {amount},
+                    {escape_sql_string(order_status)}, {escape_sql_string(payment_status)},
+                    {escape_sql_string(payment_type)}, {planned_date_sql}, {actual_date_sql}, {project_id_sql}, 'active'""",
+                extra_ctes=extra_ctes
+            )
+            
+            if order_id is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
             
             conn.commit()
             cur.close()
@@ -216,7 +761,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             order_id = body.get('id')
             name = body.get('name', '').strip()
             description = body.get('description', '').strip()
-            amount = body.get('amount', 0)
             order_status = body.get('order_status', 'new')
             status = body.get('status', 'active')
             payment_status = body.get('payment_status', 'not_paid')
@@ -235,18 +779,14 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                SELECT id FROM orders 
-                WHERE id = {int(order_id)} AND company_id = {company_id}
-            """)
-            
-            if not cur.fetchone():
+            amount, error = parse_amount(body.get('amount'))
+            if error:
                 cur.close()
                 conn.close()
                 return {
-                    'statusCode': 404,
+                    'statusCode': 400,
                     'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'error': 'Заказ не найден'}),
+                    'body': json.dumps({'error': error}),
                     'isBase64Encoded': False
                 }
             
@@ -258,21 +798,59 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             if status not in ['active', 'archived', 'removed']:
                 status = 'active'
             
-            cur.execute(f"""
-                UPDATE orders 
-                SET name = {escape_sql_string(name)}, 
-                    description = {description_sql},
-                    amount = {amount},
-                    order_status = {escape_sql_string(order_status)},
-                    status = {escape_sql_string(status)},
-                    payment_status = {escape_sql_string(payment_status)},
-                    payment_type = {escape_sql_string(payment_type)},
-                    planned_date = {planned_date_sql},
-                    actual_date = {actual_date_sql},
-                    project_id = {project_id_sql},
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = {int(order_id)}
-            """)
+            expected_version, error = parse_version(body.get('version'))
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            allowed, current_status, current_version, new_version = owned_update(cur, 'orders', user_id, company_id, int(order_id), f"""
+                name = {escape_sql_string(name)},
+                description = {description_sql},
+                amount = {amount},
+                order_status = {escape_sql_string(order_status)},
+                status = {escape_sql_string(status)},
+                payment_status = {escape_sql_string(payment_status)},
+                payment_type = {escape_sql_string(payment_type)},
+                planned_date = {planned_date_sql},
+                actual_date = {actual_date_sql},
+                project_id = {project_id_sql}
+            """, expected_version=expected_version)
+            
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Заказ не найден'}),
+                    'isBase64Encoded': False
+                }
+            
+            if new_version is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
             
             conn.commit()
             cur.close()
@@ -281,7 +859,90 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
+                'body': json.dumps({'success': True, 'version': new_version}),
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'PATCH':
+            body = json.loads(event.get('body', '{}'))
+            order_id = body.get('id')
+            
+            if not order_id:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'ID заказа обязателен'}),
+                    'isBase64Encoded': False
+                }
+            
+            assignments, error = build_patch_assignments(body, ORDER_PATCH_FIELDS)
+            expected_version, version_error = parse_version(body.get('version'))
+            error = error or version_error
+            if not error and not assignments:
+                error = 'Нет полей для обновления'
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            set_sql, guard_sql = patch_sql(assignments)
+            if expected_version is not None:
+                # С версией правка пишется всегда: иначе «нечего менять» не отличить от конфликта
+                # с параллельной записью, которую этот снимок ещё не видит
+                guard_sql = 'TRUE'
+            allowed, current_status, current_version, new_version = owned_update(
+                cur, 'orders', user_id, company_id, int(order_id), set_sql, guard_sql, expected_version=expected_version
+            )
+            
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Заказ не найден'}),
+                    'isBase64Encoded': False
+                }
+            
+            if expected_version is not None and new_version is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
+            
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({
+                    'success': True,
+                    'updated': [column for column, _ in assignments] if new_version else [],
+                    'version': new_version or current_version
+                }),
                 'isBase64Encoded': False
             }
         
@@ -299,13 +960,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                SELECT id, status FROM orders 
-                WHERE id = {int(order_id)} AND company_id = {company_id}
-            """)
+            expected_version, error = parse_version(query_params.get('version'))
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            allowed, current_status, current_version, new_version = owned_update(
+                cur, 'orders', user_id, company_id, int(order_id), "status = 'removed'", "status <> 'removed'",
+                expected_version=expected_version
+            )
             
-            row = cur.fetchone()
-            if not row:
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
                 cur.close()
                 conn.close()
                 return {
@@ -315,7 +996,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            if row[1] == 'removed':
+            if new_version is None and expected_version is not None and current_status != 'removed':
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
+            
+            if new_version is None:
                 cur.close()
                 conn.close()
                 return {
@@ -325,12 +1016,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                UPDATE orders 
-                SET status = 'removed', updated_at = CURRENT_TIMESTAMP 
-                WHERE id = {int(order_id)}
-            """)
-            
             conn.commit()
             cur.close()
             conn.close()
@@ -338,7 +1023,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
+                'body': json.dumps({'success': True, 'version': new_version}),
                 'isBase64Encoded': False
             }
         
@@ -0,0 +1,148 @@
+import json
+import os
+import base64
+import psycopg2
+import boto3
+from datetime import datetime
+from typing import Dict, Any
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def escape_sql_string(s: str) -> str:
+    if s is None:
+        return 'NULL'
+    return "'" + s.replace("'", "''") + "'"
+
+def bump_employees_versions(cur, user_id: int):
+    """Аватар виден в списках сотрудников всех компаний пользователя"""
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        SELECT company_id, 'employees', 1 FROM company_users WHERE user_id = {user_id}
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Загрузка и удаление аватара - выделено из profile, чтобы boto3 не грузился на горячих запросах профиля
+    Args: event - HTTP запрос POST с action: upload_avatar/delete_avatar
+          context - контекст выполнения функции
+    Returns: JSON с результатом операции, как соответствующие действия profile
+    """
+    method = event.get('httpMethod', 'GET')
+    
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'POST, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+    
+    if method != 'POST':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+    
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        
+        if not user_id:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+        
+        user_id = int(user_id)
+        body = json.loads(event.get('body', '{}'))
+        action = body.get('action', 'upload_avatar')
+        
+        if action == 'upload_avatar':
+            image_base64 = body.get('image')
+            
+            if not image_base64:
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Изображение не передано'}),
+                    'isBase64Encoded': False
+                }
+            
+            image_data = base64.b64decode(image_base64)
+            
+            s3 = boto3.client('s3',
+                endpoint_url='https://bucket.poehali.dev',
+                aws_access_key_id=os.environ['AWS_ACCESS_KEY_ID'],
+                aws_secret_access_key=os.environ['AWS_SECRET_ACCESS_KEY']
+            )
+            
+            filename = f"avatars/user_{user_id}_{int(datetime.now().timestamp())}.jpg"
+            
+            s3.put_object(
+                Bucket='files',
+                Key=filename,
+                Body=image_data,
+                ContentType='image/jpeg'
+            )
+            
+            avatar_url = f"https://cdn.poehali.dev/projects/{os.environ['AWS_ACCESS_KEY_ID']}/bucket/{filename}"
+            avatar_sql = escape_sql_string(avatar_url)
+            message = 'Аватар загружен'
+        
+        elif action == 'delete_avatar':
+            avatar_url = None
+            avatar_sql = 'NULL'
+            message = 'Аватар удален'
+        
+        else:
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Неизвестное действие'}),
+                'isBase64Encoded': False
+            }
+        
+        conn = get_db_connection()
+        cur = conn.cursor()
+        
+        cur.execute(f"""
+            UPDATE users
+            SET avatar_url = {avatar_sql},
+                updated_at = NOW()
+            WHERE id = {user_id}
+        """)
+        
+        bump_employees_versions(cur, user_id)
+        conn.commit()
+        cur.close()
+        conn.close()
+        
+        result = {'message': message}
+        if avatar_url:
+            result['avatar_url'] = avatar_url
+        
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps(result),
+            'isBase64Encoded': False
+        }
+    
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': f'Ошибка загрузки: {str(e)}'}),
+            'isBase64Encoded': False
+        }
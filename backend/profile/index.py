@@ -1,15 +1,11 @@
+import asyncio
 import json
 import os
 import psycopg2
 import hashlib
 import secrets
-import base64
-import boto3
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from datetime import datetime, timedelta
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
@@ -26,6 +22,11 @@ def generate_verification_code() -> str:
     return ''.join([str(secrets.randbelow(10)) for _ in range(4)])
 
 def send_email(to_email: str, subject: str, body: str):
+    # smtplib и email.mime нужны только при отправке письма - не грузим их на каждом холодном старте
+    import smtplib
+    from email.mime.text import MIMEText
+    from email.mime.multipart import MIMEMultipart
+    
     smtp_host = os.environ.get('SMTP_HOST')
     smtp_port = int(os.environ.get('SMTP_PORT', 587))
     smtp_user = os.environ.get('SMTP_USER')
@@ -43,6 +44,53 @@ def send_email(to_email: str, subject: str, body: str):
         server.login(smtp_user, smtp_password)
         server.send_message(msg)
 
+def bump_employees_versions(cur, user_id: int):
+    """Данные пользователя видны в списках сотрудников всех его компаний"""
+    cur.execute(f"""
+        INSERT INTO entity_versions (company_id, entity, version)
+        SELECT company_id, 'employees', 1 FROM company_users WHERE user_id = {user_id}
+        ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+    """)
+
+def profile_sql(user_id: int) -> str:
+    return f"""
+        SELECT id, email, first_name, last_name, middle_name, phone, 
+               avatar_url, is_email_verified, created_at, current_company_id
+        FROM users
+        WHERE id = {user_id}
+    """
+
+def user_companies_sql(user_id: int) -> str:
+    return f"""
+        SELECT c.id, c.name, cu.role
+        FROM companies c
+        JOIN company_users cu ON c.id = cu.company_id
+        WHERE cu.user_id = {user_id}
+        ORDER BY c.name
+    """
+
+def profile_from_rows(user, companies) -> Dict[str, Any]:
+    return {
+        'id': user[0],
+        'email': user[1],
+        'first_name': user[2],
+        'last_name': user[3],
+        'middle_name': user[4],
+        'phone': user[5],
+        'avatar_url': user[6],
+        'is_email_verified': user[7],
+        'created_at': user[8].isoformat() if user[8] else None,
+        'current_company_id': user[9],
+        'companies': [{'id': c[0], 'name': c[1], 'role': c[2]} for c in companies]
+    }
+
+async def fetch_concurrently(pool, queries: List[str]) -> List[Any]:
+    """Независимые запросы одновременно, каждый на своём соединении пула asyncpg"""
+    async def fetch(sql: str):
+        async with pool.acquire() as conn:
+            return await conn.fetch(sql)
+    return await asyncio.gather(*(fetch(sql) for sql in queries))
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Управление профилем пользователя: получение данных, обновление, смена пароля, смена email
@@ -155,12 +203,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             else:
-                cur.execute(f"""
-                    SELECT id, email, first_name, last_name, middle_name, phone, 
-                           avatar_url, is_email_verified, created_at, current_company_id
-                    FROM users
-                    WHERE id = {user_id}
-                """)
+                cur.execute(profile_sql(user_id))
                 
                 user = cur.fetchone()
                 if not user:
@@ -173,28 +216,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                cur.execute(f"""
-                    SELECT c.id, c.name, cu.role
-                    FROM companies c
-                    JOIN company_users cu ON c.id = cu.company_id
-                    WHERE cu.user_id = {user_id}
-                    ORDER BY c.name
-                """)
-                companies = cur.fetchall()
-                
-                result = {
-                    'id': user[0],
-                    'email': user[1],
-                    'first_name': user[2],
-                    'last_name': user[3],
-                    'middle_name': user[4],
-                    'phone': user[5],
-                    'avatar_url': user[6],
-                    'is_email_verified': user[7],
-                    'created_at': user[8].isoformat() if user[8] else None,
-                    'current_company_id': user[9],
-                    'companies': [{'id': c[0], 'name': c[1], 'role': c[2]} for c in companies]
-                }
+                cur.execute(user_companies_sql(user_id))
+                result = profile_from_rows(user, cur.fetchall())
                 
                 cur.close()
                 conn.close()
@@ -236,6 +259,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     WHERE id = {user_id}
                 """)
                 
+                bump_employees_versions(cur, user_id)
                 conn.commit()
                 cur.close()
                 conn.close()
@@ -429,6 +453,10 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     }
                 
                 try:
+                    # boto3 импортируется только для загрузки аватара: это сотни миллисекунд холодного старта
+                    import base64
+                    import boto3
+                    
                     image_data = base64.b64decode(image_base64)
                     
                     s3 = boto3.client('s3',
@@ -455,6 +483,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         WHERE id = {user_id}
                     """)
                     
+                    bump_employees_versions(cur, user_id)
                     conn.commit()
                     cur.close()
                     conn.close()
@@ -487,6 +516,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     WHERE id = {user_id}
                 """)
                 
+                bump_employees_versions(cur, user_id)
                 conn.commit()
                 cur.close()
                 conn.close()
@@ -559,6 +589,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     WHERE id = {user_id}
                 """)
                 
+                bump_employees_versions(cur, user_id)
                 conn.commit()
                 cur.close()
                 conn.close()
@@ -642,4 +673,36 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
             'body': json.dumps({'error': f'Внутренняя ошибка: {str(e)}'}),
             'isBase64Encoded': False
-        }
\ No newline at end of file
+        }
+
+async def handler_async(event: Dict[str, Any], context: Any, pool) -> Optional[Dict[str, Any]]:
+    """
+    GET профиля для асинхронного режима сервера: пользователь и его компании читаются одновременно
+    Args: event - HTTP запрос GET без action
+          pool - пул соединений asyncpg
+    Returns: Ответ как у handler; None - запрос обслуживает синхронный handler
+    """
+    headers = event.get('headers', {})
+    user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+    query_params = event.get('queryStringParameters') or {}
+    
+    if event.get('httpMethod', 'GET') != 'GET' or query_params.get('action') or not user_id:
+        return None
+    
+    user_id = int(user_id)
+    user_rows, companies = await fetch_concurrently(pool, [profile_sql(user_id), user_companies_sql(user_id)])
+    
+    if not user_rows:
+        return {
+            'statusCode': 404,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Пользователь не найден'}),
+            'isBase64Encoded': False
+        }
+    
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(profile_from_rows(user_rows[0], companies)),
+        'isBase64Encoded': False
+    }
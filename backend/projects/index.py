@@ -1,8 +1,10 @@
+import hashlib
 import json
+import math
 import os
 import psycopg2
-from datetime import datetime
-from typing import Dict, Any, List
+from datetime import datetime, date
+from typing import Dict, Any, List, Optional, Tuple
 
 def get_db_connection():
     return psycopg2.connect(os.environ['DATABASE_URL'])
@@ -19,10 +21,319 @@ def get_user_company_id(user_id: int, company_id: int, cur) -> int:
         raise Exception('Доступ к компании запрещён')
     return result[0]
 
+PROJECTS_ETAG_ENTITIES = ['projects', 'clients']
+
+def get_entities_etag(cur, company_id: int, entities: List[str]) -> str:
+    """ETag списка/карточки из счётчиков версий сущностей, от которых зависит ответ"""
+    entities_sql = ', '.join(escape_sql_string(e) for e in entities)
+    cur.execute(f"""
+        SELECT entity, version FROM entity_versions
+        WHERE company_id = {company_id} AND entity IN ({entities_sql})
+    """)
+    versions = dict(cur.fetchall())
+    return 'W/"' + '-'.join([f"c{company_id}"] + [f"{e}{versions.get(e, 0)}" for e in entities]) + '"'
+
+def member_sql(user_id: int, company_id: int) -> str:
+    return f"EXISTS (SELECT 1 FROM company_users WHERE user_id = {user_id} AND company_id = {company_id})"
+
+def version_bump_sql(company_id: int, entity: str, source: str) -> str:
+    """CTE bump: увеличивает версию сущности, если source вернул строку"""
+    return f"""bump AS (
+            INSERT INTO entity_versions (company_id, entity, version)
+            SELECT {company_id}, {escape_sql_string(entity)}, 1 FROM {source}
+            ON CONFLICT (company_id, entity) DO UPDATE SET version = entity_versions.version + 1
+        )"""
+
+def owned_insert(cur, table: str, user_id: int, company_id: int, columns_sql: str, values_sql: str,
+                 extra_ctes: str = '') -> Optional[int]:
+    """
+    INSERT с проверкой членства в компании и увеличением версии - один запрос к БД.
+    extra_ctes дописываются в тот же WITH и могут ссылаться на created(id)
+    Returns: id новой строки или None, если пользователь не состоит в компании
+    """
+    cur.execute(f"""
+        WITH created AS (
+            INSERT INTO {table} (company_id, {columns_sql})
+            SELECT {company_id}, {values_sql}
+            WHERE {member_sql(user_id, company_id)}
+            RETURNING id
+        ),
+        {version_bump_sql(company_id, table, 'created')}{extra_ctes}
+        SELECT id FROM created
+    """)
+    row = cur.fetchone()
+    return row[0] if row else None
+
+def owned_update(cur, table: str, user_id: int, company_id: int, row_id: int, set_sql: str,
+                 guard_sql: str = 'TRUE', extra_ctes: str = '',
+                 expected_version: Optional[int] = None) -> Tuple[bool, Optional[str], Optional[int], Optional[int]]:
+    """
+    UPDATE строки компании одним запросом: членство и владение - в WHERE, версия сущности - в том же WITH.
+    Каждая запись увеличивает version строки; с expected_version UPDATE условный (WHERE version = n),
+    так что параллельные правки не затирают друг друга без блокировок.
+    Статус и version строки читаются из того же снимка, поэтому без отдельных SELECT различаются
+    «нет доступа», «не найдено», «конфликт версий» и «guard_sql не выполнен» (например, уже удалена).
+    extra_ctes могут ссылаться на changed(id)
+    Returns: (есть доступ, статус строки или None, version до записи, новая version или None без записи)
+    """
+    version_sql = f" AND version = {int(expected_version)}" if expected_version is not None else ''
+    cur.execute(f"""
+        WITH member AS (
+            SELECT {member_sql(user_id, company_id)} AS allowed
+        ),
+        target AS (
+            SELECT status, version FROM {table} WHERE id = {row_id} AND company_id = {company_id}
+        ),
+        changed AS (
+            UPDATE {table}
+            SET {set_sql}, updated_at = CURRENT_TIMESTAMP, version = version + 1
+            WHERE id = {row_id} AND company_id = {company_id}
+              AND (SELECT allowed FROM member) AND {guard_sql}{version_sql}
+            RETURNING id, version
+        ),
+        {version_bump_sql(company_id, table, 'changed')}{extra_ctes}
+        SELECT (SELECT allowed FROM member), (SELECT status FROM target), (SELECT version FROM target),
+               (SELECT version FROM changed)
+    """)
+    return cur.fetchone()
+
+CONFLICT_MESSAGE = 'Запись изменена другим пользователем, обновите данные'
+
+def parse_version(value) -> Tuple[Optional[int], Optional[str]]:
+    """version строки, которую видел клиент; None - запись без проверки версии. Возвращает (версия, ошибка)"""
+    if value is None or value == '':
+        return None, None
+    try:
+        return int(value), None
+    except (TypeError, ValueError):
+        return None, 'Некорректная версия записи'
+
+IDEMPOTENCY_TTL_HOURS = 24
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+def get_idempotency_key(headers: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    key = (headers.get('Idempotency-Key') or headers.get('idempotency-key') or '').strip()
+    if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+        return None, f'Idempotency-Key длиннее {IDEMPOTENCY_KEY_MAX_LENGTH} символов'
+    return key or None, None
+
+def request_fingerprint(body: Dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(body, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def claim_idempotency_key(cur, user_id: int, company_id: int, entity: str, key: str,
+                          request_hash: str) -> Tuple[bool, Optional[Tuple[str, Any]]]:
+    """
+    Занимает ключ идемпотентности через INSERT ... ON CONFLICT: новый или просроченный ключ
+    достаётся этому запросу. Конкурентный дубль ждёт на ON CONFLICT коммита первого запроса
+    и затем читает сохранённый им ответ. Попутно удаляются просроченные ключи компании.
+    Returns: (True, None) - ключ занят этим запросом; иначе (False, (request_hash, response))
+             или (False, None), если пользователь не состоит в компании
+    """
+    key_where_sql = f"company_id = {company_id} AND entity = '{entity}' AND idempotency_key = {escape_sql_string(key)}"
+    cur.execute(f"""
+        WITH expired AS (
+            DELETE FROM idempotency_keys
+            WHERE company_id = {company_id} AND expires_at < CURRENT_TIMESTAMP AND NOT ({key_where_sql})
+        ),
+        claim AS (
+            INSERT INTO idempotency_keys (company_id, entity, idempotency_key, request_hash, expires_at)
+            VALUES ({company_id}, '{entity}', {escape_sql_string(key)}, decode('{request_hash}', 'hex'),
+                    CURRENT_TIMESTAMP + INTERVAL '{IDEMPOTENCY_TTL_HOURS} hours')
+            ON CONFLICT (company_id, entity, idempotency_key) DO UPDATE
+            SET request_hash = EXCLUDED.request_hash, response = NULL, expires_at = EXCLUDED.expires_at
+            WHERE idempotency_keys.expires_at < CURRENT_TIMESTAMP
+            RETURNING 1
+        )
+        SELECT EXISTS (SELECT 1 FROM claim)
+    """)
+    if cur.fetchone()[0]:
+        return True, None
+    # Новый снимок: ответ конкурентного запроса, дождавшегося коммита, уже виден
+    cur.execute(f"""
+        SELECT encode(request_hash, 'hex'), response FROM idempotency_keys
+        WHERE {key_where_sql} AND {member_sql(user_id, company_id)}
+    """)
+    return False, cur.fetchone()
+
+def idempotency_response_sql(company_id: int, entity: str, key: str, response_sql: str) -> str:
+    """CTE для owned_insert: ответ сохраняется под ключом тем же запросом, что и вставка"""
+    return f""",
+        idempotency AS (
+            UPDATE idempotency_keys SET response = {response_sql}
+            FROM created
+            WHERE idempotency_keys.company_id = {company_id} AND idempotency_keys.entity = '{entity}'
+              AND idempotency_keys.idempotency_key = {escape_sql_string(key)}
+        )"""
+
+def idempotent_replay(saved: Optional[Tuple[str, Any]], request_hash: str) -> Dict[str, Any]:
+    """Ответ на повтор запроса с уже использованным Idempotency-Key"""
+    if saved is None:
+        status_code, body = 403, {'error': 'Доступ к компании запрещён'}
+    elif saved[0] != request_hash:
+        status_code, body = 422, {'error': 'Idempotency-Key уже использован с другим телом запроса'}
+    elif saved[1] is None:
+        status_code, body = 409, {'error': 'Запрос с этим Idempotency-Key ещё выполняется'}
+    else:
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Content-Type': 'application/json',
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Expose-Headers': 'Idempotent-Replayed',
+                'Idempotent-Replayed': 'true'
+            },
+            'body': json.dumps(saved[1]),
+            'isBase64Encoded': False
+        }
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(body),
+        'isBase64Encoded': False
+    }
+
+def etag_matches(headers: Dict[str, Any], etag: str) -> bool:
+    if_none_match = headers.get('If-None-Match') or headers.get('if-none-match')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in [t.strip() for t in if_none_match.split(',')]
+
+def etag_headers(etag: str) -> Dict[str, str]:
+    return {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'ETag': etag,
+        'Vary': 'X-User-Id, X-Company-Id'
+    }
+
+def project_finance_sql(company_id: int, project_id: Optional[int] = None) -> str:
+    """
+    Подзапрос с финансами по проектам: одна группировка заказов с предагрегированными платежами.
+    План платежа - COALESCE(planned_amount, сумма заказа * planned_amount_percent / 100), как в clients:
+    процент суммируется только по платежам без абсолютной суммы, иначе платёж с обоими полями считался бы дважды.
+    """
+    project_sql = f"AND o.project_id = {project_id}" if project_id else ''
+    return f"""
+        SELECT o.project_id,
+               COUNT(*) as orders_count,
+               COALESCE(SUM(o.amount), 0) as contracted_amount,
+               COALESCE(SUM(COALESCE(pm.planned_abs, 0) + COALESCE(pm.planned_pct, 0) * COALESCE(o.amount, 0) / 100), 0) as planned_payments,
+               COALESCE(SUM(pm.actual), 0) as actual_payments
+        FROM orders o
+        LEFT JOIN (
+            SELECT order_id,
+                   SUM(planned_amount) as planned_abs,
+                   SUM(planned_amount_percent) FILTER (WHERE planned_amount IS NULL) as planned_pct,
+                   SUM(actual_amount) as actual
+            FROM payments
+            WHERE company_id = {company_id} AND status <> 'removed'
+            GROUP BY order_id
+        ) pm ON pm.order_id = o.id
+        WHERE o.company_id = {company_id} AND o.status <> 'removed' {project_sql}
+        GROUP BY o.project_id
+    """
+
+def finance_fields(row) -> Dict[str, Any]:
+    contracted = float(row[1]) if row[1] else 0
+    actual = float(row[3]) if row[3] else 0
+    return {
+        'orders_count': row[0] or 0,
+        'contracted_amount': contracted,
+        'planned_payments': float(row[2]) if row[2] else 0,
+        'actual_payments': actual,
+        'outstanding_balance': contracted - actual
+    }
+
+# Поля ответа для render=db: (ключ, SQL-выражение) - те же ключи, что собирает Python-ветка
+PROJECT_LIST_JSON_FIELDS = [
+    ('id', 'p.id'),
+    ('name', 'p.name'),
+    ('description', 'p.description'),
+    ('status', 'p.status'),
+    ('client_id', 'p.client_id'),
+    ('created_at', 'p.created_at'),
+    ('client_name', 'c.name'),
+    ('version', 'p.version')
+]
+
+PROJECT_DETAIL_JSON_FIELDS = PROJECT_LIST_JSON_FIELDS[:6] + [
+    ('updated_at', 'p.updated_at'), ('client_name', 'c.name'), ('version', 'p.version')
+]
+
+PROJECT_FINANCE_JSON_FIELDS = [
+    ('orders_count', 'COALESCE(f.orders_count, 0)'),
+    ('contracted_amount', 'COALESCE(f.contracted_amount, 0)'),
+    ('planned_payments', 'COALESCE(f.planned_payments, 0)'),
+    ('actual_payments', 'COALESCE(f.actual_payments, 0)'),
+    ('outstanding_balance', 'COALESCE(f.contracted_amount, 0) - COALESCE(f.actual_payments, 0)')
+]
+
+def json_object_sql(fields: List[Tuple[str, str]]) -> str:
+    """json_build_object из пар (ключ, выражение); ::text у результата - чтобы psycopg2 не разбирал JSON обратно в dict"""
+    return 'json_build_object(' + ', '.join(f"'{key}', {expr}" for key, expr in fields) + ')'
+
+ENTITY_STATUSES = ['active', 'archived', 'removed']
+
+def patch_value_sql(kind, value) -> str:
+    """SQL-значение поля PATCH по его виду; ValueError при некорректном значении"""
+    if isinstance(kind, list):
+        if value not in kind:
+            raise ValueError(value)
+        return escape_sql_string(value)
+    if kind == 'name':
+        value = (value or '').strip()
+        if not value:
+            raise ValueError(value)
+        return escape_sql_string(value)
+    if kind == 'text':
+        value = (value or '').strip()
+        return escape_sql_string(value) if value else 'NULL'
+    if value is None or value == '':
+        return '0' if kind == 'amount' else 'NULL'
+    if kind in ('number', 'amount'):
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(value)
+        return str(number)
+    if kind == 'date':
+        return f"'{date.fromisoformat(value).isoformat()}'"
+    return str(int(value))
+
+def build_patch_assignments(body: Dict[str, Any], fields: Dict[str, Any]) -> Tuple[List[Tuple[str, str]], Optional[str]]:
+    """Пары (колонка, SQL-значение) только для переданных в теле полей. Возвращает (пары, ошибка)"""
+    assignments = []
+    for column, kind in fields.items():
+        if column not in body:
+            continue
+        try:
+            assignments.append((column, patch_value_sql(kind, body[column])))
+        except (TypeError, ValueError):
+            return [], f'Некорректное значение поля {column}'
+    return assignments, None
+
+def patch_sql(assignments: List[Tuple[str, str]]) -> Tuple[str, str]:
+    """
+    SET только переданных колонок и условие, что хотя бы одно значение меняется:
+    строка, где всё уже совпадает, не переписывается (нет новой версии строки и WAL)
+    """
+    set_sql = ', '.join(f"{column} = {value}" for column, value in assignments)
+    columns_sql = ', '.join(column for column, _ in assignments)
+    values_sql = ', '.join(value for _, value in assignments)
+    return set_sql, f"ROW({columns_sql}) IS DISTINCT FROM ROW({values_sql})"
+
+# Поля PATCH -> вид значения (см. patch_value_sql); список - допустимые значения
+PROJECT_PATCH_FIELDS = {
+    'name': 'name',
+    'description': 'text',
+    'client_id': 'id',
+    'status': ENTITY_STATUSES
+}
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     """
     Управление проектами: создание, чтение, обновление, удаление
-    Args: event - HTTP запрос с методами GET/POST/PUT/DELETE
+    Args: event - HTTP запрос с методами GET/POST/PUT/PATCH/DELETE
           context - контекст выполнения функции
     Returns: JSON с результатом операции
     """
@@ -33,8 +344,8 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'statusCode': 200,
             'headers': {
                 'Access-Control-Allow-Origin': '*',
-                'Access-Control-Allow-Methods': 'GET, POST, PUT, DELETE, OPTIONS',
-                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Allow-Methods': 'GET, POST, PUT, PATCH, DELETE, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id, If-None-Match, Idempotency-Key',
                 'Access-Control-Max-Age': '86400'
             },
             'body': '',
@@ -60,21 +371,54 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
         conn = get_db_connection()
         cur = conn.cursor()
         
-        get_user_company_id(user_id, company_id, cur)
-        
         if method == 'GET':
+            get_user_company_id(user_id, company_id, cur)
+            
             query_params = event.get('queryStringParameters') or {}
+            with_finance = 'finance' in (query_params.get('include') or '').split(',')
+            
+            etag_entities = PROJECTS_ETAG_ENTITIES + (['orders', 'payments'] if with_finance else [])
+            etag = get_entities_etag(cur, company_id, etag_entities)
+            if etag_matches(headers, etag):
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 304,
+                    'headers': etag_headers(etag),
+                    'body': '',
+                    'isBase64Encoded': False
+                }
+            
             project_id = query_params.get('id')
             status_filter = query_params.get('status', 'active')
             
+            render_db = query_params.get('render') == 'db'
+            
+            finance_select = ''
+            finance_join = ''
+            if with_finance:
+                finance_select = ', f.orders_count, f.contracted_amount, f.planned_payments, f.actual_payments'
+                finance_join = f"LEFT JOIN ({project_finance_sql(company_id, int(project_id) if project_id else None)}) f ON f.project_id = p.id"
+            
             if project_id:
-                cur.execute(f"""
-                    SELECT p.id, p.name, p.description, p.status, p.client_id, p.created_at, p.updated_at,
-                           c.name as client_name
-                    FROM projects p
-                    LEFT JOIN clients c ON p.client_id = c.id
-                    WHERE p.id = {int(project_id)} AND p.company_id = {company_id}
-                """)
+                if render_db:
+                    fields = PROJECT_DETAIL_JSON_FIELDS + (PROJECT_FINANCE_JSON_FIELDS if with_finance else [])
+                    cur.execute(f"""
+                        SELECT {json_object_sql(fields)}::text
+                        FROM projects p
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        {finance_join}
+                        WHERE p.id = {int(project_id)} AND p.company_id = {company_id}
+                    """)
+                else:
+                    cur.execute(f"""
+                        SELECT p.id, p.name, p.description, p.status, p.client_id, p.created_at, p.updated_at,
+                               c.name as client_name, p.version{finance_select}
+                        FROM projects p
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        {finance_join}
+                        WHERE p.id = {int(project_id)} AND p.company_id = {company_id}
+                    """)
                 
                 project = cur.fetchone()
                 if not project:
@@ -87,61 +431,87 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                         'isBase64Encoded': False
                     }
                 
-                result = {
-                    'id': project[0],
-                    'name': project[1],
-                    'description': project[2],
-                    'status': project[3],
-                    'client_id': project[4],
-                    'created_at': project[5].isoformat() if project[5] else None,
-                    'updated_at': project[6].isoformat() if project[6] else None,
-                    'client_name': project[7]
-                }
+                if render_db:
+                    body = project[0]
+                else:
+                    result = {
+                        'id': project[0],
+                        'name': project[1],
+                        'description': project[2],
+                        'status': project[3],
+                        'client_id': project[4],
+                        'created_at': project[5].isoformat() if project[5] else None,
+                        'updated_at': project[6].isoformat() if project[6] else None,
+                        'client_name': project[7],
+                        'version': project[8]
+                    }
+                    if with_finance:
+                        result.update(finance_fields(project[9:]))
+                    body = json.dumps(result)
                 
                 cur.close()
                 conn.close()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps(result),
+                    'headers': etag_headers(etag),
+                    'body': body,
                     'isBase64Encoded': False
                 }
             else:
                 if status_filter not in ['active', 'archived']:
                     status_filter = 'active'
                 
-                cur.execute(f"""
-                    SELECT p.id, p.name, p.description, p.status, p.client_id, p.created_at,
-                           c.name as client_name
-                    FROM projects p
-                    LEFT JOIN clients c ON p.client_id = c.id
-                    WHERE p.company_id = {company_id} AND p.status = {escape_sql_string(status_filter)}
-                    ORDER BY p.created_at DESC
-                """)
-                
-                projects = cur.fetchall()
-                
-                result = [
-                    {
-                        'id': row[0],
-                        'name': row[1],
-                        'description': row[2],
-                        'status': row[3],
-                        'client_id': row[4],
-                        'created_at': row[5].isoformat() if row[5] else None,
-                        'client_name': row[6]
-                    }
-                    for row in projects
-                ]
+                if render_db:
+                    fields = PROJECT_LIST_JSON_FIELDS + (PROJECT_FINANCE_JSON_FIELDS if with_finance else [])
+                    cur.execute(f"""
+                        SELECT json_build_object('projects', COALESCE(
+                            json_agg({json_object_sql(fields)} ORDER BY p.created_at DESC), '[]'::json
+                        ))::text
+                        FROM projects p
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        {finance_join}
+                        WHERE p.company_id = {company_id} AND p.status = {escape_sql_string(status_filter)}
+                    """)
+                    body = cur.fetchone()[0]
+                else:
+                    cur.execute(f"""
+                        SELECT p.id, p.name, p.description, p.status, p.client_id, p.created_at,
+                               c.name as client_name, p.version{finance_select}
+                        FROM projects p
+                        LEFT JOIN clients c ON p.client_id = c.id
+                        {finance_join}
+                        WHERE p.company_id = {company_id} AND p.status = {escape_sql_string(status_filter)}
+                        ORDER BY p.created_at DESC
+                    """)
+                    
+                    projects = cur.fetchall()
+                    
+                    result = [
+                        {
+                            'id': row[0],
+                            'name': row[1],
+                            'description': row[2],
+                            'status': row[3],
+                            'client_id': row[4],
+                            'created_at': row[5].isoformat() if row[5] else None,
+                            'client_name': row[6],
+                            'version': row[7]
+                        }
+                        for row in projects
+                    ]
+                    if with_finance:
+                        for item, row in zip(result, projects):
+                            item.update(finance_fields(row[8:]))
+                    body = json.dumps({'projects': result})
                 
                 cur.close()
                 conn.close()
                 
                 return {
                     'statusCode': 200,
-                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                    'body': json.dumps({'projects': result}),
+                    'headers': etag_headers(etag),
+                    'body': body,
                     'isBase64Encoded': False
                 }
         
@@ -164,13 +534,44 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             description_sql = escape_sql_string(description) if description else 'NULL'
             client_id_sql = str(int(client_id)) if client_id else 'NULL'
             
-            cur.execute(f"""
-                INSERT INTO projects (company_id, name, description, client_id, status)
-                VALUES ({company_id}, {escape_sql_string(name)}, {description_sql}, {client_id_sql}, 'active')
-                RETURNING id
-            """)
+            extra_ctes = ''
+            idempotency_key, error = get_idempotency_key(headers)
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            if idempotency_key:
+                request_hash = request_fingerprint(body)
+                claimed, saved = claim_idempotency_key(cur, user_id, company_id, 'projects', idempotency_key, request_hash)
+                if not claimed:
+                    cur.close()
+                    conn.close()
+                    return idempotent_replay(saved, request_hash)
+                extra_ctes += idempotency_response_sql(
+                    company_id, 'projects', idempotency_key, "jsonb_build_object('success', true, 'project_id', created.id)"
+                )
+            
+            project_id = owned_insert(
+                cur, 'projects', user_id, company_id,
+                'name, description, client_id, status',
+                f"{escape_sql_string(name)}, {description_sql}, {client_id_sql}, 'active'",
+                extra_ctes=extra_ctes
+            )
             
-            project_id = cur.fetchone()[0]
+            if project_id is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
             
             conn.commit()
             cur.close()
@@ -201,12 +602,41 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                SELECT id FROM projects 
-                WHERE id = {int(project_id)} AND company_id = {company_id}
-            """)
+            description_sql = escape_sql_string(description) if description else 'NULL'
+            client_id_sql = str(int(client_id)) if client_id else 'NULL'
+            
+            if status not in ['active', 'archived', 'removed']:
+                status = 'active'
+            
+            expected_version, error = parse_version(body.get('version'))
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            allowed, current_status, current_version, new_version = owned_update(cur, 'projects', user_id, company_id, int(project_id), f"""
+                name = {escape_sql_string(name)},
+                description = {description_sql},
+                client_id = {client_id_sql},
+                status = {escape_sql_string(status)}
+            """, expected_version=expected_version)
             
-            if not cur.fetchone():
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
                 cur.close()
                 conn.close()
                 return {
@@ -216,21 +646,94 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            description_sql = escape_sql_string(description) if description else 'NULL'
-            client_id_sql = str(int(client_id)) if client_id else 'NULL'
+            if new_version is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
             
-            if status not in ['active', 'archived', 'removed']:
-                status = 'active'
+            conn.commit()
+            cur.close()
+            conn.close()
+            
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'success': True, 'version': new_version}),
+                'isBase64Encoded': False
+            }
+        
+        elif method == 'PATCH':
+            body = json.loads(event.get('body', '{}'))
+            project_id = body.get('id')
+            
+            if not project_id:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'ID проекта обязателен'}),
+                    'isBase64Encoded': False
+                }
+            
+            assignments, error = build_patch_assignments(body, PROJECT_PATCH_FIELDS)
+            expected_version, version_error = parse_version(body.get('version'))
+            error = error or version_error
+            if not error and not assignments:
+                error = 'Нет полей для обновления'
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
             
-            cur.execute(f"""
-                UPDATE projects 
-                SET name = {escape_sql_string(name)}, 
-                    description = {description_sql},
-                    client_id = {client_id_sql},
-                    status = {escape_sql_string(status)},
-                    updated_at = CURRENT_TIMESTAMP
-                WHERE id = {int(project_id)}
-            """)
+            set_sql, guard_sql = patch_sql(assignments)
+            if expected_version is not None:
+                # С версией правка пишется всегда: иначе «нечего менять» не отличить от конфликта
+                # с параллельной записью, которую этот снимок ещё не видит
+                guard_sql = 'TRUE'
+            allowed, current_status, current_version, new_version = owned_update(
+                cur, 'projects', user_id, company_id, int(project_id), set_sql, guard_sql, expected_version=expected_version
+            )
+            
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 404,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Проект не найден'}),
+                    'isBase64Encoded': False
+                }
+            
+            if expected_version is not None and new_version is None:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
             
             conn.commit()
             cur.close()
@@ -239,7 +742,11 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
+                'body': json.dumps({
+                    'success': True,
+                    'updated': [column for column, _ in assignments] if new_version else [],
+                    'version': new_version or current_version
+                }),
                 'isBase64Encoded': False
             }
         
@@ -257,13 +764,33 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                SELECT id, status FROM projects 
-                WHERE id = {int(project_id)} AND company_id = {company_id}
-            """)
+            expected_version, error = parse_version(query_params.get('version'))
+            if error:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 400,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': error}),
+                    'isBase64Encoded': False
+                }
+            
+            allowed, current_status, current_version, new_version = owned_update(
+                cur, 'projects', user_id, company_id, int(project_id), "status = 'removed'", "status <> 'removed'",
+                expected_version=expected_version
+            )
             
-            row = cur.fetchone()
-            if not row:
+            if not allowed:
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 403,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': 'Доступ к компании запрещён'}),
+                    'isBase64Encoded': False
+                }
+            
+            if current_status is None:
                 cur.close()
                 conn.close()
                 return {
@@ -273,7 +800,17 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            if row[1] == 'removed':
+            if new_version is None and expected_version is not None and current_status != 'removed':
+                cur.close()
+                conn.close()
+                return {
+                    'statusCode': 409,
+                    'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                    'body': json.dumps({'error': CONFLICT_MESSAGE, 'version': current_version}),
+                    'isBase64Encoded': False
+                }
+            
+            if new_version is None:
                 cur.close()
                 conn.close()
                 return {
@@ -283,12 +820,6 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
                     'isBase64Encoded': False
                 }
             
-            cur.execute(f"""
-                UPDATE projects 
-                SET status = 'removed', updated_at = CURRENT_TIMESTAMP 
-                WHERE id = {int(project_id)}
-            """)
-            
             conn.commit()
             cur.close()
             conn.close()
@@ -296,7 +827,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             return {
                 'statusCode': 200,
                 'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
-                'body': json.dumps({'success': True}),
+                'body': json.dumps({'success': True, 'version': new_version}),
                 'isBase64Encoded': False
             }
         
@@ -1,9 +1,52 @@
 import json
 import os
 import psycopg2
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timedelta
 
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+# (ключ, таблица, агрегат, колонка даты для прироста за месяц)
+STATS_AGGREGATES = [
+    ('clients', 'clients', 'COUNT(*)', 'created_at'),
+    ('projects', 'projects', 'COUNT(*)', 'created_at'),
+    ('revenue', 'payments', 'SUM(actual_amount)', 'actual_date'),
+    ('orders', 'orders', 'COUNT(*)', 'created_at')
+]
+
+def stats_query(company_id: int, since: str) -> Tuple[List[str], str]:
+    """
+    Все агрегаты дашборда одним запросом: по каждой таблице один проход, итог и прирост за месяц
+    через FILTER. Один запрос - одно соединение и один round trip и в handler, и в handler_async.
+    Returns: (ключи колонок по порядку, SQL)
+    """
+    keys, columns, sources = [], [], []
+    for key, table, aggregate, date_column in STATS_AGGREGATES:
+        keys += [f"{key}_total", f"{key}_new"]
+        columns += [f"{key}.{key}_total", f"{key}.{key}_new"]
+        sources.append(f"""(
+            SELECT COALESCE({aggregate}, 0) AS {key}_total,
+                   COALESCE({aggregate} FILTER (WHERE {date_column} >= '{since}'), 0) AS {key}_new
+            FROM t_p27692930_revenue_tracking_ser.{table}
+            WHERE company_id = {int(company_id)}
+        ) {key}""")
+    return keys, f"SELECT {', '.join(columns)} FROM {', '.join(sources)}"
+
+def build_stats(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Итоги и процент роста за месяц из результатов stats_query"""
+    stats = {}
+    for key, _, _, _ in STATS_AGGREGATES:
+        total = values[f"{key}_total"]
+        new = values[f"{key}_new"]
+        if key == 'revenue':
+            total, new = float(total), float(new)
+        stats[key] = {
+            'total': total,
+            'growth': round((new / total * 100) if total > 0 else 0)
+        }
+    return stats
+
 def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     '''
     Получение статистики по клиентам, проектам, выручке и заказам
@@ -44,7 +87,7 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
             'isBase64Encoded': False
         }
     
-    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn = get_db_connection()
     cur = conn.cursor()
     
     # Получаем company_id пользователя
@@ -70,97 +113,58 @@ def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
     # Дата месяц назад для расчета роста
     one_month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
     
-    # Количество клиентов
-    cur.execute("""
-        SELECT COUNT(*) 
-        FROM t_p27692930_revenue_tracking_ser.clients 
-        WHERE company_id = %s
-    """, (company_id,))
-    clients_total = cur.fetchone()[0]
+    keys, sql = stats_query(company_id, one_month_ago)
+    cur.execute(sql)
+    values = dict(zip(keys, cur.fetchone()))
     
-    cur.execute("""
-        SELECT COUNT(*) 
-        FROM t_p27692930_revenue_tracking_ser.clients 
-        WHERE company_id = %s AND created_at >= %s
-    """, (company_id, one_month_ago))
-    clients_new = cur.fetchone()[0]
-    
-    # Количество проектов
-    cur.execute("""
-        SELECT COUNT(*) 
-        FROM t_p27692930_revenue_tracking_ser.projects 
-        WHERE company_id = %s
-    """, (company_id,))
-    projects_total = cur.fetchone()[0]
-    
-    cur.execute("""
-        SELECT COUNT(*) 
-        FROM t_p27692930_revenue_tracking_ser.projects 
-        WHERE company_id = %s AND created_at >= %s
-    """, (company_id, one_month_ago))
-    projects_new = cur.fetchone()[0]
-    
-    # Общая выручка
-    cur.execute("""
-        SELECT COALESCE(SUM(actual_amount), 0) 
-        FROM t_p27692930_revenue_tracking_ser.payments 
-        WHERE company_id = %s
-    """, (company_id,))
-    revenue_total = float(cur.fetchone()[0])
+    cur.close()
+    conn.close()
     
-    cur.execute("""
-        SELECT COALESCE(SUM(actual_amount), 0) 
-        FROM t_p27692930_revenue_tracking_ser.payments 
-        WHERE company_id = %s AND actual_date >= %s
-    """, (company_id, one_month_ago))
-    revenue_month = float(cur.fetchone()[0])
+    stats = build_stats(values)
     
-    # Количество заказов
-    cur.execute("""
-        SELECT COUNT(*) 
-        FROM t_p27692930_revenue_tracking_ser.orders 
-        WHERE company_id = %s
-    """, (company_id,))
-    orders_total = cur.fetchone()[0]
+    return {
+        'statusCode': 200,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': json.dumps(stats),
+        'isBase64Encoded': False
+    }
+
+async def handler_async(event: Dict[str, Any], context: Any, pool) -> Optional[Dict[str, Any]]:
+    """
+    Та же статистика для асинхронного режима сервера: все агрегаты одним запросом на одном соединении
+    пула, поэтому запрос дашборда не занимает несколько соединений общего пула
+    Args: event - dict с httpMethod и X-User-Id в headers
+          pool - пул соединений asyncpg
+    Returns: Ответ как у handler; None - запрос обслуживает синхронный handler
+    """
+    headers = event.get('headers', {})
+    user_id = headers.get('X-User-Id') or headers.get('x-user-id')
     
-    cur.execute("""
-        SELECT COUNT(*) 
-        FROM t_p27692930_revenue_tracking_ser.orders 
-        WHERE company_id = %s AND created_at >= %s
-    """, (company_id, one_month_ago))
-    orders_new = cur.fetchone()[0]
+    if event.get('httpMethod', 'GET') != 'GET' or not user_id:
+        return None
     
-    cur.close()
-    conn.close()
+    company_id = await pool.fetchval("""
+        SELECT current_company_id 
+        FROM t_p27692930_revenue_tracking_ser.users 
+        WHERE id = $1
+    """, int(user_id))
     
-    # Расчет процентов роста
-    clients_growth = round((clients_new / clients_total * 100) if clients_total > 0 else 0)
-    projects_growth = round((projects_new / projects_total * 100) if projects_total > 0 else 0)
-    revenue_growth = round((revenue_month / revenue_total * 100) if revenue_total > 0 else 0)
-    orders_growth = round((orders_new / orders_total * 100) if orders_total > 0 else 0)
-    
-    stats = {
-        'clients': {
-            'total': clients_total,
-            'growth': clients_growth
-        },
-        'projects': {
-            'total': projects_total,
-            'growth': projects_growth
-        },
-        'revenue': {
-            'total': revenue_total,
-            'growth': revenue_growth
-        },
-        'orders': {
-            'total': orders_total,
-            'growth': orders_growth
+    if not company_id:
+        return {
+            'statusCode': 403,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'No company selected'}),
+            'isBase64Encoded': False
         }
-    }
+    
+    one_month_ago = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+    keys, sql = stats_query(company_id, one_month_ago)
+    row = await pool.fetchrow(sql)
+    stats = build_stats(dict(zip(keys, row)))
     
     return {
         'statusCode': 200,
         'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
         'body': json.dumps(stats),
         'isBase64Encoded': False
-    }
\ No newline at end of file
+    }
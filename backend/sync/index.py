@@ -0,0 +1,195 @@
+import json
+import os
+import base64
+import psycopg2
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 2000
+
+# Сущность -> выражения колонок; порядок совпадает с порядком полей в ответе
+SYNC_ENTITIES = {
+    'clients': ['id', 'name', 'notes', 'status', 'created_at', 'updated_at', 'version'],
+    'projects': ['id', 'client_id', 'name', 'description', 'status', 'created_at', 'updated_at', 'version'],
+    'orders': ['id', 'project_id', 'name', 'description', 'amount', 'order_status', 'payment_status',
+               'payment_type', 'planned_date', 'actual_date', 'status', 'created_at', 'updated_at', 'version'],
+    'payments': ['id', 'order_id', 'planned_amount', 'planned_amount_percent', 'actual_amount',
+                 'planned_date', 'actual_date', 'status', 'created_at', 'updated_at', 'version']
+}
+
+DECIMAL_FIELDS = {'amount', 'planned_amount', 'planned_amount_percent', 'actual_amount'}
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def get_user_company_id(user_id: int, company_id: int, cur) -> int:
+    cur.execute(f"SELECT company_id FROM company_users WHERE user_id = {user_id} AND company_id = {company_id}")
+    result = cur.fetchone()
+    if not result:
+        raise Exception('Доступ к компании запрещён')
+    return result[0]
+
+def encode_cursor(position: Optional[Tuple[int, int]]) -> str:
+    data = {'xid': str(position[0]), 'seq': position[1]} if position else {}
+    return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+def decode_cursor(cursor: str) -> Optional[Tuple[int, int]]:
+    """
+    Курсор - позиция (xid, seq) последней выданной записи журнала sync_changes.
+    Курсор прежнего формата (позиции updated_at по сущностям) начинает синхронизацию заново.
+    """
+    data = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    if not data:
+        return None
+    if 'xid' in data:
+        return int(data['xid']), int(data['seq'])
+    for entity in data:
+        if entity not in SYNC_ENTITIES:
+            raise ValueError(entity)
+    return None
+
+def serialize_value(field: str, value):
+    if value is None:
+        return None
+    if field in DECIMAL_FIELDS:
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+def fetch_log(cur, company_id: int, position: Optional[Tuple[int, int]], limit: int) -> Tuple[List[Tuple[str, int, int, int, bool]], bool]:
+    """
+    Записи журнала после курсора в порядке (xid, seq). Выдаются только записи транзакций с xid
+    меньше xmin снимка запроса: они завершены, а всё, что закоммитится позже, получит xid не меньше
+    xmin и придёт после курсора. Долгая транзакция задерживает выдачу, но не теряет строки.
+    deleted - строка удалена из горячей таблицы (перенесена в архив или удалена).
+    """
+    position_sql = ''
+    if position:
+        position_sql = f"AND (xid, seq) > ('{position[0]}'::xid8, {position[1]})"
+
+    cur.execute(f"""
+        SELECT entity, row_id, xid::text, seq, deleted
+        FROM sync_changes
+        WHERE company_id = {company_id}
+          {position_sql}
+          AND xid < pg_snapshot_xmin(pg_current_snapshot())
+        ORDER BY xid, seq
+        LIMIT {limit + 1}
+    """)
+    entries = [(row[0], row[1], int(row[2]), row[3], row[4]) for row in cur.fetchall()]
+    return entries[:limit], len(entries) > limit
+
+def fetch_rows(cur, entity: str, company_id: int, ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    """Текущие версии строк по id из журнала"""
+    fields = SYNC_ENTITIES[entity]
+    cur.execute(f"""
+        SELECT {', '.join(fields)}
+        FROM {entity}
+        WHERE company_id = {company_id} AND id IN ({', '.join(str(int(i)) for i in ids)})
+    """)
+    return {
+        row[0]: {field: serialize_value(field, row[i]) for i, field in enumerate(fields)}
+        for row in cur.fetchall()
+    }
+
+def handler(event: Dict[str, Any], context: Any) -> Dict[str, Any]:
+    """
+    Дельта-синхронизация: строки клиентов, проектов, заказов и платежей, изменённые после курсора
+    Args: event - HTTP запрос GET с необязательными cursor и limit
+          context - контекст выполнения функции
+    Returns: JSON с изменениями и id удалённых строк по сущностям, новым курсором и признаком has_more
+    """
+    method = event.get('httpMethod', 'GET')
+
+    if method == 'OPTIONS':
+        return {
+            'statusCode': 200,
+            'headers': {
+                'Access-Control-Allow-Origin': '*',
+                'Access-Control-Allow-Methods': 'GET, OPTIONS',
+                'Access-Control-Allow-Headers': 'Content-Type, X-User-Id, X-Company-Id',
+                'Access-Control-Max-Age': '86400'
+            },
+            'body': '',
+            'isBase64Encoded': False
+        }
+
+    if method != 'GET':
+        return {
+            'statusCode': 405,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': 'Метод не поддерживается'}),
+            'isBase64Encoded': False
+        }
+
+    try:
+        headers = event.get('headers', {})
+        user_id = headers.get('X-User-Id') or headers.get('x-user-id')
+        company_id_header = headers.get('X-Company-Id') or headers.get('x-company-id')
+
+        if not user_id or not company_id_header:
+            return {
+                'statusCode': 401,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Требуется авторизация'}),
+                'isBase64Encoded': False
+            }
+
+        user_id = int(user_id)
+        company_id = int(company_id_header)
+
+        query_params = event.get('queryStringParameters') or {}
+        try:
+            position = decode_cursor(query_params['cursor']) if query_params.get('cursor') else None
+            limit = max(1, min(int(query_params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT))
+        except (ValueError, TypeError, IndexError, KeyError, AttributeError):
+            return {
+                'statusCode': 400,
+                'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+                'body': json.dumps({'error': 'Некорректный курсор'}),
+                'isBase64Encoded': False
+            }
+
+        conn = get_db_connection()
+        cur = conn.cursor()
+
+        get_user_company_id(user_id, company_id, cur)
+
+        entries, has_more = fetch_log(cur, company_id, position, limit)
+
+        ids = {entity: [] for entity in SYNC_ENTITIES}
+        deleted = {entity: [] for entity in SYNC_ENTITIES}
+        for entity, row_id, _, _, is_deleted in entries:
+            (deleted if is_deleted else ids)[entity].append(row_id)
+
+        # Строки в порядке журнала; строки, удалённой после записи в журнал, уже нет
+        changes = {}
+        for entity, entity_ids in ids.items():
+            rows = fetch_rows(cur, entity, company_id, entity_ids) if entity_ids else {}
+            changes[entity] = [rows[i] for i in entity_ids if i in rows]
+        if entries:
+            position = (entries[-1][2], entries[-1][3])
+
+        cur.close()
+        conn.close()
+
+        return {
+            'statusCode': 200,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({
+                'changes': changes,
+                'deleted': deleted,
+                'cursor': encode_cursor(position),
+                'has_more': has_more
+            }),
+            'isBase64Encoded': False
+        }
+
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+            'body': json.dumps({'error': str(e)}),
+            'isBase64Encoded': False
+        }
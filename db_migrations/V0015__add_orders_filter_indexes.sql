@@ -0,0 +1,22 @@
+-- Составные индексы для фильтрации и сортировки списка заказов.
+-- Все запросы списка начинаются с company_id и status, поэтому они идут первыми.
+CREATE INDEX IF NOT EXISTS idx_orders_company_status_created
+    ON orders(company_id, status, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orders_company_status_planned_date
+    ON orders(company_id, status, planned_date, id);
+
+CREATE INDEX IF NOT EXISTS idx_orders_company_status_amount
+    ON orders(company_id, status, amount, id);
+
+CREATE INDEX IF NOT EXISTS idx_orders_company_order_status
+    ON orders(company_id, status, order_status, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orders_company_payment_status
+    ON orders(company_id, status, payment_status, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orders_company_payment_type
+    ON orders(company_id, status, payment_type, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orders_company_project
+    ON orders(company_id, project_id, status);
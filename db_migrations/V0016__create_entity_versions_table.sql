@@ -0,0 +1,8 @@
+-- Счётчики версий сущностей компании для ETag/If-None-Match.
+-- Увеличиваются при каждой записи в clients, projects, orders, payments и employees.
+CREATE TABLE IF NOT EXISTS entity_versions (
+    company_id INTEGER NOT NULL REFERENCES companies(id),
+    entity VARCHAR(50) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, entity)
+);
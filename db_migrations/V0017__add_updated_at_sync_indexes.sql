@@ -0,0 +1,5 @@
+-- Индексы для дельта-синхронизации: выборка изменений компании после позиции (updated_at, id)
+CREATE INDEX IF NOT EXISTS idx_clients_company_updated_at ON clients(company_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_projects_company_updated_at ON projects(company_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_orders_company_updated_at ON orders(company_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_payments_company_updated_at ON payments(company_id, updated_at, id);
@@ -0,0 +1,75 @@
+-- Секционирование orders и payments по company_id (HASH, 16 секций).
+-- Запросы обработчиков всегда содержат company_id = X, поэтому читают одну секцию.
+-- Если заранее запускался scripts/partition_move.py, таблицы orders_p/payments_p уже
+-- заполнены и синхронизируются триггерами - здесь остаётся догнать хвост и переключиться.
+
+CREATE TABLE IF NOT EXISTS orders_p (LIKE orders INCLUDING DEFAULTS) PARTITION BY HASH (company_id);
+CREATE TABLE IF NOT EXISTS payments_p (LIKE payments INCLUDING DEFAULTS) PARTITION BY HASH (company_id);
+
+DO $$
+BEGIN
+    FOR i IN 0..15 LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS orders_p%s PARTITION OF orders_p FOR VALUES WITH (MODULUS 16, REMAINDER %s)', i, i);
+        EXECUTE format('CREATE TABLE IF NOT EXISTS payments_p%s PARTITION OF payments_p FOR VALUES WITH (MODULUS 16, REMAINDER %s)', i, i);
+    END LOOP;
+
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'orders_p_pkey') THEN
+        ALTER TABLE orders_p ADD CONSTRAINT orders_p_pkey PRIMARY KEY (company_id, id);
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conname = 'payments_p_pkey') THEN
+        ALTER TABLE payments_p ADD CONSTRAINT payments_p_pkey PRIMARY KEY (company_id, id);
+    END IF;
+END $$;
+
+-- Запись блокируется только на время догоняющего копирования, чтение продолжает работать
+LOCK TABLE orders, payments IN EXCLUSIVE MODE;
+
+INSERT INTO orders_p SELECT * FROM orders ON CONFLICT (company_id, id) DO NOTHING;
+INSERT INTO payments_p SELECT * FROM payments ON CONFLICT (company_id, id) DO NOTHING;
+
+DO $$
+BEGIN
+    IF (SELECT COUNT(*) FROM orders) <> (SELECT COUNT(*) FROM orders_p) THEN
+        RAISE EXCEPTION 'orders_p не совпадает с orders';
+    END IF;
+    IF (SELECT COUNT(*) FROM payments) <> (SELECT COUNT(*) FROM payments_p) THEN
+        RAISE EXCEPTION 'payments_p не совпадает с payments';
+    END IF;
+END $$;
+
+-- Последовательности переживают удаление старых таблиц
+ALTER SEQUENCE orders_id_seq OWNED BY NONE;
+ALTER SEQUENCE payments_id_seq OWNED BY NONE;
+
+DROP TABLE payments;
+DROP TABLE orders;
+DROP FUNCTION IF EXISTS orders_mirror_partitioned();
+DROP FUNCTION IF EXISTS payments_mirror_partitioned();
+
+ALTER TABLE orders_p RENAME TO orders;
+ALTER TABLE payments_p RENAME TO payments;
+ALTER TABLE orders RENAME CONSTRAINT orders_p_pkey TO orders_pkey;
+ALTER TABLE payments RENAME CONSTRAINT payments_p_pkey TO payments_pkey;
+
+ALTER SEQUENCE orders_id_seq OWNED BY orders.id;
+ALTER SEQUENCE payments_id_seq OWNED BY payments.id;
+
+-- payments.order_id больше не ссылается на orders: уникален только ключ (company_id, id)
+ALTER TABLE orders ADD CONSTRAINT orders_company_id_fkey FOREIGN KEY (company_id) REFERENCES companies(id);
+ALTER TABLE orders ADD CONSTRAINT orders_project_id_fkey FOREIGN KEY (project_id) REFERENCES projects(id);
+ALTER TABLE payments ADD CONSTRAINT payments_company_id_fkey FOREIGN KEY (company_id) REFERENCES companies(id);
+
+-- Индексы создаются на родительской таблице и наследуются секциями
+CREATE INDEX idx_orders_project_id ON orders(project_id);
+CREATE INDEX idx_orders_company_status_created ON orders(company_id, status, created_at DESC, id DESC);
+CREATE INDEX idx_orders_company_status_planned_date ON orders(company_id, status, planned_date, id);
+CREATE INDEX idx_orders_company_status_amount ON orders(company_id, status, amount, id);
+CREATE INDEX idx_orders_company_order_status ON orders(company_id, status, order_status, created_at DESC);
+CREATE INDEX idx_orders_company_payment_status ON orders(company_id, status, payment_status, created_at DESC);
+CREATE INDEX idx_orders_company_payment_type ON orders(company_id, status, payment_type, created_at DESC);
+CREATE INDEX idx_orders_company_project ON orders(company_id, project_id, status);
+CREATE INDEX idx_orders_company_updated_at ON orders(company_id, updated_at, id);
+
+CREATE INDEX idx_payments_order_id ON payments(order_id);
+CREATE INDEX idx_payments_company_status_planned_date ON payments(company_id, status, planned_date DESC, created_at DESC);
+CREATE INDEX idx_payments_company_updated_at ON payments(company_id, updated_at, id);
@@ -0,0 +1,26 @@
+-- Холодные таблицы для удалённых (и давно архивных) строк.
+-- Повторяют структуру рабочих таблиц и хранят момент переноса в archived_at.
+CREATE TABLE IF NOT EXISTS clients_archive (LIKE clients INCLUDING DEFAULTS);
+ALTER TABLE clients_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE clients_archive ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_clients_archive_company ON clients_archive(company_id, id);
+
+CREATE TABLE IF NOT EXISTS client_contacts_archive (LIKE client_contacts INCLUDING DEFAULTS);
+ALTER TABLE client_contacts_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE client_contacts_archive ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_client_contacts_archive_client ON client_contacts_archive(client_id);
+
+CREATE TABLE IF NOT EXISTS projects_archive (LIKE projects INCLUDING DEFAULTS);
+ALTER TABLE projects_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE projects_archive ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_projects_archive_company ON projects_archive(company_id, id);
+
+CREATE TABLE IF NOT EXISTS orders_archive (LIKE orders INCLUDING DEFAULTS);
+ALTER TABLE orders_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE orders_archive ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_orders_archive_company ON orders_archive(company_id, id);
+
+CREATE TABLE IF NOT EXISTS payments_archive (LIKE payments INCLUDING DEFAULTS);
+ALTER TABLE payments_archive ADD COLUMN IF NOT EXISTS archived_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP;
+ALTER TABLE payments_archive ADD PRIMARY KEY (id);
+CREATE INDEX IF NOT EXISTS idx_payments_archive_company ON payments_archive(company_id, id);
@@ -0,0 +1,89 @@
+-- Предрасчитанная выручка по клиентам для отчёта client-revenue.
+-- Триггеры помечают клиента "грязным" при любой записи в его проекты, заказы или платежи;
+-- отчёт пересчитывает только помеченных клиентов.
+CREATE TABLE IF NOT EXISTS client_revenue (
+    company_id INTEGER NOT NULL,
+    client_id INTEGER NOT NULL,
+    orders_count INTEGER NOT NULL DEFAULT 0,
+    contracted_amount DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    actual_revenue DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    receivables DECIMAL(15, 2) NOT NULL DEFAULT 0,
+    last_payment_date DATE,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (company_id, client_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_client_revenue_actual ON client_revenue(company_id, actual_revenue DESC);
+CREATE INDEX IF NOT EXISTS idx_client_revenue_receivables ON client_revenue(company_id, receivables DESC);
+CREATE INDEX IF NOT EXISTS idx_client_revenue_last_payment ON client_revenue(company_id, last_payment_date DESC NULLS LAST);
+
+CREATE TABLE IF NOT EXISTS client_revenue_dirty (
+    company_id INTEGER NOT NULL,
+    client_id INTEGER NOT NULL,
+    PRIMARY KEY (company_id, client_id)
+);
+
+CREATE OR REPLACE FUNCTION mark_client_revenue_dirty_from_payment() RETURNS trigger AS $$
+DECLARE
+    r RECORD;
+BEGIN
+    FOR r IN SELECT * FROM (SELECT NEW.company_id AS company_id, NEW.order_id AS order_id WHERE TG_OP <> 'DELETE'
+                            UNION SELECT OLD.company_id, OLD.order_id WHERE TG_OP <> 'INSERT') s
+             WHERE s.order_id IS NOT NULL LOOP
+        INSERT INTO client_revenue_dirty (company_id, client_id)
+        SELECT o.company_id, p.client_id
+        FROM orders o JOIN projects p ON p.id = o.project_id
+        WHERE o.company_id = r.company_id AND o.id = r.order_id AND p.client_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END LOOP;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_client_revenue_dirty_from_order() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'DELETE' AND NEW.project_id IS NOT NULL THEN
+        INSERT INTO client_revenue_dirty (company_id, client_id)
+        SELECT NEW.company_id, p.client_id FROM projects p
+        WHERE p.id = NEW.project_id AND p.client_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP <> 'INSERT' AND OLD.project_id IS NOT NULL THEN
+        INSERT INTO client_revenue_dirty (company_id, client_id)
+        SELECT OLD.company_id, p.client_id FROM projects p
+        WHERE p.id = OLD.project_id AND p.client_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_client_revenue_dirty_from_project() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'DELETE' AND NEW.client_id IS NOT NULL THEN
+        INSERT INTO client_revenue_dirty (company_id, client_id)
+        VALUES (NEW.company_id, NEW.client_id)
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP <> 'INSERT' AND OLD.client_id IS NOT NULL THEN
+        INSERT INTO client_revenue_dirty (company_id, client_id)
+        VALUES (OLD.company_id, OLD.client_id)
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER payments_client_revenue_dirty
+AFTER INSERT OR UPDATE OR DELETE ON payments
+FOR EACH ROW EXECUTE FUNCTION mark_client_revenue_dirty_from_payment();
+
+CREATE TRIGGER orders_client_revenue_dirty
+AFTER INSERT OR UPDATE OR DELETE ON orders
+FOR EACH ROW EXECUTE FUNCTION mark_client_revenue_dirty_from_order();
+
+CREATE TRIGGER projects_client_revenue_dirty
+AFTER INSERT OR UPDATE OR DELETE ON projects
+FOR EACH ROW EXECUTE FUNCTION mark_client_revenue_dirty_from_project();
+
+-- Первичное наполнение: все клиенты считаются при первом обращении к отчёту компании
+INSERT INTO client_revenue_dirty (company_id, client_id)
+SELECT company_id, id FROM clients
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,14 @@
+-- Кэш прогноза поступлений. cache_key собирается из версий payments/orders/projects
+-- и даты прогноза, поэтому любая запись в платежи или смена дня делают кэш неактуальным.
+CREATE TABLE IF NOT EXISTS forecast_cache (
+    company_id INTEGER NOT NULL REFERENCES companies(id),
+    months INTEGER NOT NULL,
+    cache_key VARCHAR(255) NOT NULL,
+    result JSONB NOT NULL,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (company_id, months)
+);
+
+-- История оплат для распределения опозданий: только платежи с обеими датами
+CREATE INDEX IF NOT EXISTS idx_payments_lateness ON payments(company_id, order_id)
+    WHERE planned_date IS NOT NULL AND actual_date IS NOT NULL AND status <> 'removed';
@@ -0,0 +1,4 @@
+-- Покрывающие индексы для функции lookups: список id, name активных строк компании
+-- читается index-only scan сразу в порядке name, без обращения к таблице и без сортировки.
+CREATE INDEX IF NOT EXISTS idx_clients_lookup ON clients(company_id, status, name) INCLUDE (id);
+CREATE INDEX IF NOT EXISTS idx_projects_lookup ON projects(company_id, status, name) INCLUDE (id);
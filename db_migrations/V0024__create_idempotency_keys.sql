@@ -0,0 +1,16 @@
+-- Ключи идемпотентности POST-запросов создания. Первый запрос занимает ключ через
+-- INSERT ... ON CONFLICT и в той же транзакции сохраняет ответ; повтор с тем же ключом
+-- получает сохранённый ответ без новой вставки. request_hash - sha256 тела запроса,
+-- чтобы тот же ключ с другим телом отклонялся. Просроченные ключи удаляются при следующих
+-- запросах компании или занимаются заново.
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    company_id INTEGER NOT NULL REFERENCES companies(id),
+    entity VARCHAR(20) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    request_hash BYTEA NOT NULL,
+    response JSONB,
+    expires_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (company_id, entity, idempotency_key)
+);
+
+CREATE INDEX IF NOT EXISTS idx_idempotency_keys_expires ON idempotency_keys(company_id, expires_at);
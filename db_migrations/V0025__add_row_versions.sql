@@ -0,0 +1,14 @@
+-- Версия строки для оптимистичной блокировки. Каждая запись увеличивает version на 1;
+-- PUT/PATCH/DELETE с version из прочитанной строки выполняют условный UPDATE ... WHERE version = n
+-- и получают 409, если строку успели изменить. ADD COLUMN с константным DEFAULT не переписывает
+-- таблицу, секции orders и payments получают колонку от родителя.
+ALTER TABLE clients ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+-- Архив хранит версию, чтобы восстановленная строка продолжила счёт
+ALTER TABLE clients_archive ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE projects_archive ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE orders_archive ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+ALTER TABLE payments_archive ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
@@ -0,0 +1,26 @@
+-- Индексы под все сортировки списка заказов. Обратный проход по индексу planned_date ASC
+-- даёт NULLS FIRST, а список сортирует planned_date DESC NULLS LAST - нужен отдельный индекс.
+-- Сортировка по name индекса не имела. Индексы фильтров получают id DESC последней колонкой,
+-- чтобы порядок created_at DESC, id DESC читался из индекса без досортировки.
+-- Проверка планов: scripts/explain_orders_list.py
+CREATE INDEX IF NOT EXISTS idx_orders_company_status_planned_date_desc
+    ON orders(company_id, status, planned_date DESC NULLS LAST, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_orders_company_status_name
+    ON orders(company_id, status, name, id);
+
+DROP INDEX IF EXISTS idx_orders_company_order_status;
+CREATE INDEX IF NOT EXISTS idx_orders_company_order_status
+    ON orders(company_id, status, order_status, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_orders_company_payment_status;
+CREATE INDEX IF NOT EXISTS idx_orders_company_payment_status
+    ON orders(company_id, status, payment_status, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_orders_company_payment_type;
+CREATE INDEX IF NOT EXISTS idx_orders_company_payment_type
+    ON orders(company_id, status, payment_type, created_at DESC, id DESC);
+
+DROP INDEX IF EXISTS idx_orders_company_project;
+CREATE INDEX IF NOT EXISTS idx_orders_company_project
+    ON orders(company_id, project_id, status, created_at DESC, id DESC);
@@ -0,0 +1,20 @@
+-- Возвращает ссылочную целостность payments -> orders, снятую при секционировании (V0018).
+-- Секционированная таблица может быть целью внешнего ключа по ключу, включающему ключ
+-- секционирования, поэтому ссылка идёт по (company_id, order_id) на первичный ключ orders.
+-- Заодно платёж не может сослаться на заказ другой компании.
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM payments p
+        WHERE p.order_id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM orders o WHERE o.company_id = p.company_id AND o.id = p.order_id)
+    ) THEN
+        RAISE EXCEPTION 'есть платежи без заказа в своей компании: найти через payments LEFT JOIN orders по (company_id, order_id)';
+    END IF;
+END $$;
+
+ALTER TABLE payments ADD CONSTRAINT payments_order_fkey
+    FOREIGN KEY (company_id, order_id) REFERENCES orders(company_id, id);
+
+-- Индекс для проверки ключа при удалении заказа и для выборки платежей заказа
+CREATE INDEX IF NOT EXISTS idx_payments_company_order ON payments(company_id, order_id);
@@ -0,0 +1,37 @@
+-- Метка каскадной архивации: каскад 'client:12' или 'project:5' записывает её в строки поддерева,
+-- которые он сам перевёл из active в archived. Восстановление каскадом возвращает только строки
+-- со своей меткой, поэтому проекты, заказы и платежи, заархивированные пользователем вручную
+-- до каскада, остаются в архиве.
+-- Строки, заархивированные каскадом до этой миграции, метки не имеют и восстанавливаются вручную.
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS archived_by_cascade VARCHAR(40);
+ALTER TABLE orders ADD COLUMN IF NOT EXISTS archived_by_cascade VARCHAR(40);
+ALTER TABLE payments ADD COLUMN IF NOT EXISTS archived_by_cascade VARCHAR(40);
+
+-- Архив хранит метку, чтобы строка, перенесённая туда и возвращённая обратно, восстанавливалась каскадом
+ALTER TABLE projects_archive ADD COLUMN IF NOT EXISTS archived_by_cascade VARCHAR(40);
+ALTER TABLE orders_archive ADD COLUMN IF NOT EXISTS archived_by_cascade VARCHAR(40);
+ALTER TABLE payments_archive ADD COLUMN IF NOT EXISTS archived_by_cascade VARCHAR(40);
+
+-- Любая смена статуса, которая не задаёт метку явно (PUT, PATCH, DELETE, batch, корень каскада),
+-- снимает её: строку, которую после каскада вернули и снова заархивировали вручную,
+-- восстановление каскадом уже не тронет
+CREATE OR REPLACE FUNCTION clear_cascade_marker() RETURNS trigger AS $$
+BEGIN
+    IF NEW.status IS DISTINCT FROM OLD.status
+       AND NEW.archived_by_cascade IS NOT DISTINCT FROM OLD.archived_by_cascade THEN
+        NEW.archived_by_cascade := NULL;
+    END IF;
+    RETURN NEW;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER projects_clear_cascade_marker
+BEFORE UPDATE OF status ON projects
+FOR EACH ROW EXECUTE FUNCTION clear_cascade_marker();
+
+CREATE TRIGGER orders_clear_cascade_marker
+BEFORE UPDATE OF status ON orders
+FOR EACH ROW EXECUTE FUNCTION clear_cascade_marker();
+
+CREATE TRIGGER payments_clear_cascade_marker
+BEFORE UPDATE OF status ON payments
+FOR EACH ROW EXECUTE FUNCTION clear_cascade_marker();
@@ -0,0 +1,20 @@
+-- client_revenue следит и за самими клиентами: новый или восстановленный из архива клиент
+-- помечается и попадает в отчёт с нулями, не дожидаясь первого заказа; смена статуса тоже
+-- помечает клиента. Удалённая строка клиента (перенос в clients_archive) забирает свою строку
+-- агрегата и метку - пересчёт по метке создал бы для неё строку с нулями.
+CREATE OR REPLACE FUNCTION mark_client_revenue_dirty_from_client() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        DELETE FROM client_revenue WHERE company_id = OLD.company_id AND client_id = OLD.id;
+        DELETE FROM client_revenue_dirty WHERE company_id = OLD.company_id AND client_id = OLD.id;
+    ELSE
+        INSERT INTO client_revenue_dirty (company_id, client_id)
+        VALUES (NEW.company_id, NEW.id)
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER clients_client_revenue_dirty
+AFTER INSERT OR UPDATE OF status OR DELETE ON clients
+FOR EACH ROW EXECUTE FUNCTION mark_client_revenue_dirty_from_client();
@@ -0,0 +1,7 @@
+-- Последние заказы проекта для карточки клиента (include=orders): условие status <> 'removed'
+-- не ложится на idx_orders_company_project (status стоит перед created_at), поэтому нужен частичный
+-- индекс, из которого LATERAL по проекту читает первые N строк уже в порядке created_at DESC, id DESC.
+-- Проверка плана и времени: scripts/explain_client_recent_orders.py
+CREATE INDEX IF NOT EXISTS idx_orders_company_project_recent
+    ON orders(company_id, project_id, created_at DESC, id DESC)
+    WHERE status <> 'removed';
@@ -0,0 +1,52 @@
+-- Журнал изменений для дельта-синхронизации вместо курсора по updated_at.
+-- updated_at равен началу пишущей транзакции: транзакция, закоммиченная позже окна ожидания
+-- (каскад, batch, задачи jobs, архивация), получала updated_at ниже уже выданного курсора,
+-- и её строки не доставлялись никогда.
+-- Триггер записывает в журнал строку на каждую изменённую запись с xid пишущей транзакции.
+-- sync читает журнал в порядке (xid, seq) и только записи с xid меньше xmin текущего снимка:
+-- все такие транзакции уже завершены, а любая ещё не завершённая или будущая транзакция
+-- получит xid не меньше этого xmin, то есть окажется после выданного курсора.
+-- На одну запись сущности в журнале одна строка (последнее изменение), журнал не растёт с числом правок.
+CREATE SEQUENCE IF NOT EXISTS sync_changes_seq;
+
+CREATE TABLE IF NOT EXISTS sync_changes (
+    company_id INTEGER NOT NULL,
+    entity VARCHAR(20) NOT NULL,
+    row_id INTEGER NOT NULL,
+    xid xid8 NOT NULL DEFAULT pg_current_xact_id(),
+    seq BIGINT NOT NULL DEFAULT nextval('sync_changes_seq'),
+    PRIMARY KEY (company_id, entity, row_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sync_changes_position ON sync_changes(company_id, xid, seq);
+
+-- TG_ARGV[0] - имя сущности: у секций orders и payments TG_TABLE_NAME - имя секции
+CREATE OR REPLACE FUNCTION log_sync_change() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO sync_changes (company_id, entity, row_id)
+    VALUES (NEW.company_id, TG_ARGV[0], NEW.id)
+    ON CONFLICT (company_id, entity, row_id) DO UPDATE SET xid = EXCLUDED.xid, seq = EXCLUDED.seq;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+CREATE TRIGGER clients_sync_change
+AFTER INSERT OR UPDATE ON clients
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('clients');
+
+CREATE TRIGGER projects_sync_change
+AFTER INSERT OR UPDATE ON projects
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('projects');
+
+CREATE TRIGGER orders_sync_change
+AFTER INSERT OR UPDATE ON orders
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('orders');
+
+CREATE TRIGGER payments_sync_change
+AFTER INSERT OR UPDATE ON payments
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('payments');
+
+-- Существующие строки попадают в журнал одной транзакцией миграции
+INSERT INTO sync_changes (company_id, entity, row_id) SELECT company_id, 'clients', id FROM clients ON CONFLICT DO NOTHING;
+INSERT INTO sync_changes (company_id, entity, row_id) SELECT company_id, 'projects', id FROM projects ON CONFLICT DO NOTHING;
+INSERT INTO sync_changes (company_id, entity, row_id) SELECT company_id, 'orders', id FROM orders ON CONFLICT DO NOTHING;
+INSERT INTO sync_changes (company_id, entity, row_id) SELECT company_id, 'payments', id FROM payments ON CONFLICT DO NOTHING;
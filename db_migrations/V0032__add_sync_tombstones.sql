@@ -0,0 +1,48 @@
+-- Удаления в журнале синхронизации. Архивация переносит строки removed и давно archived
+-- в *_archive через DELETE из горячей таблицы; sync архив не читает, и клиент, синхронизированный
+-- после переноса, держал бы такие строки в локальном кэше всегда. Теперь DELETE оставляет
+-- в sync_changes запись с deleted = true (tombstone), и sync отдаёт её в списке удалённых id.
+-- Возврат строки из архива - снова INSERT, запись журнала становится обычным изменением.
+ALTER TABLE sync_changes ADD COLUMN IF NOT EXISTS deleted BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE OR REPLACE FUNCTION log_sync_change() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        INSERT INTO sync_changes (company_id, entity, row_id, deleted)
+        VALUES (OLD.company_id, TG_ARGV[0], OLD.id, TRUE)
+        ON CONFLICT (company_id, entity, row_id) DO UPDATE
+        SET xid = EXCLUDED.xid, seq = EXCLUDED.seq, deleted = TRUE;
+    ELSE
+        INSERT INTO sync_changes (company_id, entity, row_id)
+        VALUES (NEW.company_id, TG_ARGV[0], NEW.id)
+        ON CONFLICT (company_id, entity, row_id) DO UPDATE
+        SET xid = EXCLUDED.xid, seq = EXCLUDED.seq, deleted = FALSE;
+    END IF;
+    RETURN NULL;
+END $$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS clients_sync_change ON clients;
+CREATE TRIGGER clients_sync_change
+AFTER INSERT OR UPDATE OR DELETE ON clients
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('clients');
+
+DROP TRIGGER IF EXISTS projects_sync_change ON projects;
+CREATE TRIGGER projects_sync_change
+AFTER INSERT OR UPDATE OR DELETE ON projects
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('projects');
+
+DROP TRIGGER IF EXISTS orders_sync_change ON orders;
+CREATE TRIGGER orders_sync_change
+AFTER INSERT OR UPDATE OR DELETE ON orders
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('orders');
+
+DROP TRIGGER IF EXISTS payments_sync_change ON payments;
+CREATE TRIGGER payments_sync_change
+AFTER INSERT OR UPDATE OR DELETE ON payments
+FOR EACH ROW EXECUTE FUNCTION log_sync_change('payments');
+
+-- Строки, перенесённые в архив до этой миграции: клиенты получат их удаление при следующей синхронизации
+INSERT INTO sync_changes (company_id, entity, row_id, deleted) SELECT company_id, 'clients', id, TRUE FROM clients_archive ON CONFLICT DO NOTHING;
+INSERT INTO sync_changes (company_id, entity, row_id, deleted) SELECT company_id, 'projects', id, TRUE FROM projects_archive ON CONFLICT DO NOTHING;
+INSERT INTO sync_changes (company_id, entity, row_id, deleted) SELECT company_id, 'orders', id, TRUE FROM orders_archive ON CONFLICT DO NOTHING;
+INSERT INTO sync_changes (company_id, entity, row_id, deleted) SELECT company_id, 'payments', id, TRUE FROM payments_archive ON CONFLICT DO NOTHING;
@@ -0,0 +1,83 @@
+"""
+Задержка отдельных действий: монолитные auth/profile против выделенных функций.
+
+Каждый случай запускается в свежем интерпретаторе: замеряются импорт, первый (холодный)
+вызов и медиана тёплых вызовов. Нужна реальная БД и тестовый пользователь.
+
+Запуск:
+    DATABASE_URL=... JWT_SECRET=... BENCH_EMAIL=... BENCH_PASSWORD=... BENCH_USER_ID=... \
+        python scripts/bench_actions.py --warm 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+PROBE = r'''
+import json, statistics, sys, time
+event = json.loads(sys.argv[1])
+warm = int(sys.argv[2])
+started = time.perf_counter()
+import index
+imported = time.perf_counter()
+response = index.handler(event, None)
+first_call = time.perf_counter()
+samples = []
+for _ in range(warm):
+    t = time.perf_counter()
+    index.handler(event, None)
+    samples.append((time.perf_counter() - t) * 1000)
+print(json.dumps({
+    'status': response['statusCode'],
+    'import_ms': (imported - started) * 1000,
+    'first_call_ms': (first_call - imported) * 1000,
+    'warm_ms': statistics.median(samples) if samples else 0
+}))
+'''
+
+def build_cases():
+    email = os.environ.get('BENCH_EMAIL', '')
+    password = os.environ.get('BENCH_PASSWORD', '')
+    user_headers = {'X-User-Id': os.environ.get('BENCH_USER_ID', '1')}
+    login_body = json.dumps({'action': 'login', 'email': email, 'password': password})
+    return [
+        ('auth', 'login', {'httpMethod': 'POST', 'headers': {}, 'body': login_body}),
+        ('auth-login', 'login', {'httpMethod': 'POST', 'headers': {}, 'body': login_body}),
+        ('profile', 'get', {'httpMethod': 'GET', 'headers': user_headers}),
+        ('bootstrap', 'get', {'httpMethod': 'GET', 'headers': user_headers}),
+        ('profile', 'options', {'httpMethod': 'OPTIONS', 'headers': {}}),
+        ('profile-avatar', 'options', {'httpMethod': 'OPTIONS', 'headers': {}}),
+    ]
+
+def measure(function: str, event: dict, warm: int) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(event), str(warm)],
+        cwd=os.path.join(BACKEND_DIR, function),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Задержка действий по функциям')
+    parser.add_argument('--warm', type=int, default=10, help='число тёплых вызовов')
+    args = parser.parse_args()
+
+    print(f"{'function':<16} {'action':<10} {'status':>6} {'import ms':>10} {'cold call ms':>13} {'warm ms':>8}")
+    for function, action, event in build_cases():
+        m = measure(function, event, args.warm)
+        if 'error' in m:
+            print(f"{function:<16} {action:<10} {m['error']}")
+            continue
+        print(
+            f"{function:<16} {action:<10} {m['status']:>6} {m['import_ms']:>10.1f} "
+            f"{m['first_call_ms']:>13.1f} {m['warm_ms']:>8.2f}"
+        )
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Задержка эндпоинтов с несколькими запросами: синхронный handler (psycopg2, запросы по очереди)
+против handler_async (asyncpg, независимые запросы одновременно).
+
+Оба режима вызываются через scripts/server.py.Application с тёплыми пулами, поэтому в замер
+не входят ни HTTP, ни открытие соединений - только запросы handler'а. Выигрыш async растёт
+с задержкой сети до БД: на локальной базе он меньше, чем до облачной.
+С --concurrency больше 1 вызовы идут из нескольких потоков, как под нагрузкой на сервер.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_async.py --calls 200
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_async.py --concurrency 8
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import server
+
+FUNCTIONS = ['stats', 'company-employees', 'profile']
+
+def build_cases(headers: dict):
+    return [
+        ('stats', {'httpMethod': 'GET', 'headers': headers}),
+        ('company-employees', {'httpMethod': 'GET', 'headers': headers}),
+        ('profile', {'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': {}})
+    ]
+
+def measure(app: server.Application, function: str, event: dict, calls: int, concurrency: int) -> dict:
+    for _ in range(5):
+        app.call(function, event)
+
+    durations, statuses = [], set()
+    lock = threading.Lock()
+
+    def worker(count: int):
+        local = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = app.call(function, event)
+            local.append((time.perf_counter() - started) * 1000)
+            with lock:
+                statuses.add(response['statusCode'])
+        with lock:
+            durations.extend(local)
+
+    threads = [threading.Thread(target=worker, args=(calls // concurrency,)) for _ in range(concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    durations.sort()
+    return {
+        'p50': statistics.median(durations),
+        'p95': durations[int(len(durations) * 0.95) - 1],
+        'statuses': ','.join(str(s) for s in sorted(statuses))
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Синхронные handler против handler_async на asyncpg')
+    parser.add_argument('--calls', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=1)
+    parser.add_argument('--pool-size', type=int, default=10)
+    args = parser.parse_args()
+
+    if server.asyncpg is None:
+        print('нужен asyncpg: pip install asyncpg')
+        return 1
+
+    dsn = os.environ['DATABASE_URL']
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': os.environ['BENCH_COMPANY_ID']}
+    apps = [
+        ('sync', server.Application(server.load_functions(FUNCTIONS), dsn, args.pool_size, 'sync')),
+        ('async', server.Application(server.load_functions(FUNCTIONS), dsn, args.pool_size, 'async'))
+    ]
+
+    print(f"{'function':<18} {'runtime':<7} {'p50 ms':>8} {'p95 ms':>8} {'status':>7}")
+    try:
+        for function, event in build_cases(headers):
+            for runtime, app in apps:
+                m = measure(app, function, event, args.calls, args.concurrency)
+                print(f"{function:<18} {runtime:<7} {m['p50']:>8.2f} {m['p95']:>8.2f} {m['statuses']:>7}")
+    finally:
+        for _, app in apps:
+            app.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Замер холодного старта функций из backend/: время импорта index.py и первого вызова handler.
+
+Каждая функция запускается в отдельном интерпретаторе, как на платформе. Без --actions первый
+вызов - OPTIONS-запрос: он не ходит в БД и показывает чистую стоимость загрузки модуля, но
+возвращается раньше любого ленивого импорта. С --actions первым вызовом идёт настоящее действие
+(login, upload_avatar, GET профиля): так в замер входят модули, которые грузит само действие,
+и колонка lazy показывает, какие тяжёлые зависимости оно подтянуло. Для --actions нужны
+реальная БД, тестовый пользователь и переменные окружения функций (JWT_SECRET, ключи S3).
+
+Запуск:
+    python scripts/bench_cold_start.py
+    python scripts/bench_cold_start.py --runs 5 profile auth
+    DATABASE_URL=... JWT_SECRET=... BENCH_EMAIL=... BENCH_PASSWORD=... BENCH_USER_ID=... \
+        python scripts/bench_cold_start.py --actions
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# Модули, которые функции грузят лениво; по ним видно, что именно подтянул первый вызов
+HEAVY_MODULES = ['jwt', 'cryptography', 'boto3', 'botocore', 'smtplib', 'email.mime', 'bcrypt']
+
+# 1x1 PNG для upload_avatar
+TINY_PNG = 'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=='
+
+PROBE = r'''
+import json, sys, time
+event = json.loads(sys.argv[1])
+heavy = json.loads(sys.argv[2])
+started = time.perf_counter()
+try:
+    import index
+except ImportError as e:
+    print(json.dumps({'error': f'не установлена зависимость: {e.name}'}))
+    sys.exit(0)
+imported = time.perf_counter()
+preloaded = [m for m in heavy if m in sys.modules]
+response = index.handler(event, None)
+first_call = time.perf_counter()
+index.handler(event, None)
+second_call = time.perf_counter()
+print(json.dumps({
+    'status': response['statusCode'],
+    'import_ms': (imported - started) * 1000,
+    'first_call_ms': (first_call - imported) * 1000,
+    'warm_call_ms': (second_call - first_call) * 1000,
+    'modules': len(sys.modules),
+    'lazy': [m for m in heavy if m in sys.modules and m not in preloaded]
+}))
+'''
+
+def list_functions():
+    return sorted(
+        name for name in os.listdir(BACKEND_DIR)
+        if os.path.isfile(os.path.join(BACKEND_DIR, name, 'index.py'))
+    )
+
+OPTIONS_EVENT = {'httpMethod': 'OPTIONS', 'headers': {}}
+
+def build_actions():
+    """(функция, действие, event): действия, ради которых зависимости грузятся лениво"""
+    login_body = json.dumps({'action': 'login', 'email': os.environ.get('BENCH_EMAIL', ''),
+                             'password': os.environ.get('BENCH_PASSWORD', '')})
+    user_headers = {'X-User-Id': os.environ.get('BENCH_USER_ID', '1')}
+    avatar_body = json.dumps({'action': 'upload_avatar', 'image': TINY_PNG})
+    return [
+        ('auth', 'login', {'httpMethod': 'POST', 'headers': {}, 'body': login_body}),
+        ('auth-login', 'login', {'httpMethod': 'POST', 'headers': {}, 'body': login_body}),
+        ('profile', 'get', {'httpMethod': 'GET', 'headers': user_headers}),
+        ('profile-avatar', 'upload_avatar', {'httpMethod': 'POST', 'headers': user_headers, 'body': avatar_body})
+    ]
+
+def measure(function: str, event: dict = OPTIONS_EVENT) -> dict:
+    result = subprocess.run(
+        [sys.executable, '-c', PROBE, json.dumps(event), json.dumps(HEAVY_MODULES)],
+        cwd=os.path.join(BACKEND_DIR, function),
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        return {'error': result.stderr.strip().splitlines()[-1]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Холодный старт функций backend/')
+    parser.add_argument('functions', nargs='*', help='по умолчанию - все функции')
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--actions', action='store_true', help='первым вызовом - настоящее действие, а не OPTIONS')
+    args = parser.parse_args()
+
+    if args.actions:
+        cases = [(f, a, e) for f, a, e in build_actions() if not args.functions or f in args.functions]
+    else:
+        cases = [(f, 'options', OPTIONS_EVENT) for f in args.functions or list_functions()]
+
+    print(f"{'function':<20} {'action':<14} {'status':>6} {'import ms':>10} {'1st call ms':>12} {'warm ms':>8} "
+          f"{'modules':>8}  lazy")
+    for function, action, event in cases:
+        samples = [measure(function, event) for _ in range(args.runs)]
+        errors = [s['error'] for s in samples if 'error' in s]
+        if errors:
+            print(f"{function:<20} {action:<14} {errors[0]}")
+            continue
+        print(
+            f"{function:<20} {action:<14} {samples[0]['status']:>6} "
+            f"{statistics.median(s['import_ms'] for s in samples):>10.1f} "
+            f"{statistics.median(s['first_call_ms'] for s in samples):>12.2f} "
+            f"{statistics.median(s['warm_call_ms'] for s in samples):>8.3f} "
+            f"{samples[0]['modules']:>8}  "
+            f"{', '.join(samples[0]['lazy']) or '-'}"
+        )
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,134 @@
+"""
+Сравнение сборки ответа списков в Python и в PostgreSQL (render=db).
+
+Для каждой функции handler вызывается в обоих режимах: замеряются полное время,
+процессорное время Python и пик выделенной памяти (tracemalloc). Для 10k+ строк
+в компании можно досыпать тестовые данные: --seed создаёт клиентов, проекты, заказы
+и платежи с префиксом имени bench-json-, --cleanup удаляет их.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_json_render.py --seed 12000
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_json_render.py --runs 5
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_json_render.py --cleanup
+"""
+import argparse
+import importlib.util
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+FUNCTIONS = ['clients', 'projects', 'orders', 'payments']
+PREFIX = 'bench-json-'
+
+def load_handler(function: str):
+    spec = importlib.util.spec_from_file_location(f"bench_{function}", os.path.join(BACKEND_DIR, function, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+def seed(company_id: int, rows: int):
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute(f"""
+        WITH new_clients AS (
+            INSERT INTO clients (company_id, name, notes, status)
+            SELECT {company_id}, '{PREFIX}' || g, 'заметка ' || g, 'active' FROM generate_series(1, {rows}) g
+            RETURNING id
+        ),
+        contacts AS (
+            INSERT INTO client_contacts (client_id, full_name, phone, email)
+            SELECT id, 'Контакт ' || id, '+7900' || id, 'c' || id || '@example.com' FROM new_clients
+        ),
+        new_projects AS (
+            INSERT INTO projects (company_id, client_id, name, status)
+            SELECT {company_id}, id, '{PREFIX}' || id, 'active' FROM new_clients
+            RETURNING id
+        ),
+        new_orders AS (
+            INSERT INTO orders (company_id, project_id, name, amount, order_status, payment_status,
+                                payment_type, planned_date, status)
+            SELECT {company_id}, id, '{PREFIX}' || id, 1000 + id % 9000, 'new', 'not_paid', 'postpaid',
+                   CURRENT_DATE + (id % 90), 'active'
+            FROM new_projects
+            RETURNING id, amount, planned_date
+        )
+        INSERT INTO payments (company_id, order_id, planned_amount, actual_amount, planned_date, status)
+        SELECT {company_id}, id, amount, 0, planned_date, 'active' FROM new_orders
+    """)
+    conn.commit()
+    cur.close()
+    conn.close()
+    print(f"добавлено по {rows} клиентов, проектов, заказов и платежей")
+
+def cleanup(company_id: int):
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    like_sql = f"'{PREFIX}%'"
+    cur.execute(f"""
+        DELETE FROM payments WHERE company_id = {company_id} AND order_id IN (
+            SELECT id FROM orders WHERE company_id = {company_id} AND name LIKE {like_sql})
+    """)
+    cur.execute(f"DELETE FROM orders WHERE company_id = {company_id} AND name LIKE {like_sql}")
+    cur.execute(f"DELETE FROM projects WHERE company_id = {company_id} AND name LIKE {like_sql}")
+    cur.execute(f"""
+        DELETE FROM client_contacts WHERE client_id IN (
+            SELECT id FROM clients WHERE company_id = {company_id} AND name LIKE {like_sql})
+    """)
+    cur.execute(f"DELETE FROM clients WHERE company_id = {company_id} AND name LIKE {like_sql}")
+    conn.commit()
+    cur.close()
+    conn.close()
+    print('тестовые данные удалены')
+
+def measure(handler, event: dict, runs: int) -> dict:
+    wall, cpu, peak = [], [], []
+    size = 0
+    for _ in range(runs):
+        tracemalloc.start()
+        wall_started = time.perf_counter()
+        cpu_started = time.process_time()
+        response = handler(event, None)
+        cpu.append((time.process_time() - cpu_started) * 1000)
+        wall.append((time.perf_counter() - wall_started) * 1000)
+        peak.append(tracemalloc.get_traced_memory()[1] / 1024 / 1024)
+        tracemalloc.stop()
+        if response['statusCode'] != 200:
+            raise RuntimeError(response['body'])
+        size = len(response['body'])
+    return {
+        'wall_ms': statistics.median(wall),
+        'cpu_ms': statistics.median(cpu),
+        'peak_mb': statistics.median(peak),
+        'kb': size / 1024
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Сборка JSON в Python против render=db')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--seed', type=int, help='добавить N строк каждой сущности')
+    parser.add_argument('--cleanup', action='store_true', help='удалить тестовые данные')
+    args = parser.parse_args()
+
+    company_id = int(os.environ['BENCH_COMPANY_ID'])
+    if args.cleanup:
+        cleanup(company_id)
+        return 0
+    if args.seed:
+        seed(company_id, args.seed)
+
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': str(company_id)}
+    print(f"{'function':<10} {'mode':<7} {'wall ms':>9} {'py cpu ms':>10} {'peak MB':>8} {'body KB':>9}")
+    for function in FUNCTIONS:
+        handler = load_handler(function)
+        for mode, params in [('python', {}), ('db', {'render': 'db'})]:
+            event = {'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': params}
+            m = measure(handler, event, args.runs)
+            print(f"{function:<10} {mode:<7} {m['wall_ms']:>9.1f} {m['cpu_ms']:>10.1f} {m['peak_mb']:>8.2f} {m['kb']:>9.0f}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
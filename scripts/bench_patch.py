@@ -0,0 +1,124 @@
+"""
+Стоимость одной правки заказа: PUT полным объектом против PATCH только изменённых полей.
+
+Для каждого режима handler функции orders вызывается --edits раз, сумма заказа чередуется
+между двумя значениями, чтобы каждая правка реально меняла строку. Замеряются медиана
+времени вызова, число запросов к БД за вызов (execute + commit) и объём WAL на правку
+по pg_current_wal_lsn(). Отдельно проверяется PATCH тем же значением: строка не переписывается.
+Заказ создаётся с префиксом имени bench-patch- и удаляется в конце. WAL общий для кластера,
+поэтому мерить лучше на базе без посторонней нагрузки.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_patch.py --edits 200
+"""
+import argparse
+import importlib.util
+import json
+import os
+import statistics
+import sys
+import time
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+PREFIX = 'bench-patch-'
+
+ROUND_TRIPS = {'count': 0}
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        ROUND_TRIPS['count'] += 1
+        return super().execute(query, vars)
+
+class CountingConnection(psycopg2.extensions.connection):
+    def commit(self):
+        ROUND_TRIPS['count'] += 1
+        return super().commit()
+
+def load_orders_module():
+    spec = importlib.util.spec_from_file_location('bench_orders', os.path.join(BACKEND_DIR, 'orders', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.get_db_connection = lambda: psycopg2.connect(
+        os.environ['DATABASE_URL'], connection_factory=CountingConnection, cursor_factory=CountingCursor
+    )
+    return module
+
+def create_order(cur, company_id: int) -> int:
+    cur.execute(f"""
+        INSERT INTO orders (company_id, name, description, amount, order_status, payment_status,
+                            payment_type, planned_date, status)
+        VALUES ({company_id}, '{PREFIX}order', 'заказ для замера правок', 1000, 'new', 'not_paid',
+                'postpaid', CURRENT_DATE, 'active')
+        RETURNING id
+    """)
+    return cur.fetchone()[0]
+
+def wal_lsn(cur) -> str:
+    cur.execute("SELECT pg_current_wal_lsn()")
+    return cur.fetchone()[0]
+
+def wal_bytes_since(cur, lsn: str) -> int:
+    cur.execute(f"SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), '{lsn}')")
+    return int(cur.fetchone()[0])
+
+def measure(handler, events, cur) -> dict:
+    durations, trips = [], []
+    lsn = wal_lsn(cur)
+    for event in events:
+        ROUND_TRIPS['count'] = 0
+        started = time.perf_counter()
+        response = handler(event, None)
+        durations.append((time.perf_counter() - started) * 1000)
+        trips.append(ROUND_TRIPS['count'])
+        if response['statusCode'] != 200:
+            raise RuntimeError(response['body'])
+    return {
+        'ms': statistics.median(durations),
+        'round_trips': statistics.median(trips),
+        'wal_bytes': wal_bytes_since(cur, lsn) / len(events)
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='PUT против PATCH для правки заказа')
+    parser.add_argument('--edits', type=int, default=200)
+    args = parser.parse_args()
+
+    company_id = int(os.environ['BENCH_COMPANY_ID'])
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': str(company_id)}
+    module = load_orders_module()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    order_id = create_order(cur, company_id)
+
+    try:
+        full_order = json.loads(module.handler({
+            'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': {'id': str(order_id)}
+        }, None)['body'])
+        amounts = [1000 + (i % 2) for i in range(1, args.edits + 1)]
+
+        def event(method: str, body: dict) -> dict:
+            return {'httpMethod': method, 'headers': headers, 'body': json.dumps(body)}
+
+        cases = [
+            # без version: PUT полным объектом повторяется с одной и той же прочитанной версией
+            ('PUT', [event('PUT', {**full_order, 'amount': amount, 'version': None}) for amount in amounts]),
+            ('PATCH', [event('PATCH', {'id': order_id, 'amount': amount}) for amount in amounts]),
+            ('PATCH no-op', [event('PATCH', {'id': order_id, 'amount': amounts[-1]}) for _ in amounts])
+        ]
+
+        print(f"{'mode':<12} {'ms':>8} {'round trips':>12} {'WAL bytes/edit':>15}")
+        for mode, events in cases:
+            m = measure(module.handler, events, cur)
+            print(f"{mode:<12} {m['ms']:>8.2f} {m['round_trips']:>12.0f} {m['wal_bytes']:>15.0f}")
+    finally:
+        cur.execute(f"DELETE FROM orders WHERE id = {order_id} AND company_id = {company_id}")
+        cur.close()
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
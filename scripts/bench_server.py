@@ -0,0 +1,134 @@
+"""
+Пропускная способность: все функции в одном сервере (scripts/server.py) против функции на эндпоинт.
+
+Нагрузка - GET-запросы к спискам и справочникам от --concurrency потоков в течение --duration
+секунд. Режимы:
+    server    - scripts/server.py с пулом соединений на воркер;
+    per-call  - тот же сервер с --pool-size 0: соединение на каждый вызов, как у функции на платформе;
+    functions - развёрнутые функции по адресам из backend/func2url.json (только с --functions).
+Сервер запускается скриптом на свободном порту и останавливается после замера. Клиент нагрузки -
+тоже Python, поэтому на одной машине с сервером лучше давать воркерам не все ядра.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_server.py --workers 4
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/bench_server.py --functions --duration 30
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+FUNC2URL = os.path.join(SCRIPTS_DIR, '..', 'backend', 'func2url.json')
+
+# (функция, query string) - чтения, которые фронтенд делает чаще всего
+ROUTES = [
+    ('orders', ''),
+    ('clients', ''),
+    ('projects', ''),
+    ('payments', ''),
+    ('lookups', 'entity=clients')
+]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(workers: int, pool_size: int):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(SCRIPTS_DIR, 'server.py'), '--host', '127.0.0.1', '--port', str(port),
+         '--workers', str(workers), '--pool-size', str(pool_size)] + sorted({f for f, _ in ROUTES}),
+        stdout=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            urllib.request.urlopen(urllib.request.Request(f"{base_url}/orders", method='OPTIONS'), timeout=1)
+            return process, {function: f"{base_url}/{function}" for function, _ in ROUTES}
+        except (urllib.error.URLError, ConnectionError):
+            if process.poll() is not None:
+                raise RuntimeError('сервер не запустился')
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError('сервер не ответил за 30 секунд')
+
+def run_load(urls: dict, headers: dict, concurrency: int, duration: float) -> dict:
+    routes = [(f"{urls[function]}?{query}" if query else urls[function]) for function, query in ROUTES if function in urls]
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + duration
+
+    def worker(offset: int):
+        local, failed, i = [], 0, offset
+        while time.perf_counter() < stop_at:
+            url = routes[i % len(routes)]
+            i += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=30) as response:
+                    response.read()
+                local.append((time.perf_counter() - started) * 1000)
+            except (urllib.error.URLError, ConnectionError):
+                failed += 1
+        with lock:
+            latencies.extend(local)
+            errors[0] += failed
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50': statistics.median(latencies) if latencies else 0,
+        'p99': latencies[int(len(latencies) * 0.99) - 1] if latencies else 0,
+        'errors': errors[0]
+    }
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Один сервер против функции на эндпоинт')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--duration', type=float, default=15)
+    parser.add_argument('--functions', action='store_true', help='ещё и развёрнутые функции из func2url.json')
+    args = parser.parse_args()
+
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': os.environ['BENCH_COMPANY_ID']}
+    modes = [('server', args.pool_size), ('per-call', 0)]
+
+    print(f"{'mode':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode, pool_size in modes:
+        process, urls = start_server(args.workers, pool_size)
+        try:
+            run_load(urls, headers, args.concurrency, min(args.duration, 3))  # прогрев пулов и импортов
+            m = run_load(urls, headers, args.concurrency, args.duration)
+        finally:
+            process.terminate()
+            process.wait()
+        print(f"{mode:<10} {m['rps']:>8.1f} {m['p50']:>8.2f} {m['p99']:>8.2f} {m['errors']:>7}")
+
+    if args.functions:
+        with open(FUNC2URL) as f:
+            urls = json.load(f)
+        m = run_load(urls, headers, args.concurrency, args.duration)
+        print(f"{'functions':<10} {m['rps']:>8.1f} {m['p50']:>8.2f} {m['p99']:>8.2f} {m['errors']:>7}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,95 @@
+"""
+Проверка архивации: строка, на которую ссылаются строки горячих таблиц, остаётся на месте.
+
+Через handler'ы функций создаются клиент, проект, заказ и платёж (префикс имени bench-archive-),
+заказ удаляется (status = 'removed'), платёж остаётся активным. После POST action=run функции
+archive заказ должен остаться в orders, а не оказаться в orders_archive. Затем удаляется платёж,
+и повторный запуск переносит в архив и платёж, и заказ.
+archive переносит все удалённые строки компании, поэтому запускать на тестовой компании;
+пользователь должен быть её owner или admin.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/check_archive_children.py
+"""
+import importlib.util
+import json
+import os
+import sys
+import psycopg2
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+PREFIX = 'bench-archive-'
+
+def load_handler(function: str):
+    spec = importlib.util.spec_from_file_location(f"archive_check_{function}", os.path.join(BACKEND_DIR, function, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.handler
+
+def call(handler, headers: dict, method: str, body: dict = None, params: dict = None):
+    response = handler({
+        'httpMethod': method,
+        'headers': headers,
+        'body': json.dumps(body or {}),
+        'queryStringParameters': params
+    }, None)
+    return response['statusCode'], json.loads(response['body'] or '{}')
+
+def location(cur, table: str, company_id: int, row_id: int) -> str:
+    cur.execute(f"SELECT 1 FROM {table} WHERE company_id = {company_id} AND id = {row_id}")
+    if cur.fetchone():
+        return 'hot'
+    cur.execute(f"SELECT 1 FROM {table}_archive WHERE company_id = {company_id} AND id = {row_id}")
+    return 'archive' if cur.fetchone() else 'missing'
+
+def main() -> int:
+    company_id = int(os.environ['BENCH_COMPANY_ID'])
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': str(company_id)}
+    handlers = {f: load_handler(f) for f in ['clients', 'projects', 'orders', 'payments', 'archive']}
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+    ids = {}
+    failures = 0
+
+    def check(name: str, ok: bool):
+        nonlocal failures
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name}")
+
+    try:
+        _, body = call(handlers['clients'], headers, 'POST', {'name': PREFIX + 'client', 'contacts': []})
+        ids['clients'] = body['client_id']
+        _, body = call(handlers['projects'], headers, 'POST', {'name': PREFIX + 'project', 'client_id': ids['clients']})
+        ids['projects'] = body['project_id']
+        _, body = call(handlers['orders'], headers, 'POST', {'name': PREFIX + 'order', 'amount': 1000, 'project_id': ids['projects']})
+        ids['orders'] = body['order_id']
+        _, body = call(handlers['payments'], headers, 'POST', {'order_id': ids['orders'], 'planned_amount': 1000})
+        ids['payments'] = body['payment_id']
+
+        call(handlers['orders'], headers, 'DELETE', params={'id': str(ids['orders'])})
+        status, _ = call(handlers['archive'], headers, 'POST', {'action': 'run'})
+        check('archive run', status == 200)
+        check('removed order with live payment stays hot', location(cur, 'orders', company_id, ids['orders']) == 'hot')
+        check('live payment stays hot', location(cur, 'payments', company_id, ids['payments']) == 'hot')
+
+        call(handlers['payments'], headers, 'DELETE', params={'id': str(ids['payments'])})
+        call(handlers['archive'], headers, 'POST', {'action': 'run'})
+        check('removed payment archived', location(cur, 'payments', company_id, ids['payments']) == 'archive')
+        check('order archived after its payments', location(cur, 'orders', company_id, ids['orders']) == 'archive')
+    finally:
+        for table in ['payments', 'orders', 'projects', 'clients']:
+            if ids.get(table):
+                for suffix in ['', '_archive']:
+                    cur.execute(f"DELETE FROM {table}{suffix} WHERE company_id = {company_id} AND id = {int(ids[table])}")
+        cur.close()
+        conn.close()
+
+    if failures:
+        print(f"{failures} проверок не прошли")
+        return 1
+    print('архивация не оставляет висячих ссылок')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
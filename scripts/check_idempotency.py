@@ -0,0 +1,142 @@
+"""
+Проверка Idempotency-Key на создании клиентов, проектов, заказов и платежей.
+
+Для каждой функции POST выполняется трижды с одним ключом:
+    create   - новый ключ: 200 и id новой строки;
+    replay   - то же тело: 200, заголовок Idempotent-Replayed: true, тот же id, новой строки нет;
+    mismatch - другое тело: 422, строка не создаётся.
+Вызовы идут через handler с курсором, считающим execute: повтор должен отвечать без записи,
+поэтому число его запросов тоже выводится. Строки получают префикс имени bench-idempotency-,
+ключи - случайный суффикс; всё созданное удаляется в конце.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/check_idempotency.py
+"""
+import importlib.util
+import json
+import os
+import sys
+import uuid
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+PREFIX = 'bench-idempotency-'
+
+QUERIES = {'count': 0}
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        QUERIES['count'] += 1
+        return super().execute(query, vars)
+
+def load_handler(function: str):
+    spec = importlib.util.spec_from_file_location(f"idempotency_{function}", os.path.join(BACKEND_DIR, function, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.get_db_connection = lambda: psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=CountingCursor)
+    return module.handler
+
+def call(handler, headers: dict, body: dict):
+    QUERIES['count'] = 0
+    response = handler({'httpMethod': 'POST', 'headers': headers, 'body': json.dumps(body)}, None)
+    return response['statusCode'], response['headers'], json.loads(response['body'] or '{}'), QUERIES['count']
+
+def count_rows(cur, table: str, company_id: int, row_filter: str) -> int:
+    cur.execute(f"SELECT COUNT(*) FROM {table} WHERE company_id = {company_id} AND {row_filter}")
+    return cur.fetchone()[0]
+
+def main() -> int:
+    company_id = int(os.environ['BENCH_COMPANY_ID'])
+    base_headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': str(company_id)}
+    run_id = uuid.uuid4().hex[:12]
+    created = {}
+    keys = []
+    failures = 0
+
+    # (функция, ключ id в ответе, тело, тело для mismatch, условие для подсчёта строк тела)
+    plan = [
+        ('clients', 'client_id',
+         lambda: {'name': PREFIX + 'client'}, lambda: {'name': PREFIX + 'client-other'},
+         lambda: f"name = '{PREFIX}client'"),
+        ('projects', 'project_id',
+         lambda: {'name': PREFIX + 'project', 'client_id': created['clients']},
+         lambda: {'name': PREFIX + 'project-other', 'client_id': created['clients']},
+         lambda: f"name = '{PREFIX}project'"),
+        ('orders', 'order_id',
+         lambda: {'name': PREFIX + 'order', 'amount': 1000, 'project_id': created['projects']},
+         lambda: {'name': PREFIX + 'order', 'amount': 2000, 'project_id': created['projects']},
+         lambda: f"name = '{PREFIX}order'"),
+        ('payments', 'payment_id',
+         lambda: {'order_id': created['orders'], 'planned_amount': 1000},
+         lambda: {'order_id': created['orders'], 'planned_amount': 500},
+         lambda: f"order_id = {int(created['orders'])}")
+    ]
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    conn.autocommit = True
+    cur = conn.cursor()
+
+    print(f"{'function':<10} {'call':<9} {'status':>6} {'replayed':>9} {'queries':>8} {'rows':>5}  result")
+    try:
+        for function, id_key, body, other_body, row_filter in plan:
+            handler = load_handler(function)
+            key = f"{PREFIX}{function}-{run_id}"
+            keys.append(key)
+            headers = {**base_headers, 'Idempotency-Key': key}
+
+            status, response_headers, response, queries = call(handler, headers, body())
+            created[function] = response.get(id_key)
+            rows = count_rows(cur, function, company_id, row_filter())
+            problems = []
+            if status != 200 or not created[function]:
+                problems.append(f"ожидался 200 с {id_key}")
+            results = [('create', status, response_headers, queries, rows, problems)]
+
+            status, response_headers, response, queries = call(handler, headers, body())
+            problems = []
+            if status != 200 or response_headers.get('Idempotent-Replayed') != 'true':
+                problems.append('ожидался 200 с Idempotent-Replayed: true')
+            if response.get(id_key) != created[function]:
+                problems.append(f"{id_key} {response.get(id_key)} вместо {created[function]}")
+            replay_rows = count_rows(cur, function, company_id, row_filter())
+            if replay_rows != rows:
+                problems.append('повтор создал строку')
+            results.append(('replay', status, response_headers, queries, replay_rows, problems))
+
+            status, response_headers, response, queries = call(handler, headers, other_body())
+            problems = []
+            if status != 422:
+                problems.append('ожидался 422')
+            mismatch_rows = count_rows(cur, function, company_id, row_filter())
+            if mismatch_rows != rows:
+                problems.append('тело с чужим ключом создало строку')
+            results.append(('mismatch', status, response_headers, queries, mismatch_rows, problems))
+
+            for name, status, response_headers, queries, rows, problems in results:
+                failures += bool(problems)
+                replayed = response_headers.get('Idempotent-Replayed', '-')
+                print(f"{function:<10} {name:<9} {status:>6} {replayed:>9} {queries:>8} {rows:>5}  "
+                      f"{'; '.join(problems) if problems else 'ok'}")
+    finally:
+        if created.get('orders'):
+            cur.execute(f"DELETE FROM payments WHERE order_id = {int(created['orders'])} AND company_id = {company_id}")
+            cur.execute(f"DELETE FROM orders WHERE id = {int(created['orders'])} AND company_id = {company_id}")
+        if created.get('projects'):
+            cur.execute(f"DELETE FROM projects WHERE id = {int(created['projects'])} AND company_id = {company_id}")
+        if created.get('clients'):
+            cur.execute(f"DELETE FROM client_contacts WHERE client_id = {int(created['clients'])}")
+            cur.execute(f"DELETE FROM clients WHERE id = {int(created['clients'])} AND company_id = {company_id}")
+        for key in keys:
+            cur.execute(f"DELETE FROM idempotency_keys WHERE company_id = {company_id} AND idempotency_key = '{key}'")
+        cur.close()
+        conn.close()
+
+    if failures:
+        print(f"{failures} вызовов с ошибками")
+        return 1
+    print('повтор возвращает сохранённый ответ, чужое тело - 422')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Общий код функций: каждая функция платформы разворачивается отдельно и не может импортировать
+соседнюю, поэтому общий код копируется. Для перечисленных ниже функций копия должна дословно
+совпадать с источником - правится источник, затем копируется в остальные функции.
+
+Сравниваются AST определений, поэтому пустые строки и комментарии вне тела не мешают,
+а любое расхождение в коде или SQL - ошибка.
+
+Запуск:
+    python scripts/check_shared_code.py
+"""
+import ast
+import os
+import sys
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+# имя функции -> (функция-источник, функции с копиями)
+SHARED = {
+    'cascade_status': ('cascade', ['jobs']),
+    'refresh_client_revenue': ('client-revenue', ['jobs']),
+    'bump_entity_version': ('cascade', ['jobs']),
+    'escape_sql_string': ('cascade', ['jobs'])
+}
+
+def load_definition(function: str, name: str):
+    with open(os.path.join(BACKEND_DIR, function, 'index.py'), encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == name:
+            return ast.dump(node)
+    return None
+
+def main() -> int:
+    failures = 0
+    for name, (source, copies) in SHARED.items():
+        expected = load_definition(source, name)
+        if expected is None:
+            print(f"{source}.{name}: источник не найден")
+            failures += 1
+            continue
+        for function in copies:
+            actual = load_definition(function, name)
+            if actual is None:
+                status = 'нет копии'
+            elif actual != expected:
+                status = f"отличается от {source}"
+            else:
+                status = 'ok'
+            failures += status != 'ok'
+            print(f"{function}.{name:<24} {status}")
+
+    if failures:
+        print(f"{failures} расхождений")
+        return 1
+    print('копии совпадают с источниками')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
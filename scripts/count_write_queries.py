@@ -0,0 +1,123 @@
+"""
+Проверка числа запросов к БД на одну запись в clients, projects, orders и payments.
+
+Каждая мутация (POST, PUT, PATCH, DELETE, повторный DELETE) вызывается через handler
+функции с курсором, считающим execute. Членство в компании, владение строкой, версия
+сущности и ответ «не найдено / уже удалено» должны укладываться в один запрос.
+PUT и PATCH с устаревшей version строки должны получить 409 тем же одним запросом.
+Создаваемые строки получают префикс имени bench-writes- и удаляются в конце.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/count_write_queries.py
+"""
+import importlib.util
+import json
+import os
+import sys
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+PREFIX = 'bench-writes-'
+EXPECTED_QUERIES = 1
+
+# POST создаёт строку с version 1, следующий PUT её увеличивает - version 1 уже устарела
+STALE_VERSION = 1
+
+QUERIES = {'count': 0}
+
+class CountingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        QUERIES['count'] += 1
+        return super().execute(query, vars)
+
+def load_handler(function: str):
+    spec = importlib.util.spec_from_file_location(f"writes_{function}", os.path.join(BACKEND_DIR, function, 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.get_db_connection = lambda: psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=CountingCursor)
+    return module.handler
+
+def call(handler, headers: dict, method: str, body: dict = None, params: dict = None):
+    QUERIES['count'] = 0
+    response = handler({
+        'httpMethod': method,
+        'headers': headers,
+        'body': json.dumps(body or {}),
+        'queryStringParameters': params
+    }, None)
+    return response['statusCode'], json.loads(response['body'] or '{}'), QUERIES['count']
+
+def main() -> int:
+    company_id = int(os.environ['BENCH_COMPANY_ID'])
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': str(company_id)}
+    created = {}
+    failures = 0
+
+    # родитель создаётся раньше потомка, id подставляется в тело следующей сущности
+    plan = [
+        ('clients', 'client_id', lambda: {'name': PREFIX + 'client', 'contacts': [{'full_name': 'Контакт'}]}),
+        ('projects', 'project_id', lambda: {'name': PREFIX + 'project', 'client_id': created['clients']}),
+        ('orders', 'order_id', lambda: {'name': PREFIX + 'order', 'amount': 1000, 'project_id': created['projects']}),
+        ('payments', 'payment_id', lambda: {'order_id': created['orders'], 'planned_amount': 1000})
+    ]
+
+    print(f"{'function':<10} {'call':<16} {'status':>6} {'queries':>8}")
+    try:
+        handlers = {function: load_handler(function) for function, _, _ in plan}
+        for function, id_key, new_body in plan:
+            handler = handlers[function]
+            status, body, queries = call(handler, headers, 'POST', new_body())
+            created[function] = body.get(id_key)
+            row_id = created[function]
+            calls = [
+                ('POST', status, queries),
+                ('PUT', *call(handler, headers, 'PUT', {**new_body(), 'id': row_id})[::2]),
+                ('PATCH', *call(handler, headers, 'PATCH', {'id': row_id, 'status': 'archived'})[::2]),
+                ('PATCH no-op', *call(handler, headers, 'PATCH', {'id': row_id, 'status': 'archived'})[::2]),
+                ('PATCH missing', *call(handler, headers, 'PATCH', {'id': 2 ** 62, 'status': 'archived'})[::2])
+            ]
+            for name, status, queries in calls:
+                failures += queries != EXPECTED_QUERIES
+                print(f"{function:<10} {name:<16} {status:>6} {queries:>8}")
+
+            stale_calls = [
+                ('PUT stale', *call(handler, headers, 'PUT', {**new_body(), 'id': row_id, 'version': STALE_VERSION})[::2]),
+                ('PATCH stale', *call(handler, headers, 'PATCH',
+                                      {'id': row_id, 'status': 'active', 'version': STALE_VERSION})[::2])
+            ]
+            for name, status, queries in stale_calls:
+                failures += queries != EXPECTED_QUERIES or status != 409
+                print(f"{function:<10} {name:<16} {status:>6} {queries:>8}")
+
+        # удаление в обратном порядке: потомки раньше родителей
+        for function, _, _ in reversed(plan):
+            params = {'id': str(created[function])}
+            for name in ['DELETE', 'DELETE again']:
+                status, _, queries = call(handlers[function], headers, 'DELETE', params=params)
+                failures += queries != EXPECTED_QUERIES
+                print(f"{function:<10} {name:<16} {status:>6} {queries:>8}")
+    finally:
+        conn = psycopg2.connect(os.environ['DATABASE_URL'])
+        cur = conn.cursor()
+        if created.get('payments'):
+            cur.execute(f"DELETE FROM payments WHERE id = {int(created['payments'])} AND company_id = {company_id}")
+        if created.get('orders'):
+            cur.execute(f"DELETE FROM orders WHERE id = {int(created['orders'])} AND company_id = {company_id}")
+        if created.get('projects'):
+            cur.execute(f"DELETE FROM projects WHERE id = {int(created['projects'])} AND company_id = {company_id}")
+        if created.get('clients'):
+            cur.execute(f"DELETE FROM client_contacts WHERE client_id = {int(created['clients'])}")
+            cur.execute(f"DELETE FROM clients WHERE id = {int(created['clients'])} AND company_id = {company_id}")
+        conn.commit()
+        cur.close()
+        conn.close()
+
+    if failures:
+        print(f"{failures} вызовов сделали больше {EXPECTED_QUERIES} запроса или не получили 409 на устаревшую версию")
+        return 1
+    print('каждая запись - один запрос')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Последние заказы в карточке клиента (GET /clients?id=...&include=orders): план и время запроса.
+
+Запрос берётся из handler функции clients (курсор записывает SQL, который handler выполняет),
+затем для него выполняется EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON). Ошибкой считается Seq Scan
+по секции orders, узел Sort по колонкам заказа ниже LIMIT проекта и время выполнения больше --max-ms.
+Клиенты берутся с наибольшим числом заказов - на них полная сортировка была бы заметнее всего.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/explain_client_recent_orders.py
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/explain_client_recent_orders.py --clients 10 --limit 100
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+RECORDED = []
+
+class RecordingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        RECORDED.append(query)
+        return super().execute(query, vars)
+
+def load_clients_module():
+    spec = importlib.util.spec_from_file_location('explain_clients', os.path.join(BACKEND_DIR, 'clients', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.get_db_connection = lambda: psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RecordingCursor)
+    return module
+
+def plan_problems(node: dict, under_limit: bool = False) -> list:
+    """Sort под верхним LIMIT допустим - он сортирует не больше проекты x limit строк"""
+    problems = []
+    node_type = node.get('Node Type')
+    if node_type == 'Seq Scan' and node.get('Relation Name', '').startswith('orders'):
+        problems.append(f"Seq Scan on {node['Relation Name']}")
+    if node_type in ('Sort', 'Incremental Sort') and under_limit and any(key.startswith('o.') for key in node.get('Sort Key', [])):
+        problems.append(f"{node_type} by {', '.join(node['Sort Key'])} inside project LATERAL")
+    for child in node.get('Plans', []):
+        problems += plan_problems(child, under_limit or node.get('Parent Relationship') == 'Inner')
+    return problems
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='EXPLAIN ANALYZE последних заказов клиента')
+    parser.add_argument('--clients', type=int, default=5, help='сколько самых крупных клиентов проверить')
+    parser.add_argument('--limit', type=int, default=20, help='recent_orders')
+    parser.add_argument('--max-ms', type=float, default=30)
+    args = parser.parse_args()
+
+    company_id = int(os.environ['BENCH_COMPANY_ID'])
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': str(company_id)}
+    module = load_clients_module()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    cur.execute(f"""
+        SELECT pr.client_id, COUNT(*) FROM orders o
+        JOIN projects pr ON pr.id = o.project_id AND pr.company_id = {company_id}
+        WHERE o.company_id = {company_id} AND pr.client_id IS NOT NULL
+        GROUP BY pr.client_id
+        ORDER BY COUNT(*) DESC
+        LIMIT {args.clients}
+    """)
+    clients = cur.fetchall()
+    if not clients:
+        print('у компании нет клиентов с заказами')
+        return 1
+
+    failures = 0
+    print(f"{'client':>8} {'orders':>8} {'rows':>5} {'ms':>8}  plan")
+    for client_id, orders_count in clients:
+        params = {'id': str(client_id), 'include': 'orders', 'recent_orders': str(args.limit)}
+        RECORDED.clear()
+        response = module.handler({'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': params}, None)
+        if response['statusCode'] != 200:
+            print(f"{client_id:>8}: {response['statusCode']} {response['body']}")
+            failures += 1
+            continue
+        recent_sql = next(q for q in RECORDED if 'CROSS JOIN LATERAL' in q and 'FROM orders o' in q)
+        cur.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {recent_sql}")
+        explain = cur.fetchone()[0][0]
+        problems = plan_problems(explain['Plan'])
+        elapsed = explain['Execution Time']
+        if elapsed > args.max_ms:
+            problems.append(f"дольше {args.max_ms:g} мс")
+        failures += bool(problems)
+        rows = len(json.loads(response['body'])['recent_orders'])
+        print(f"{client_id:>8} {orders_count:>8} {rows:>5} {elapsed:>8.2f}  {'; '.join(problems) if problems else 'ok'}")
+
+    cur.close()
+    conn.close()
+    if failures:
+        print(f"{failures} клиентов с проблемами")
+        return 1
+    print('последние заказы читаются по индексу')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Планы списка заказов: каждая комбинация фильтра и сортировки должна читаться по индексу.
+
+Запрос списка берётся из handler функции orders (курсор записывает SQL, который handler выполняет),
+затем для него выполняется EXPLAIN (FORMAT JSON). Ошибкой считается Seq Scan по секции orders
+и узел Sort / Incremental Sort по колонкам заказа (o.*).
+
+По умолчанию план строится с enable_seqscan = off и enable_sort = off: планировщик берёт
+сортировку или полный проход, только если индексного плана нет вовсе, - так проверяется
+покрытие индексами независимо от объёма данных. С --natural планы строятся с обычными
+стоимостями: на маленькой базе полный проход секции с сортировкой может быть честно дешевле.
+
+Запуск:
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/explain_orders_list.py
+    DATABASE_URL=... BENCH_USER_ID=1 BENCH_COMPANY_ID=1 python scripts/explain_orders_list.py --natural
+"""
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import psycopg2
+import psycopg2.extensions
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+RECORDED = []
+
+class RecordingCursor(psycopg2.extensions.cursor):
+    def execute(self, query, vars=None):
+        RECORDED.append(query)
+        return super().execute(query, vars)
+
+def load_orders_module():
+    spec = importlib.util.spec_from_file_location('explain_orders', os.path.join(BACKEND_DIR, 'orders', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.get_db_connection = lambda: psycopg2.connect(os.environ['DATABASE_URL'], cursor_factory=RecordingCursor)
+    return module
+
+def build_filters(module) -> list:
+    filters = [{}]
+    filters += [{'order_status': v} for v in module.ORDER_STATUSES]
+    filters += [{'payment_status': v} for v in module.PAYMENT_STATUSES]
+    filters += [{'payment_type': v} for v in module.PAYMENT_TYPES]
+    filters += [
+        {'order_status': ','.join(module.ORDER_STATUSES[:2])},
+        {'project_id': '1'},
+        {'client_id': '1'},
+        {'amount_min': '1000', 'amount_max': '100000'},
+        {'planned_from': '2024-01-01', 'planned_to': '2024-12-31'}
+    ]
+    return filters
+
+def plan_problems(node: dict) -> list:
+    problems = []
+    node_type = node.get('Node Type')
+    if node_type == 'Seq Scan' and node.get('Relation Name', '').startswith('orders'):
+        problems.append(f"Seq Scan on {node['Relation Name']}")
+    if node_type in ('Sort', 'Incremental Sort') and any(key.startswith('o.') for key in node.get('Sort Key', [])):
+        problems.append(f"{node_type} by {', '.join(node['Sort Key'])}")
+    for child in node.get('Plans', []):
+        problems += plan_problems(child)
+    return problems
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='EXPLAIN списка заказов для всех фильтров и сортировок')
+    parser.add_argument('--natural', action='store_true', help='обычные стоимости планировщика')
+    args = parser.parse_args()
+
+    headers = {'X-User-Id': os.environ['BENCH_USER_ID'], 'X-Company-Id': os.environ['BENCH_COMPANY_ID']}
+    module = load_orders_module()
+
+    conn = psycopg2.connect(os.environ['DATABASE_URL'])
+    cur = conn.cursor()
+    if not args.natural:
+        cur.execute("SET enable_seqscan = off")
+        cur.execute("SET enable_sort = off")
+
+    failures = 0
+    for sort_key in module.ORDER_SORT_COLUMNS:
+        for direction in ['asc', 'desc']:
+            for filters in build_filters(module):
+                params = {**filters, 'sort': sort_key, 'order': direction}
+                RECORDED.clear()
+                response = module.handler({'httpMethod': 'GET', 'headers': headers, 'queryStringParameters': params}, None)
+                if response['statusCode'] != 200:
+                    print(f"{json.dumps(params, ensure_ascii=False)}: {response['statusCode']} {response['body']}")
+                    failures += 1
+                    continue
+                list_sql = next(q for q in RECORDED if 'FROM orders o' in q and 'ORDER BY' in q)
+                cur.execute(f"EXPLAIN (FORMAT JSON) {list_sql}")
+                problems = plan_problems(cur.fetchone()[0][0]['Plan'])
+                failures += bool(problems)
+                status = '; '.join(problems) if problems else 'ok'
+                print(f"{sort_key:<13} {direction:<5} {json.dumps(filters, ensure_ascii=False):<55} {status}")
+
+    cur.close()
+    conn.close()
+    if failures:
+        print(f"{failures} комбинаций без индексного плана")
+        return 1
+    print('все комбинации читаются по индексу')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"""
+Воркер очереди jobs вне платформы: бесконечный цикл над backend/jobs/index.run_jobs.
+
+Несколько воркеров можно запускать параллельно - задачи забираются через SKIP LOCKED.
+На платформе ту же обработку выполняет POST action=run функции jobs (например, по расписанию).
+
+Запуск:
+    DATABASE_URL=... python scripts/job_worker.py
+    DATABASE_URL=... python scripts/job_worker.py --once
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'jobs'))
+
+import index as jobs
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Обработка очереди фоновых задач')
+    parser.add_argument('--once', action='store_true', help='разобрать очередь и выйти')
+    parser.add_argument('--poll-interval', type=float, default=2.0, help='пауза при пустой очереди, секунды')
+    parser.add_argument('--worker-id', default=f"worker-{socket.gethostname()}-{os.getpid()}")
+    args = parser.parse_args()
+
+    conn = jobs.get_db_connection()
+    queue_conn = jobs.get_db_connection()
+    queue_conn.autocommit = True
+
+    try:
+        while True:
+            processed = jobs.run_jobs(conn, queue_conn, args.worker_id, time_budget=60)
+            for job in processed:
+                print(f"job {job['id']}: {job['status']}" + (f" ({job['error']})" if job.get('error') else ''))
+            if args.once and not processed:
+                break
+            if not processed:
+                time.sleep(args.poll_interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        queue_conn.close()
+        conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+Онлайн-перенос orders и payments в секционированные таблицы перед миграцией V0018.
+
+Создаёт orders_p/payments_p (как в V0018), вешает на старые таблицы триггеры,
+зеркалирующие каждую запись, и копирует строки пачками по id, не блокируя работу.
+После этого V0018 догоняет только хвост и переключает таблицы за доли секунды.
+
+Запуск:
+    DATABASE_URL=... python scripts/partition_move.py prepare
+    DATABASE_URL=... python scripts/partition_move.py backfill --batch-size 5000
+    DATABASE_URL=... python scripts/partition_move.py status
+"""
+import argparse
+import os
+import sys
+import time
+import psycopg2
+
+PARTITIONS = 16
+TABLES = ['orders', 'payments']
+
+def get_db_connection():
+    return psycopg2.connect(os.environ['DATABASE_URL'])
+
+def prepare(cur):
+    for table in TABLES:
+        cur.execute(f"CREATE TABLE IF NOT EXISTS {table}_p (LIKE {table} INCLUDING DEFAULTS) PARTITION BY HASH (company_id)")
+        for i in range(PARTITIONS):
+            cur.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table}_p{i} PARTITION OF {table}_p
+                FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {i})
+            """)
+        cur.execute(f"SELECT 1 FROM pg_constraint WHERE conname = '{table}_p_pkey'")
+        if not cur.fetchone():
+            cur.execute(f"ALTER TABLE {table}_p ADD CONSTRAINT {table}_p_pkey PRIMARY KEY (company_id, id)")
+
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION {table}_mirror_partitioned() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {table}_p WHERE company_id = OLD.company_id AND id = OLD.id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {table}_p SELECT NEW.*;
+                END IF;
+                RETURN NULL;
+            END $$ LANGUAGE plpgsql
+        """)
+        cur.execute(f"DROP TRIGGER IF EXISTS {table}_mirror_partitioned ON {table}")
+        cur.execute(f"""
+            CREATE TRIGGER {table}_mirror_partitioned
+            AFTER INSERT OR UPDATE OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION {table}_mirror_partitioned()
+        """)
+
+def backfill(conn, batch_size: int, pause: float):
+    cur = conn.cursor()
+    for table in TABLES:
+        cur.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+        max_id = cur.fetchone()[0]
+        last_id = 0
+        while last_id < max_id:
+            upper = last_id + batch_size
+            # Блокировка строк пачки: параллельный UPDATE дождётся копирования и
+            # перезапишет копию через триггер, а не наоборот
+            cur.execute(f"SELECT id FROM {table} WHERE id > {last_id} AND id <= {upper} FOR UPDATE")
+            cur.execute(f"""
+                INSERT INTO {table}_p SELECT * FROM {table}
+                WHERE id > {last_id} AND id <= {upper}
+                ON CONFLICT (company_id, id) DO NOTHING
+            """)
+            copied = cur.rowcount
+            conn.commit()
+            print(f"{table}: id {last_id + 1}..{upper}, скопировано {copied}")
+            last_id = upper
+            if pause:
+                time.sleep(pause)
+    cur.close()
+
+def status(cur):
+    for table in TABLES:
+        cur.execute(f"SELECT (SELECT COUNT(*) FROM {table}), (SELECT COUNT(*) FROM {table}_p)")
+        source, target = cur.fetchone()
+        print(f"{table}: {source} строк, в {table}_p: {target}")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Перенос orders/payments в секционированные таблицы')
+    parser.add_argument('command', choices=['prepare', 'backfill', 'status'])
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--pause', type=float, default=0.05, help='пауза между пачками, секунды')
+    args = parser.parse_args()
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+    if args.command == 'prepare':
+        prepare(cur)
+        conn.commit()
+    elif args.command == 'backfill':
+        backfill(conn, args.batch_size, args.pause)
+    else:
+        status(cur)
+    cur.close()
+    conn.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,372 @@
+"""
+Все функции backend/ в одном долгоживущем процессе - режим для собственного развёртывания.
+
+Каждая функция доступна по пути /<имя папки> (например, /orders, /lookups?entity=clients).
+HTTP-запрос переводится в тот же event, что даёт платформа: httpMethod, headers,
+queryStringParameters, body и isBase64Encoded. handler вызывается как есть. Модули
+импортируются один раз до запуска воркеров. Каждый процесс-воркер держит свой пул
+соединений: get_db_connection функций подменяется на выдачу из пула, а conn.close()
+возвращает соединение обратно. Незакрытые соединения (handler упал до close) возвращаются
+после ответа с откатом незавершённой транзакции.
+Функции, для которых не установлены зависимости, пропускаются с предупреждением.
+
+С --pool-size 0 пул отключён: каждый вызов открывает своё соединение, как функция на платформе.
+
+С --runtime async (нужен pip install asyncpg) функции, у которых есть handler_async(event, context, pool),
+обслуживаются на цикле asyncio воркера с пулом asyncpg: независимые запросы такого handler'а идут
+одновременно на разных соединениях. Если handler_async вернул None (запись, другой метод), вызывается
+обычный синхронный handler с пулом psycopg2.
+Для фронтенда адреса из backend/func2url.json заменяются на http://<host>:<port>/<имя>.
+
+Запуск:
+    DATABASE_URL=... python scripts/server.py --port 8000 --workers 4 --pool-size 10
+    DATABASE_URL=... python scripts/server.py --port 8000 --workers 4 --runtime async
+    DATABASE_URL=... SERVER_POOL_SIZE=10 gunicorn --workers 4 --threads 8 --chdir scripts 'server:create_app()'
+"""
+import argparse
+import asyncio
+import base64
+import importlib.util
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer
+
+import psycopg2
+import psycopg2.extensions
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+
+DEFAULT_POOL_SIZE = 10
+POOL_TIMEOUT = 30
+
+JSON_HEADERS = {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'}
+
+class PoolTimeout(Exception):
+    pass
+
+class ConnectionPool:
+    """Соединения одного процесса: открываются по требованию, одновременно выдаётся не больше size"""
+
+    def __init__(self, dsn: str, size: int, timeout: float = POOL_TIMEOUT):
+        self.dsn = dsn
+        self.timeout = timeout
+        self.idle: List[Any] = []
+        self.lock = threading.Lock()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def acquire(self):
+        if not self.slots.acquire(timeout=self.timeout):
+            raise PoolTimeout('Нет свободных соединений с БД')
+        with self.lock:
+            conn = self.idle.pop() if self.idle else None
+        if conn is None or conn.closed:
+            try:
+                conn = psycopg2.connect(self.dsn)
+            except Exception:
+                self.slots.release()
+                raise
+        return conn
+
+    def release(self, conn):
+        try:
+            if conn.closed:
+                return
+            status = conn.info.transaction_status
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                conn.close()
+                return
+            if status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                conn.rollback()
+            # jobs включает autocommit на своём соединении; следующий handler ждёт обычную транзакцию
+            conn.autocommit = False
+            with self.lock:
+                self.idle.append(conn)
+        except psycopg2.Error:
+            conn.close()
+        finally:
+            self.slots.release()
+
+    def close_all(self):
+        with self.lock:
+            for conn in self.idle:
+                conn.close()
+            self.idle = []
+
+class PooledConnection:
+    """То, что получает handler вместо соединения: close() возвращает соединение в пул"""
+
+    def __init__(self, pool: ConnectionPool, conn):
+        object.__setattr__(self, '_pool', pool)
+        object.__setattr__(self, '_conn', conn)
+
+    def close(self):
+        if self._conn is not None:
+            self._pool.release(self._conn)
+            object.__setattr__(self, '_conn', None)
+
+    @property
+    def closed(self) -> int:
+        return 1 if self._conn is None else self._conn.closed
+
+    def __getattr__(self, name: str):
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name: str, value):
+        setattr(self._conn, name, value)
+
+def load_functions(names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """Импортирует index.py функций backend/ под именами backend_<имя>; имя папки -> модуль"""
+    modules = {}
+    for name in sorted(names or os.listdir(BACKEND_DIR)):
+        path = os.path.join(BACKEND_DIR, name, 'index.py')
+        if not os.path.isfile(path):
+            continue
+        spec = importlib.util.spec_from_file_location(f"backend_{name.replace('-', '_')}", path)
+        module = importlib.util.module_from_spec(spec)
+        try:
+            spec.loader.exec_module(module)
+        except ImportError as e:
+            print(f"{name}: пропущена, не установлена зависимость {e.name}", file=sys.stderr)
+            continue
+        modules[name] = module
+    return modules
+
+def header_name(environ_key: str) -> str:
+    return '-'.join(part.capitalize() for part in environ_key.split('_'))
+
+def build_event(environ: Dict[str, Any]) -> Dict[str, Any]:
+    """WSGI environ -> event в формате платформы"""
+    headers = {header_name(key[5:]): value for key, value in environ.items() if key.startswith('HTTP_')}
+    for key in ['CONTENT_TYPE', 'CONTENT_LENGTH']:
+        if environ.get(key):
+            headers[header_name(key)] = environ[key]
+
+    query = parse_qs(environ.get('QUERY_STRING', ''), keep_blank_values=True)
+    event = {
+        'httpMethod': environ['REQUEST_METHOD'],
+        'path': environ.get('PATH_INFO', '/'),
+        'headers': headers,
+        'queryStringParameters': {key: values[-1] for key, values in query.items()},
+        'isBase64Encoded': False
+    }
+
+    length = int(environ.get('CONTENT_LENGTH') or 0)
+    raw = environ['wsgi.input'].read(length) if length > 0 else b''
+    # пустое тело не передаётся вовсе: handler'ы читают event.get('body', '{}')
+    if raw:
+        try:
+            event['body'] = raw.decode('utf-8')
+        except UnicodeDecodeError:
+            event['body'] = base64.b64encode(raw).decode()
+            event['isBase64Encoded'] = True
+    return event
+
+def status_line(status_code: int) -> str:
+    """Строка статуса WSGI; для кода вне HTTPStatus (например, 499) - общая фраза"""
+    try:
+        phrase = HTTPStatus(status_code).phrase
+    except ValueError:
+        phrase = 'Unknown'
+    return f"{status_code} {phrase}"
+
+def error_response(status_code: int, message: str) -> Dict[str, Any]:
+    return {
+        'statusCode': status_code,
+        'headers': JSON_HEADERS,
+        'body': json.dumps({'error': message}),
+        'isBase64Encoded': False
+    }
+
+class Application:
+    """WSGI-приложение: маршрут /<функция> -> handler(event, None)"""
+
+    def __init__(self, modules: Dict[str, Any], dsn: str, pool_size: int = DEFAULT_POOL_SIZE,
+                 runtime: str = 'sync'):
+        self.modules = modules
+        self.dsn = dsn
+        self.pool_size = pool_size
+        self.runtime = runtime
+        self.pool: Optional[ConnectionPool] = None
+        self.pool_pid = None
+        self.pool_lock = threading.Lock()
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.async_pool = None
+        self.async_pid = None
+        self.request = threading.local()
+        if pool_size > 0:
+            for module in modules.values():
+                if hasattr(module, 'get_db_connection'):
+                    module.get_db_connection = self.connect
+
+    def get_pool(self) -> ConnectionPool:
+        # пул создаётся в самом воркере: соединения, открытые до fork, нельзя делить между процессами
+        with self.pool_lock:
+            if self.pool is None or self.pool_pid != os.getpid():
+                self.pool = ConnectionPool(self.dsn, self.pool_size)
+                self.pool_pid = os.getpid()
+            return self.pool
+
+    def get_async_pool(self):
+        """Цикл asyncio в отдельном потоке и пул asyncpg воркера; создаются после fork, как и пул psycopg2"""
+        with self.pool_lock:
+            if self.async_pool is None or self.async_pid != os.getpid():
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, daemon=True).start()
+                self.async_pool = asyncio.run_coroutine_threadsafe(
+                    asyncpg.create_pool(self.dsn, min_size=1, max_size=self.pool_size), self.loop
+                ).result()
+                self.async_pid = os.getpid()
+            return self.loop, self.async_pool
+
+    def close(self):
+        if self.pool is not None and self.pool_pid == os.getpid():
+            self.pool.close_all()
+        if self.async_pool is not None and self.async_pid == os.getpid():
+            asyncio.run_coroutine_threadsafe(self.async_pool.close(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def connect(self) -> PooledConnection:
+        pool = self.get_pool()
+        lease = PooledConnection(pool, pool.acquire())
+        self.request.leases.append(lease)
+        return lease
+
+    def call(self, function: str, event: Dict[str, Any]) -> Dict[str, Any]:
+        module = self.modules.get(function)
+        if module is None:
+            return error_response(404, 'Функция не найдена')
+        self.request.leases = []
+        try:
+            if self.runtime == 'async' and hasattr(module, 'handler_async'):
+                loop, pool = self.get_async_pool()
+                response = asyncio.run_coroutine_threadsafe(module.handler_async(event, None, pool), loop).result()
+                if response is not None:
+                    return response
+            return module.handler(event, None)
+        except PoolTimeout as e:
+            return error_response(503, str(e))
+        except Exception as e:
+            return error_response(500, str(e))
+        finally:
+            for lease in self.request.leases:
+                lease.close()
+            self.request.leases = []
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable):
+        function = environ.get('PATH_INFO', '/').strip('/').split('/')[0]
+        response = self.call(function, build_event(environ))
+
+        body = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            payload = base64.b64decode(body)
+        else:
+            payload = body.encode('utf-8') if isinstance(body, str) else json.dumps(body).encode('utf-8')
+
+        status_code = int(response.get('statusCode', 200))
+        headers = [(key, str(value)) for key, value in (response.get('headers') or {}).items()]
+        headers.append(('Content-Length', str(len(payload))))
+        start_response(status_line(status_code), headers)
+        return [payload]
+
+def create_app() -> Application:
+    """Точка входа для внешних WSGI-серверов (gunicorn): настройки из окружения"""
+    return Application(
+        load_functions(),
+        os.environ['DATABASE_URL'],
+        int(os.environ.get('SERVER_POOL_SIZE', DEFAULT_POOL_SIZE)),
+        os.environ.get('SERVER_RUNTIME', 'sync')
+    )
+
+class ThreadingServer(socketserver.ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def serve_worker(server: ThreadingServer):
+    # все воркеры ждут accept на одном сокете; неблокирующий сокет - чтобы проигравший не зависал
+    server.socket.setblocking(False)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.get_app().close()
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description='Функции backend/ в одном HTTP-сервере')
+    parser.add_argument('functions', nargs='*', help='по умолчанию - все функции')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='число процессов')
+    parser.add_argument('--pool-size', type=int, default=DEFAULT_POOL_SIZE,
+                        help='соединений на процесс; 0 - соединение на каждый вызов, как у функций')
+    parser.add_argument('--runtime', choices=['sync', 'async'], default='sync',
+                        help='async - handler_async функций на asyncio и asyncpg')
+    parser.add_argument('--access-log', action='store_true')
+    args = parser.parse_args()
+    if args.runtime == 'async' and asyncpg is None:
+        parser.error('для --runtime async нужен asyncpg')
+    if args.runtime == 'async' and args.pool_size < 1:
+        parser.error('для --runtime async нужен --pool-size больше 0')
+
+    app = Application(load_functions(args.functions), os.environ['DATABASE_URL'], args.pool_size, args.runtime)
+    handler_class = WSGIRequestHandler if args.access_log else QuietHandler
+    server = ThreadingServer((args.host, args.port), handler_class)
+    server.set_app(app)
+    print(f"http://{args.host}:{args.port}: {', '.join(app.modules)}; "
+          f"воркеров {args.workers}, пул {args.pool_size or 'выключен'}, {args.runtime}", flush=True)
+
+    workers = args.workers if hasattr(os, 'fork') else 1
+    if workers <= 1:
+        serve_worker(server)
+        return 0
+
+    children = []
+    for _ in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            serve_worker(server)
+            os._exit(0)
+        children.append(pid)
+
+    def stop(*_):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    try:
+        while children:
+            try:
+                pid, _ = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            if pid in children:
+                children.remove(pid)
+    finally:
+        server.server_close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
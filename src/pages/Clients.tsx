@@ -86,7 +86,8 @@ export default function Clients() {
         name: client.name,
         notes: client.notes || '',
         status: client.status || 'active',
-        contacts: client.contacts || [{ full_name: '', position: '', phone: '', email: '' }]
+        contacts: client.contacts || [{ full_name: '', position: '', phone: '', email: '' }],
+        version: client.version
       });
     } else {
       setEditingClient(null);
@@ -194,7 +195,7 @@ export default function Clients() {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -202,8 +203,6 @@ export default function Clients() {
         },
         body: JSON.stringify({
           id: clientId,
-          name: clients.find(c => c.id === clientId)?.name || '',
-          notes: clients.find(c => c.id === clientId)?.notes || '',
           status: 'archived'
         })
       });
@@ -290,7 +289,7 @@ export default function Clients() {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -298,8 +297,6 @@ export default function Clients() {
         },
         body: JSON.stringify({
           id: clientId,
-          name: clients.find(c => c.id === clientId)?.name || '',
-          notes: clients.find(c => c.id === clientId)?.notes || '',
           status: 'active'
         })
       });
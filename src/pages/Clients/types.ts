@@ -14,4 +14,45 @@ export interface Client {
   contacts: Contact[];
   contacts_count?: number;
   created_at?: string;
+  version?: number;
+  projects?: ClientProject[];
+  recent_orders?: ClientRecentOrder[];
+  totals?: ClientTotals;
+}
+
+export interface ClientProject {
+  id: number;
+  name: string;
+  status: string;
+  created_at: string | null;
+  orders_count: number;
+  contracted_amount: number;
+  planned_payments: number;
+  actual_payments: number;
+  receivables: number;
+  overdue_amount: number;
+  last_payment_date: string | null;
+}
+
+export interface ClientRecentOrder {
+  id: number;
+  name: string;
+  amount: number;
+  order_status: string;
+  payment_status: string;
+  planned_date: string | null;
+  project_id: number;
+  project_name: string;
+  created_at: string | null;
+}
+
+export interface ClientTotals {
+  projects_count: number;
+  orders_count: number;
+  contracted_amount: number;
+  planned_payments: number;
+  actual_payments: number;
+  receivables: number;
+  overdue_amount: number;
+  last_payment_date: string | null;
 }
@@ -131,7 +131,8 @@ export default function Orders() {
         payment_type: order.payment_type || 'postpaid',
         project_id: order.project_id,
         planned_date: order.planned_date,
-        actual_date: order.actual_date
+        actual_date: order.actual_date,
+        version: order.version
       });
     } else {
       setEditingOrder(null);
@@ -222,9 +223,8 @@ export default function Orders() {
     try {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
-      const order = orders.find(o => o.id === orderId);
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -232,15 +232,6 @@ export default function Orders() {
         },
         body: JSON.stringify({
           id: orderId,
-          name: order?.name || '',
-          description: order?.description || '',
-          amount: order?.amount || 0,
-          order_status: order?.order_status || 'new',
-          payment_status: order?.payment_status || 'not_paid',
-          payment_type: order?.payment_type || 'postpaid',
-          project_id: order?.project_id,
-          planned_date: order?.planned_date,
-          actual_date: order?.actual_date,
           status: 'archived'
         })
       });
@@ -282,9 +273,8 @@ export default function Orders() {
     try {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
-      const order = orders.find(o => o.id === orderId);
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -292,15 +282,6 @@ export default function Orders() {
         },
         body: JSON.stringify({
           id: orderId,
-          name: order?.name || '',
-          description: order?.description || '',
-          amount: order?.amount || 0,
-          order_status: order?.order_status || 'new',
-          payment_status: order?.payment_status || 'not_paid',
-          payment_type: order?.payment_type || 'postpaid',
-          project_id: order?.project_id,
-          planned_date: order?.planned_date,
-          actual_date: order?.actual_date,
           status: 'active'
         })
       });
@@ -14,6 +14,21 @@ export interface Order {
   client_name?: string;
   created_at?: string;
   updated_at?: string;
+  version?: number;
+  payments?: OrderPayment[];
+  planned_payments_amount?: number;
+  paid_amount?: number;
+  remaining_amount?: number;
+}
+
+export interface OrderPayment {
+  id: number;
+  planned_amount: number | null;
+  planned_amount_percent: number | null;
+  actual_amount: number;
+  planned_date: string | null;
+  actual_date: string | null;
+  status: string;
 }
 
 export const ORDER_STATUSES = {
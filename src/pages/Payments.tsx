@@ -129,7 +129,8 @@ export default function Payments() {
         planned_date: payment.planned_date,
         actual_date: payment.actual_date,
         order_id: payment.order_id,
-        status: payment.status || 'active'
+        status: payment.status || 'active',
+        version: payment.version
       });
     } else {
       setEditingPayment(null);
@@ -217,9 +218,8 @@ export default function Payments() {
     try {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
-      const payment = payments.find(p => p.id === paymentId);
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -227,12 +227,6 @@ export default function Payments() {
         },
         body: JSON.stringify({
           id: paymentId,
-          planned_amount: payment?.planned_amount,
-          planned_amount_percent: payment?.planned_amount_percent,
-          actual_amount: payment?.actual_amount || 0,
-          planned_date: payment?.planned_date,
-          actual_date: payment?.actual_date,
-          order_id: payment?.order_id,
           status: 'archived'
         })
       });
@@ -274,9 +268,8 @@ export default function Payments() {
     try {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
-      const payment = payments.find(p => p.id === paymentId);
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -284,12 +277,6 @@ export default function Payments() {
         },
         body: JSON.stringify({
           id: paymentId,
-          planned_amount: payment?.planned_amount,
-          planned_amount_percent: payment?.planned_amount_percent,
-          actual_amount: payment?.actual_amount || 0,
-          planned_date: payment?.planned_date,
-          actual_date: payment?.actual_date,
-          order_id: payment?.order_id,
           status: 'active'
         })
       });
@@ -13,4 +13,5 @@ export interface Payment {
   status?: string;
   created_at?: string;
   updated_at?: string;
+  version?: number;
 }
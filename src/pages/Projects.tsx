@@ -116,7 +116,8 @@ export default function Projects() {
         name: project.name,
         description: project.description || '',
         status: project.status || 'active',
-        client_id: project.client_id
+        client_id: project.client_id,
+        version: project.version
       });
     } else {
       setEditingProject(null);
@@ -201,9 +202,8 @@ export default function Projects() {
     try {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
-      const project = projects.find(p => p.id === projectId);
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -211,9 +211,6 @@ export default function Projects() {
         },
         body: JSON.stringify({
           id: projectId,
-          name: project?.name || '',
-          description: project?.description || '',
-          client_id: project?.client_id,
           status: 'archived'
         })
       });
@@ -299,9 +296,8 @@ export default function Projects() {
     try {
       const userId = localStorage.getItem('user_id');
       const companyId = localStorage.getItem('company_id');
-      const project = projects.find(p => p.id === projectId);
       const response = await fetch(API_URL, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
           'X-User-Id': userId || '',
@@ -309,9 +305,6 @@ export default function Projects() {
         },
         body: JSON.stringify({
           id: projectId,
-          name: project?.name || '',
-          description: project?.description || '',
-          client_id: project?.client_id,
           status: 'active'
         })
       });
@@ -7,4 +7,10 @@ export interface Project {
   client_name?: string;
   created_at?: string;
   updated_at?: string;
+  version?: number;
+  orders_count?: number;
+  contracted_amount?: number;
+  planned_payments?: number;
+  actual_payments?: number;
+  outstanding_balance?: number;
 }